@@ -25,6 +25,8 @@ class GetPutOnlyUser(HttpUser):
     def on_start(self):
         """Инициализация пользователя"""
         self.client.get("/docs", name="GET /docs")
+        # курсоры следующих страниц списков (заголовок X-Next-Cursor)
+        self.cursors = {}
         print(f"GET+PUT User started: {self.host}")
 
     # ========== ELEMENTS: только GET ==========
@@ -106,6 +108,27 @@ class GetPutOnlyUser(HttpUser):
             else:
                 response.failure(f"Status: {response.status_code}")
 
+    @tag("get_pages_cursor")
+    @task(10)
+    def browse_pages_by_cursor(self):
+        """GET /api/{alloys,predictions,patents}/?cursor= — листание вглубь, цена страницы постоянна"""
+        path = random.choice(["/api/alloys/", "/api/predictions/", "/api/patents/"])
+        params = {"limit": 100}
+        if self.cursors.get(path):
+            params["cursor"] = self.cursors[path]
+        with self.client.get(
+            path,
+            params=params,
+            name=f"GET {path} (cursor)",
+            catch_response=True,
+        ) as response:
+            if response.status_code == 200:
+                # после последней страницы курсора нет — начинаем сначала
+                self.cursors[path] = response.headers.get("X-Next-Cursor")
+                response.success()
+            else:
+                response.failure(f"Status: {response.status_code}")
+
     # ========== PATENTS: только GET ==========
     @tag("get_patents")
     @task(10)
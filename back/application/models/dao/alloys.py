@@ -1,17 +1,26 @@
-from sqlalchemy import Column, ForeignKey, Boolean, Integer, Numeric, String, Text, DateTime, Table
+from sqlalchemy import Column, ForeignKey, Boolean, Index, Integer, Numeric, String, Text, DateTime, Table
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.ext.hybrid import hybrid_property
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, validates
 
 Base = declarative_base()
 
+
+def normalize_search_text(value):
+    """Форма строки для поиска: нижний регистр, ё -> е, одиночные пробелы; None остаётся None"""
+    if value is None:
+        return None
+    return " ".join(str(value).casefold().replace("ё", "е").split())
+
 # Ассоциативная таблица с процентным содержанием
 alloy_element_association = Table(
     'alloy_element_association',
     Base.metadata,
     Column('alloy_id', Integer, ForeignKey('alloy.id'), primary_key=True),
     Column('element_id', Integer, ForeignKey('chemical_element.id'), primary_key=True),
-    Column('percentage', Numeric(5, 3), nullable=False)  # Процентное содержание элемента в сплаве
+    Column('percentage', Numeric(5, 3), nullable=False),  # Процентное содержание элемента в сплаве
+    # фильтр «содержит элемент X в диапазоне процентов» (EXISTS в repository_service.filter_alloys)
+    Index('ix_alloy_element_element_percentage', 'element_id', 'percentage', 'alloy_id'),
 )
 
 # Ассоциативная таблица для prediction-element
@@ -20,16 +29,27 @@ prediction_element_association = Table(
     Base.metadata,
     Column('prediction_id', Integer, ForeignKey('prediction.id'), primary_key=True),
     Column('element_id', Integer, ForeignKey('chemical_element.id'), primary_key=True),
-    Column('percentage', Numeric(5, 3), nullable=False)  # Процентное содержание элемента в прогнозе
+    Column('percentage', Numeric(5, 3), nullable=False),  # Процентное содержание элемента в прогнозе
+    Index('ix_prediction_element_element_percentage', 'element_id', 'percentage', 'prediction_id'),
 )
 
 
 class Alloy(Base):
     __tablename__ = "alloy"
+    # индексы под фильтры и сортировки списка сплавов (repository_service.filter_alloys)
+    __table_args__ = (
+        Index('ix_alloy_category_rolling_type_prop_value', 'category', 'rolling_type', 'prop_value'),
+        Index('ix_alloy_prop_value', 'prop_value'),
+        Index('ix_alloy_patent_id', 'patent_id'),
+        # точный и префиксный поиск по категории (repository_service.search_alloys_by_category)
+        Index('ix_alloy_category_norm', 'category_norm'),
+    )
 
     id = Column(Integer, primary_key=True)
     _prop_value = Column('prop_value', Numeric, nullable=False)
     category = Column(String(100))
+    # нормализованная категория, заполняется при присвоении category
+    category_norm = Column(String(100))
     rolling_type = Column(String(50))
 
     patent_id = Column(Integer, ForeignKey('patent.id'), nullable=False)
@@ -55,19 +75,37 @@ class Alloy(Base):
     def prop_value(cls):
         return cls._prop_value
 
+    @validates('category')
+    def _normalize_category(self, key, value):
+        self.category_norm = normalize_search_text(value)
+        return value
+
     def __repr__(self):
         return f"<Alloy(id={self.id}, prop_value={self.prop_value})>"
 
 
 class Patent(Base):
     __tablename__ = "patent"
+    # точный и префиксный поиск по названию и авторам (repository_service.search_patents)
+    __table_args__ = (
+        Index('ix_patent_patent_name_norm', 'patent_name_norm'),
+        Index('ix_patent_authors_name_norm', 'authors_name_norm'),
+    )
 
     id = Column(Integer, primary_key=True)
     authors_name = Column(String(100), nullable=False)
     patent_name = Column(String(100), nullable=False)
+    # нормализованные копии authors_name / patent_name, заполняются при присвоении
+    authors_name_norm = Column(String(100))
+    patent_name_norm = Column(String(100))
     description = Column(String(200))
     alloys = relationship('Alloy', back_populates='patent')
 
+    @validates('authors_name', 'patent_name')
+    def _normalize_names(self, key, value):
+        setattr(self, f"{key}_norm", normalize_search_text(value))
+        return value
+
     def __repr__(self):
         return f"<Patent(id={self.id}, name='{self.patent_name}')>"
 
@@ -145,6 +183,13 @@ class Person(Base):
 class Prediction(Base):
     """Прогноз"""
     __tablename__ = "prediction"
+    # индексы под фильтры и сортировки списка прогнозов (repository_service.filter_predictions)
+    __table_args__ = (
+        Index('ix_prediction_category_rolling_type_prop_value', 'category', 'rolling_type', 'prop_value'),
+        Index('ix_prediction_prop_value', 'prop_value'),
+        Index('ix_prediction_ml_model_id', 'ml_model_id'),
+        Index('ix_prediction_person_id', 'person_id'),
+    )
 
     id = Column(Integer, primary_key=True)
     _prop_value = Column('prop_value', Numeric, nullable=False)
@@ -179,3 +224,38 @@ class Prediction(Base):
     def __repr__(self):
         return f"<Prediction(id={self.id}, prop_value={self.prop_value})>"
 
+
+
+# ---------- Статистика прогнозов для отчётов ----------
+# Счётчики ведутся инкрементально в той же транзакции, что и изменения прогнозов
+# (repository_service), пересчитываются и сверяются командами maintenance.py.
+# Внешних ключей нет намеренно: это производные данные, они не должны мешать удалению
+# пользователей, моделей и элементов.
+
+class PredictionStats(Base):
+    """Число прогнозов по (категория, тип проката, модель)"""
+    __tablename__ = "prediction_stats"
+
+    # пустая строка — значение не указано (NULL не может входить в первичный ключ)
+    category = Column(String(100), primary_key=True)
+    rolling_type = Column(String(50), primary_key=True)
+    ml_model_id = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False, default=0, server_default='0')
+    # из них прогнозов с непустым составом
+    with_composition = Column(Integer, nullable=False, default=0, server_default='0')
+
+
+class PersonPredictionStats(Base):
+    """Число прогнозов пользователя"""
+    __tablename__ = "person_prediction_stats"
+
+    person_id = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False, default=0, server_default='0')
+
+
+class ElementPredictionStats(Base):
+    """Число прогнозов, в состав которых входит элемент"""
+    __tablename__ = "element_prediction_stats"
+
+    element_id = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False, default=0, server_default='0')
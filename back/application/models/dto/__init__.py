@@ -6,4 +6,5 @@ from .model_dto import *
 from .patent_dto import *
 from .person_dto import *
 from .prediction_dto import *
-from .role_dto import *
\ No newline at end of file
+from .role_dto import *
+from .report_dto import *
\ No newline at end of file
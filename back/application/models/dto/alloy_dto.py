@@ -2,6 +2,7 @@ from pydantic import BaseModel
 from typing import (
     Deque, Dict, List, Optional, Sequence, Set, Tuple, Union
 )
+from .alloy_element_association_dto import ElementPercentageDTO
 
 class AlloyDTO(BaseModel):
     """ DTO для получения информации о сплаве """
@@ -26,3 +27,6 @@ class AlloyUpdateDTO(BaseModel):
     rolling_type: str
     patent_id: int
 
+class AlloyWithElementsCreateDTO(AlloyCreateDTO):
+    """ DTO для создания сплава сразу с полным составом """
+    elements: List[ElementPercentageDTO] = []
@@ -9,9 +9,19 @@ class AlloyElementAssociationDTO(BaseModel):
     element_id: int
     percentage: float
 
+class ElementPercentageDTO(BaseModel):
+    """ DTO элемента состава при создании сплава или прогноза """
+    element_id: int
+    percentage: float
+
 class AlloyElementResponseDTO(BaseModel):
     element_id: int
     element_name: str
     element_symbol: str
     element_atomic_number: int
     percentage: float
+
+class AlloyCompositionDTO(BaseModel):
+    """ DTO состава одного сплава в пакетном ответе """
+    alloy_id: int
+    elements: List[AlloyElementResponseDTO]
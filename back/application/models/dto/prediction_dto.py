@@ -2,6 +2,7 @@ from pydantic import BaseModel
 from typing import (
     Deque, Dict, List, Optional, Sequence, Set, Tuple, Union
 )
+from .alloy_element_association_dto import ElementPercentageDTO
 
 class PredictionDTO(BaseModel):
     """ DTO для добавления и получения нового прогноза """
@@ -19,3 +20,7 @@ class PredictionCreateDTO(BaseModel):
     ml_model_id: int
     rolling_type: str
     person_id: int
+
+class PredictionWithElementsCreateDTO(PredictionCreateDTO):
+    """ DTO для создания прогноза сразу с полным составом """
+    elements: List[ElementPercentageDTO] = []
@@ -8,3 +8,8 @@ class PredictionElementAssociationDTO(BaseModel):
     prediction_id: int
     element_id: int
     percentage: float
+
+class PredictionCompositionDTO(BaseModel):
+    """ DTO состава одного прогноза в пакетном ответе """
+    prediction_id: int
+    elements: List[PredictionElementAssociationDTO]
@@ -0,0 +1,53 @@
+from pydantic import BaseModel
+from typing import (
+    Deque, Dict, List, Optional, Sequence, Set, Tuple, Union
+)
+from .prediction_dto import PredictionDTO
+
+class ReportTotalsDTO(BaseModel):
+    """ DTO числа записей основных таблиц """
+    users: int
+    roles: int
+    elements: int
+    predictions: int
+    alloys: int
+    patents: int
+    models: int
+
+class GroupCountDTO(BaseModel):
+    """ DTO строки группировки: значение и число записей """
+    name: Optional[str] = None
+    count: int
+
+class ActiveUserDTO(BaseModel):
+    """ DTO пользователя с числом его прогнозов """
+    person_id: int
+    login: str
+    first_name: str
+    last_name: str
+    organization: Optional[str] = None
+    role: Optional[str] = None
+    count: int
+
+class ElementCountDTO(BaseModel):
+    """ DTO частоты элемента в составах прогнозов """
+    element_id: int
+    name: str
+    symbol: str
+    count: int
+
+class ElementRankingDTO(BaseModel):
+    elements: List[ElementCountDTO]
+    predictions_with_composition: int
+
+class ReportsSummaryDTO(BaseModel):
+    """ DTO сводки для страницы отчётов """
+    totals: ReportTotalsDTO
+    users_by_role: List[GroupCountDTO]
+    top_organizations: List[GroupCountDTO]
+    most_active_users: List[ActiveUserDTO]
+    element_ranking: ElementRankingDTO
+    predictions_by_category: List[GroupCountDTO]
+    predictions_by_rolling_type: List[GroupCountDTO]
+    predictions_by_model: List[GroupCountDTO]
+    recent_predictions: List[PredictionDTO]
@@ -1,13 +1,23 @@
-from fastapi import APIRouter, HTTPException, Depends, status
-from starlette.responses import RedirectResponse
+import csv
+import io
+import json
+import tempfile
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response, status
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import RedirectResponse, StreamingResponse
 from application.models.dto import *
 from application.services import repository_service as service
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from application.config import SessionLocal
+from application.config import SessionLocal, app_config
 from typing import List
 from pydantic import BaseModel
 from fastapi import Body
-from application.services.ml_inference import MLInference
+from application.services.ml_inference import MLInference, axis_values, grid_points
+from application.services.inference_executor import InferenceExecutor, InferenceQueueFull
+from application.services.inference_batcher import InferenceBatcher
+from application.services.reference_cache import element_cache
+from application.services import csv_scoring, data_export, data_import, pagination, text_search
 
 """
 
@@ -17,6 +27,31 @@ from application.services.ml_inference import MLInference
 
 router = APIRouter(prefix='/api', tags=['Metal Alloys API'])
 
+# Справочник химических элементов кэшируется в процессе воркера
+element_cache.configure(
+    ttl=app_config.getfloat('Cache', 'element_ttl', fallback=300.0),
+    session_factory=SessionLocal,
+)
+
+# Столбцы поиска *_norm (категории, патенты): на БД, созданной до их появления,
+# добавляются с индексами и заполняются при первом запуске
+try:
+    with SessionLocal() as _db:
+        for _table, (_added, _rows) in service.ensure_search_columns(_db).items():
+            if _added:
+                print(f"Search columns added to {_table}: {', '.join(_added)} ({_rows} rows normalized)")
+except Exception as e:
+    print(f"Warning: could not prepare search columns: {e}")
+
+# Таблицы статистики прогнозов (отчёты): на БД, созданной до их появления,
+# создаются и заполняются при первом запуске
+try:
+    with SessionLocal() as _db:
+        if service.ensure_prediction_stats(_db):
+            print("Prediction statistics tables created/rebuilt")
+except Exception as e:
+    print(f"Warning: could not prepare prediction statistics: {e}")
+
 def get_db() -> Session:
     """
     Context manager для безопасной работы с БД
@@ -31,6 +66,44 @@ def get_db() -> Session:
     finally:
         db.close()
 
+def _after_id(after_id: int | None, cursor: str | None) -> int | None:
+    """Начало страницы: непрозрачный cursor (из X-Next-Cursor) или явный after_id"""
+    if cursor is None:
+        return after_id
+    try:
+        return pagination.decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+def _set_next_cursor(response: Response, items: list, limit: int, sort: str = 'id'):
+    """Курсор следующей страницы — в заголовке, тело ответа остаётся списком (только для сортировки по id)"""
+    if sort.lstrip('-') != 'id':
+        return
+    cursor = pagination.next_cursor(items, limit)
+    if cursor is not None:
+        response.headers['X-Next-Cursor'] = cursor
+
+def _element_filters(values: List[str]) -> list:
+    """
+    ?element=Fe | ?element=26 | ?element=Fe:0.5:2 | ?element=Cr::5 ->
+    [(element_id, мин. процент | None, макс. процент | None)]
+    """
+    filters = []
+    for value in values:
+        parts = value.split(':')
+        if len(parts) > 3:
+            raise HTTPException(status_code=422, detail=f"element filter must be 'symbol[:min[:max]]': {value}")
+        key = parts[0].strip()
+        element_id = int(key) if key.isdigit() else element_cache.symbol_to_id().get(key.lower())
+        if element_id is None:
+            raise HTTPException(status_code=422, detail=f"Unknown element: {key}")
+        try:
+            low, high = [float(p) if p.strip() else None for p in (parts[1:] + ['', ''])[:2]]
+        except ValueError:
+            raise HTTPException(status_code=422, detail=f"element percentages must be numbers: {value}")
+        filters.append((element_id, low, high))
+    return filters
+
 @router.get('/')
 async def root():
     """ Переадресация на страницу Swagger """
@@ -38,10 +111,10 @@ async def root():
 
 # Chemical Elements Routes
 @router.get('/elements/', response_model=List[ChemicalElementDTO])
-async def get_all_elements(db: Session = Depends(get_db)):
+async def get_all_elements():
     """Получить все химические элементы"""
     try:
-        elements = service.get_all_elements(db)
+        elements = element_cache.get_all()
         if not elements:
             raise HTTPException(status_code=404, detail="No elements found")
         return elements
@@ -50,9 +123,9 @@ async def get_all_elements(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 @router.get('/elements/{element_id}', response_model=ChemicalElementDTO)
-async def get_element_by_id(element_id: int, db: Session = Depends(get_db)):
+async def get_element_by_id(element_id: int):
     """Получить химический элемент по ID"""
-    element = service.get_element_by_id(db, element_id)
+    element = element_cache.get_by_id(element_id)
     if element is None:
         raise HTTPException(status_code=404, detail="Element not found")
     return element
@@ -116,9 +189,27 @@ async def create_element(element: ChemicalElementCreateDTO, db: Session = Depend
 
 # Alloys Routes
 @router.get('/alloys/', response_model=List[AlloyDTO])
-async def get_all_alloys(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Получить все сплавы"""
-    alloys = service.get_all_alloys(db, skip, limit)
+async def get_all_alloys(response: Response, skip: int = 0, limit: int = 100, after_id: int | None = None,
+                         cursor: str | None = None, category: str | None = None, rolling_type: str | None = None,
+                         prop_min: float | None = None, prop_max: float | None = None,
+                         patent_id: int | None = None, element: List[str] = Query(default=[]),
+                         sort: str = 'id', db: Session = Depends(get_db)):
+    """
+    Получить сплавы с фильтрами: category, rolling_type (точное совпадение), prop_min/prop_max,
+    patent_id, element=Fe:0.5:2 (можно несколько — содержит каждый в диапазоне процентов)
+    и сортировкой sort=prop_value | -prop_value | category | rolling_type | id | -id.
+    Всё — одним индексированным запросом (repository_service.filter_alloys).
+    Глубокие страницы — через ?cursor= из заголовка X-Next-Cursor (или ?after_id=):
+    выборка по индексу id вместо OFFSET, стоимость страницы не зависит от глубины.
+    """
+    try:
+        alloys = service.filter_alloys(
+            db, category=category, rolling_type=rolling_type, prop_min=prop_min, prop_max=prop_max,
+            patent_id=patent_id, elements=_element_filters(element), sort=sort,
+            skip=skip, limit=limit, after_id=_after_id(after_id, cursor))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    _set_next_cursor(response, alloys, limit, sort)
     # БЫЛО:
     # if not alloys:
     #     raise HTTPException(status_code=404, detail="No alloys found")
@@ -128,6 +219,64 @@ async def get_all_alloys(skip: int = 0, limit: int = 100, db: Session = Depends(
     return alloys or []
 
 
+# Предел числа сплавов/прогнозов в одном пакетном запросе составов
+BULK_COMPOSITION_LIMIT = 1000
+
+def _parse_ids(ids: str) -> list:
+    """'1,2,3' -> [1, 2, 3]"""
+    try:
+        parsed = [int(x) for x in ids.split(',') if x.strip()]
+    except ValueError:
+        raise HTTPException(status_code=422, detail="ids must be a comma-separated list of integers")
+    if len(parsed) > BULK_COMPOSITION_LIMIT:
+        raise HTTPException(status_code=422, detail=f"Too many ids (max {BULK_COMPOSITION_LIMIT})")
+    return parsed
+
+@router.get('/alloys/elements', response_model=List[AlloyCompositionDTO])
+async def get_alloys_elements(ids: str | None = None, skip: int = 0, limit: int = 100,
+                              db: Session = Depends(get_db)):
+    """
+    Составы нескольких сплавов одним запросом: ?ids=1,2,3 или окно ?skip=&limit= как у /alloys/.
+    Сплавы без элементов в окне skip/limit в ответ не попадают.
+    """
+    alloy_ids = _parse_ids(ids) if ids is not None else None
+    compositions = service.get_alloys_elements_with_percentages(
+        db, alloy_ids, skip, min(limit, BULK_COMPOSITION_LIMIT))
+    return [{'alloy_id': alloy_id, 'elements': elements} for alloy_id, elements in compositions.items()]
+
+# Строк на один пакет потоковой выгрузки (чтение серверным курсором и запись ответа)
+EXPORT_BATCH_SIZE = app_config.getint('Export', 'batch_size', fallback=1000)
+
+def _export_response(name: str, iter_records, fields: tuple, format: str) -> StreamingResponse:
+    """
+    Потоковая выгрузка: сессия БД открывается внутри генератора и живёт, пока идёт ответ
+    (сессия из Depends(get_db) к этому моменту уже закрыта).
+    """
+    try:
+        data_export.check_format(format)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except ImportError:
+        raise HTTPException(status_code=501, detail=f"Format {format} requires the pyarrow package")
+    elements = [(e["id"], e["symbol"]) for e in sorted(element_cache.get_all(), key=lambda e: e["id"])]
+
+    def stream():
+        db = SessionLocal()
+        try:
+            yield from data_export.iter_export(iter_records(db, batch_size=EXPORT_BATCH_SIZE), format,
+                                               fields, elements, batch_size=EXPORT_BATCH_SIZE)
+        finally:
+            db.close()
+
+    filename = f"{name}.{data_export.EXTENSIONS[format]}"
+    return StreamingResponse(stream(), media_type=data_export.MEDIA_TYPES[format],
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@router.get('/alloys/export')
+async def export_alloys(format: str = 'ndjson'):
+    """Все сплавы с составом потоком: ?format=ndjson|csv|arrow|parquet (см. data_export)"""
+    return _export_response('alloys', service.iter_alloys_with_compositions, service.ALLOY_EXPORT_FIELDS, format)
+
 @router.get('/alloys/{alloy_id}', response_model=AlloyDTO)
 async def get_alloy_by_id(alloy_id: int, db: Session = Depends(get_db)):
     """Получить сплав по ID"""
@@ -153,6 +302,66 @@ async def create_alloy(alloy: AlloyCreateDTO, db: Session = Depends(get_db)):
         )
     return result
 
+def _element_percentages(elements) -> dict:
+    """Список {element_id, percentage} -> {element_id: percentage}; повторы элементов недопустимы"""
+    percentages = {}
+    for it in elements:
+        if it.element_id in percentages:
+            raise HTTPException(status_code=422, detail=f"Element {it.element_id} is listed twice")
+        percentages[it.element_id] = it.percentage
+    return percentages
+
+@router.post('/alloys/with_elements', status_code=201, response_model=AlloyDTO)
+async def create_alloy_with_elements(alloy: AlloyWithElementsCreateDTO, db: Session = Depends(get_db)):
+    """Создать сплав вместе с полным составом одной транзакцией (вместо 1 + N запросов)"""
+    try:
+        return service.create_alloy_with_elements(
+            db,
+            prop_value=alloy.prop_value,
+            category=alloy.category,
+            rolling_type=alloy.rolling_type,
+            patent_id=alloy.patent_id,
+            element_percentages=_element_percentages(alloy.elements)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except IntegrityError:
+        raise HTTPException(status_code=400, detail="Invalid patent_id or composition")
+
+IMPORT_CHUNK_SIZE = app_config.getint('Import', 'chunk_size', fallback=1000)
+# Загрузка до этого размера держится в памяти, больше — во временном файле
+IMPORT_SPOOL_BYTES = 8 * 1024 * 1024
+
+@router.post('/import/alloys', status_code=200)
+async def import_alloys(request: Request, format: str = 'csv', chunk_size: int = IMPORT_CHUNK_SIZE):
+    """
+    Массовый импорт сплавов, патентов и составов (тело запроса — сам файл csv/ndjson/json,
+    формат — см. data_import). Запись пакетами по chunk_size строк, одна транзакция на пакет;
+    ошибочные строки перечисляются в отчёте и не прерывают загрузку.
+    """
+    if format not in data_import.FORMATS:
+        raise HTTPException(status_code=422, detail=f"format must be one of: {', '.join(data_import.FORMATS)}")
+    chunk_size = max(min(chunk_size, 10000), 1)
+    def run(spool):
+        db = SessionLocal()
+        try:
+            with data_import.open_text(spool) as text:
+                return service.import_alloys(db, data_import.iter_records(text, format), chunk_size=chunk_size)
+        finally:
+            db.close()
+
+    # тело большое — в памяти до IMPORT_SPOOL_BYTES, дальше во временном файле;
+    # файл закрывается (и удаляется) и при обрыве загрузки, и при ошибке импорта
+    with tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_BYTES) as spool:
+        async for data in request.stream():
+            spool.write(data)
+        spool.seek(0)
+        try:
+            # импорт синхронный и долгий — в пуле потоков, чтобы не держать цикл событий
+            return await run_in_threadpool(run, spool)
+        except (ValueError, UnicodeDecodeError, csv.Error) as e:
+            raise HTTPException(status_code=422, detail=str(e))
+
 @router.put('/alloys/{alloy_id}', response_model=AlloyDTO)
 async def update_alloy(alloy_id: int, alloy: AlloyUpdateDTO, db: Session = Depends(get_db)):
     """Обновить сплав"""
@@ -186,10 +395,18 @@ async def get_alloys_by_patent(patent_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="No alloys found for this patent")
     return alloys
 
+def _check_match(match: str):
+    try:
+        text_search.check_match(match)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
 @router.get('/alloys/category/{category}', response_model=List[AlloyDTO])
-async def search_alloys_by_category(category: str, db: Session = Depends(get_db)):
-    """Поиск сплавов по категории"""
-    alloys = service.search_alloys_by_category(db, category)
+async def search_alloys_by_category(category: str, match: str = 'contains', db: Session = Depends(get_db)):
+    """Поиск сплавов по категории без учёта регистра (match: exact | prefix | contains)"""
+    _check_match(match)
+    alloys = service.search_alloys_by_category(db, category, match)
     if not alloys:
         raise HTTPException(status_code=404, detail="No alloys found in this category")
     return alloys
@@ -254,9 +471,21 @@ async def get_alloy_elements(alloy_id: int, db: Session = Depends(get_db)):
 
 # Predictions Routes
 @router.get('/predictions/', response_model=List[PredictionDTO])
-async def get_all_predictions(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Получить все прогнозы"""
-    predictions = service.get_all_predictions(db, skip, limit)
+async def get_all_predictions(response: Response, skip: int = 0, limit: int = 100, after_id: int | None = None,
+                              cursor: str | None = None, category: str | None = None,
+                              rolling_type: str | None = None, prop_min: float | None = None,
+                              prop_max: float | None = None, person_id: int | None = None,
+                              ml_model_id: int | None = None, element: List[str] = Query(default=[]),
+                              sort: str = 'id', db: Session = Depends(get_db)):
+    """Получить прогнозы с фильтрами (person_id, ml_model_id и остальные — как у /alloys/), сортировкой и курсором"""
+    try:
+        predictions = service.filter_predictions(
+            db, category=category, rolling_type=rolling_type, prop_min=prop_min, prop_max=prop_max,
+            person_id=person_id, ml_model_id=ml_model_id, elements=_element_filters(element), sort=sort,
+            skip=skip, limit=limit, after_id=_after_id(after_id, cursor))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    _set_next_cursor(response, predictions, limit, sort)
     # БЫЛО:
     # if not predictions:
     #     raise HTTPException(status_code=404, detail="No predictions found")
@@ -266,6 +495,22 @@ async def get_all_predictions(skip: int = 0, limit: int = 100, db: Session = Dep
     return predictions or []
 
 
+@router.get('/predictions/elements', response_model=List[PredictionCompositionDTO])
+async def get_predictions_elements(ids: str | None = None, skip: int = 0, limit: int = 100,
+                                   db: Session = Depends(get_db)):
+    """Составы нескольких прогнозов одним запросом: ?ids=1,2,3 или окно ?skip=&limit= как у /predictions/"""
+    prediction_ids = _parse_ids(ids) if ids is not None else None
+    compositions = service.get_predictions_elements_with_percentages(
+        db, prediction_ids, skip, min(limit, BULK_COMPOSITION_LIMIT))
+    return [{'prediction_id': prediction_id, 'elements': elements}
+            for prediction_id, elements in compositions.items()]
+
+@router.get('/predictions/export')
+async def export_predictions(format: str = 'ndjson'):
+    """Все прогнозы с составом потоком: ?format=ndjson|csv|arrow|parquet (см. data_export)"""
+    return _export_response('predictions', service.iter_predictions_with_compositions,
+                            service.PREDICTION_EXPORT_FIELDS, format)
+
 @router.get('/predictions/{prediction_id}', response_model=PredictionDTO)
 async def get_prediction_by_id(prediction_id: int, db: Session = Depends(get_db)):
     """Получить прогноз по ID"""
@@ -292,6 +537,25 @@ async def create_prediction(prediction: PredictionCreateDTO, db: Session = Depen
         )
     return {"message": "Prediction created successfully"}
 
+@router.post('/predictions/with_elements', status_code=201, response_model=PredictionDTO)
+async def create_prediction_with_elements(prediction: PredictionWithElementsCreateDTO,
+                                          db: Session = Depends(get_db)):
+    """Создать прогноз вместе с полным составом одной транзакцией (вместо 1 + N запросов)"""
+    try:
+        return service.create_prediction_with_elements(
+            db,
+            prop_value=prediction.prop_value,
+            category=prediction.category,
+            ml_model_id=prediction.ml_model_id,
+            rolling_type=prediction.rolling_type,
+            person_id=prediction.person_id,
+            element_percentages=_element_percentages(prediction.elements)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except IntegrityError:
+        raise HTTPException(status_code=400, detail="Invalid ml_model_id, person_id or composition")
+
 @router.put('/predictions/by_id/{prediction_id}', response_model=PredictionCreateDTO)
 async def update_prediction(prediction_id: int, prediction: PredictionCreateDTO, db: Session = Depends(get_db)):
     """Обновить предсказание"""
@@ -393,9 +657,11 @@ async def get_predictions_by_element(element_id: int, db: Session = Depends(get_
 
 # Patents Routes
 @router.get('/patents/', response_model=List[PatentDTO])
-async def get_all_patents(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Получить все патенты"""
-    patents = service.get_all_patents(db, skip, limit)
+async def get_all_patents(response: Response, skip: int = 0, limit: int = 100, after_id: int | None = None,
+                          cursor: str | None = None, db: Session = Depends(get_db)):
+    """Получить все патенты (по возрастанию id; курсорная пагинация — как у /alloys/)"""
+    patents = service.get_all_patents(db, skip, limit, after_id=_after_id(after_id, cursor))
+    _set_next_cursor(response, patents or [], limit)
     # БЫЛО:
     # if not patents:
     #     raise HTTPException(status_code=404, detail="No patents found")
@@ -405,6 +671,19 @@ async def get_all_patents(skip: int = 0, limit: int = 100, db: Session = Depends
     return patents or []
 
 
+@router.get('/patents/search', response_model=List[PatentDTO])
+async def search_patents(patent_name: str | None = None, authors_name: str | None = None, match: str = 'contains',
+                         skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    """Поиск патентов по названию и/или авторам без учёта регистра (match: exact | prefix | contains)"""
+    _check_match(match)
+    if patent_name is None and authors_name is None:
+        raise HTTPException(status_code=422, detail="patent_name or authors_name is required")
+    patents = service.search_patents(db, patent_name, authors_name, match, skip, limit)
+    if patents is None:
+        raise HTTPException(status_code=500, detail="Patent search failed")
+    return patents
+
+
 @router.get('/patents/{patent_id}', response_model=PatentDTO)
 async def get_patent_by_id(patent_id: int, db: Session = Depends(get_db)):
     """Получить патент по ID"""
@@ -454,12 +733,13 @@ async def update_patent(patent_id: int, patent: PatentCreateDTO, db: Session = D
 
 # Persons Routes
 @router.get('/persons/', response_model=List[PersonDTO])
-async def get_all_persons(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Получить всех пользователей"""
-    persons = service.get_all_persons(db, skip, limit)
-    if not persons:
-        raise HTTPException(status_code=404, detail="No persons found")
-    return persons
+async def get_all_persons(response: Response, skip: int = 0, limit: int = 100, after_id: int | None = None,
+                          cursor: str | None = None, db: Session = Depends(get_db)):
+    """Получить всех пользователей (по возрастанию id; курсорная пагинация — как у /alloys/)"""
+    persons = service.get_all_persons(db, skip, limit, after_id=_after_id(after_id, cursor))
+    _set_next_cursor(response, persons or [], limit)
+    # пустая страница (конец курсорного обхода) — 200 и пустой список, как у /alloys/ и /patents/
+    return persons or []
 
 @router.get('/persons/id/{person_id}', response_model=PersonDTO)
 async def get_person_by_id(person_id: int, db: Session = Depends(get_db)):
@@ -679,8 +959,8 @@ async def get_predictions_by_model(model_id: int, db: Session = Depends(get_db))
 
 # --- Elements: get by symbol (совпадает с elementService.getBySymbol в api.js) ---
 @router.get('/elements/symbol/{symbol}', response_model=ChemicalElementDTO)
-async def get_element_by_symbol(symbol: str, db: Session = Depends(get_db)):
-    element = service.get_element_by_symbol(db, symbol)
+async def get_element_by_symbol(symbol: str):
+    element = element_cache.get_by_symbol(symbol)
     if element is None:
         raise HTTPException(status_code=404, detail="Element not found")
     return element
@@ -718,8 +998,53 @@ async def grant_role_to_organization(
 
     return {"message": "Role granted successfully", "updated": updated, "organization": org, "role_id": payload.role_id}
 
+# --- Reports: агрегаты для страницы отчётов (GROUP BY на стороне БД) ---
+@router.get('/reports/summary', response_model=ReportsSummaryDTO)
+async def get_reports_summary(top: int = 10, db: Session = Depends(get_db)):
+    """Сводка системы: итоги, группировки и топы по top строк — несколько КБ вместо полных таблиц"""
+    return service.get_reports_summary(db, top=max(min(top, 100), 1))
+
+@router.get('/reports/predictions/by/{field}', response_model=List[GroupCountDTO])
+async def get_predictions_report(field: str, limit: int = 100, db: Session = Depends(get_db)):
+    """Число прогнозов по category / rolling_type / model"""
+    try:
+        return service.get_predictions_by_field(db, field, max(min(limit, 1000), 1))
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
 # --- ML ---
-ml_infer = MLInference()
+ml_infer = MLInference(
+    cache_size=app_config.getint('ML', 'prediction_cache_size', fallback=4096),
+    mmap_mode='r' if app_config.getboolean('ML', 'mmap_models', fallback=False) else None,
+    engine=app_config.get('ML', 'engine', fallback='native'),
+    compiled_max_rows=app_config.getint('ML', 'compiled_max_rows', fallback=64),
+)
+# Модели загружаются лениво; при warm_up = true — фоновым потоком сразу после старта
+if app_config.getboolean('ML', 'warm_up', fallback=True):
+    ml_infer.registry.warm_up()
+# Замена файлов моделей подхватывается без рестарта (0 - только через /api/ml/models/reload)
+ml_infer.watch(app_config.getfloat('ML', 'watch_interval', fallback=0.0))
+# Инференс выполняется в отдельном пуле, а не в event loop
+ml_executor = InferenceExecutor(
+    ml_infer,
+    kind=app_config.get('ML', 'executor', fallback='thread'),
+    workers=app_config.getint('ML', 'executor_workers', fallback=2),
+    queue_size=app_config.getint('ML', 'executor_queue_size', fallback=32),
+    retry_after=app_config.getint('ML', 'retry_after', fallback=1),
+)
+# Одновременные одиночные прогнозы одной модели объединяются в один вызов
+ml_batcher = InferenceBatcher(
+    ml_executor,
+    window_ms=app_config.getfloat('ML', 'batch_window_ms', fallback=2.0),
+    max_batch=app_config.getint('ML', 'batch_max_size', fallback=64),
+)
+
+def _queue_full_error(e: InferenceQueueFull) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail=str(e),
+        headers={"Retry-After": str(ml_executor.retry_after)},
+    )
 
 class MLPredictElementDTO(BaseModel):
     element_id: int
@@ -731,29 +1056,374 @@ class MLPredictRequestDTO(BaseModel):
     rolling_type: str
     size: float | None = None
     elements: list[MLPredictElementDTO] = []
+    # вклады элементов в прогноз (одна матрица возмущений, см. MLInference.explain)
+    explain: bool = False
+    explain_delta: float = 1.0
 
-@router.post("/ml/predict", status_code=200)
-async def ml_predict(payload: MLPredictRequestDTO, db: Session = Depends(get_db)):
-    all_elements = service.get_all_elements(db)
-    id_to_symbol = {int(e.id): str(e.symbol).lower() for e in (all_elements or [])}
-
+def _composition_by_symbol(elements, id_to_symbol: dict) -> dict:
+    """Переводит список {element_id, percentage} в словарь {символ: процент}"""
     composition = {}
-    for it in payload.elements:
+    for it in elements:
         sym = id_to_symbol.get(int(it.element_id))
         if not sym:
             continue
         composition[sym] = float(it.percentage)
+    return composition
+
+@router.post("/ml/predict", status_code=200)
+async def ml_predict(payload: MLPredictRequestDTO):
+    id_to_symbol = element_cache.id_to_symbol()
+    composition = _composition_by_symbol(payload.elements, id_to_symbol)
+
+    try:
+        if payload.explain:
+            result = await ml_executor.run(
+                "explain",
+                ml_model_id=payload.ml_model_id,
+                category=payload.category,
+                rolling_type=payload.rolling_type,
+                size=payload.size,
+                composition_by_symbol=composition,
+                delta=payload.explain_delta,
+            )
+            symbol_to_id = {id_to_symbol[it.element_id]: it.element_id
+                            for it in payload.elements if it.element_id in id_to_symbol}
+            for item in result["contributions"]:
+                item["element_id"] = symbol_to_id.get(item["symbol"])
+            return result
+        if ml_batcher.enabled:
+            value = await ml_batcher.predict(
+                ml_model_id=payload.ml_model_id,
+                category=payload.category,
+                rolling_type=payload.rolling_type,
+                size=payload.size,
+                composition_by_symbol=composition,
+            )
+        else:
+            value = await ml_executor.run(
+                "predict",
+                ml_model_id=payload.ml_model_id,
+                category=payload.category,
+                rolling_type=payload.rolling_type,
+                size=payload.size,
+                composition_by_symbol=composition,
+            )
+        return {"prop_value": value}
+    except InferenceQueueFull as e:
+        raise _queue_full_error(e)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"ML error: {str(e)}")
+
+
+class MLPredictBatchItemDTO(BaseModel):
+    category: str
+    rolling_type: str
+    size: float | None = None
+    elements: list[MLPredictElementDTO] = []
+
+class MLPredictBatchRequestDTO(BaseModel):
+    ml_model_id: int
+    items: list[MLPredictBatchItemDTO] = []
+
+# Предел размера одного пакетного прогноза
+ML_PREDICT_MAX_BATCH = app_config.getint('ML', 'max_batch', fallback=10000)
+
+@router.post("/ml/predict/batch", status_code=200)
+async def ml_predict_batch(payload: MLPredictBatchRequestDTO):
+    """Пакетный прогноз: N составов -> N значений prop_value в порядке запроса"""
+    if len(payload.items) > ML_PREDICT_MAX_BATCH:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Пакет из {len(payload.items)} составов превышает лимит {ML_PREDICT_MAX_BATCH}",
+        )
+    id_to_symbol = element_cache.id_to_symbol()
+
+    rows = [
+        {
+            "category": item.category,
+            "rolling_type": item.rolling_type,
+            "size": item.size,
+            "composition_by_symbol": _composition_by_symbol(item.elements, id_to_symbol),
+        }
+        for item in payload.items
+    ]
+
+    try:
+        values = await ml_executor.run("predict_many", ml_model_id=payload.ml_model_id, rows=rows)
+        return {"prop_values": values}
+    except InferenceQueueFull as e:
+        raise _queue_full_error(e)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"ML error: {str(e)}")
+
+
+class MLSweepAxisDTO(BaseModel):
+    element_id: int
+    start: float
+    stop: float
+    step: float
 
+class MLSweepRequestDTO(BaseModel):
+    ml_model_id: int
+    category: str
+    rolling_type: str
+    size: float | None = None
+    elements: list[MLPredictElementDTO] = []
+    axes: list[MLSweepAxisDTO]
+
+# Ограничения перебора по сетке составов
+ML_SWEEP_MAX_POINTS = app_config.getint('ML', 'sweep_max_points', fallback=1000000)
+ML_SWEEP_CHUNK_SIZE = app_config.getint('ML', 'sweep_chunk_size', fallback=20000)
+
+@router.post("/ml/sweep", status_code=200)
+async def ml_sweep(payload: MLSweepRequestDTO):
+    """
+    Прогноз по сетке составов: базовый состав + 1-2 элемента, перебираемые по диапазону.
+    Сетка считается матрицей за один вызов модели на блок из sweep_chunk_size точек.
+    Небольшие сетки возвращаются одним JSON, большие — потоком NDJSON
+    (первая строка — описание осей, далее по строке на точку).
+    """
+    if not 1 <= len(payload.axes) <= 2:
+        raise HTTPException(status_code=422, detail="Нужно задать одну или две оси перебора")
+    if len({axis.element_id for axis in payload.axes}) != len(payload.axes):
+        raise HTTPException(status_code=422, detail="Оси перебора должны относиться к разным элементам")
+
+    id_to_symbol = element_cache.id_to_symbol()
+    composition = _composition_by_symbol(payload.elements, id_to_symbol)
+    symbols = []
+    values = []
     try:
-        value = ml_infer.predict(
+        for axis in payload.axes:
+            sym = id_to_symbol.get(axis.element_id)
+            if not sym:
+                raise HTTPException(status_code=404, detail=f"Element {axis.element_id} not found")
+            symbols.append(sym)
+            values.append(axis_values(axis.start, axis.stop, axis.step))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    n_points = 1
+    for v in values:
+        n_points *= len(v)
+    if n_points > ML_SWEEP_MAX_POINTS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Сетка из {n_points} точек превышает лимит {ML_SWEEP_MAX_POINTS}",
+        )
+
+    points = grid_points(values)
+    axes_info = [
+        {"element_id": axis.element_id, "symbol": sym, "points": len(v)}
+        for axis, sym, v in zip(payload.axes, symbols, values)
+    ]
+    chunk = max(ML_SWEEP_CHUNK_SIZE, 1)
+
+    async def score(block):
+        return await ml_executor.run(
+            "predict_grid",
             ml_model_id=payload.ml_model_id,
             category=payload.category,
             rolling_type=payload.rolling_type,
             size=payload.size,
-            composition_by_symbol=composition,
+            base_composition=composition,
+            axis_symbols=symbols,
+            points=block,
         )
-        return {"prop_value": value}
+
+    # первый блок считаем до начала ответа, чтобы ошибки модели вернулись кодом HTTP
+    try:
+        first = await score(points[:chunk])
+    except InferenceQueueFull as e:
+        raise _queue_full_error(e)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"ML error: {str(e)}")
+
+    def rows(block, predicted):
+        return [{"point": p, "prop_value": v} for p, v in zip(block.tolist(), predicted)]
+
+    if n_points <= chunk:
+        return {"axes": axes_info, "points": n_points, "rows": rows(points, first)}
+
+    async def stream():
+        yield json.dumps({"axes": axes_info, "points": n_points}) + "\n"
+        predicted = first
+        for start in range(0, n_points, chunk):
+            block = points[start:start + chunk]
+            if start:
+                predicted = await score(block)
+            yield "".join(json.dumps(row) + "\n" for row in rows(block, predicted))
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+class MLOptimizeBoundDTO(BaseModel):
+    element_id: int
+    min: float = 0.0
+    max: float = 100.0
+
+class MLOptimizeRequestDTO(BaseModel):
+    ml_model_id: int
+    category: str
+    rolling_type: str
+    size: float | None = None
+    bounds: list[MLOptimizeBoundDTO]
+    total: float = 100.0
+    maximize: bool = True
+    population: int = 256
+    generations: int = 40
+    top_k: int = 10
+    seed: int | None = None
+
+# Предел population * generations для одного запроса подбора состава
+ML_OPTIMIZE_MAX_EVALUATIONS = app_config.getint('ML', 'optimize_max_evaluations', fallback=100000)
+
+@router.post("/ml/optimize", status_code=200)
+async def ml_optimize(payload: MLOptimizeRequestDTO):
+    """
+    Подбор состава в границах элементов, максимизирующего (или минимизирующего) prop_value.
+    Эволюционный поиск на сервере: одно поколение кандидатов — один пакетный вызов модели.
+    """
+    if payload.population * payload.generations > ML_OPTIMIZE_MAX_EVALUATIONS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"population * generations превышает лимит {ML_OPTIMIZE_MAX_EVALUATIONS}",
+        )
+
+    id_to_symbol = element_cache.id_to_symbol()
+    bounds = {}
+    symbol_to_id = {}
+    for it in payload.bounds:
+        sym = id_to_symbol.get(it.element_id)
+        if not sym:
+            raise HTTPException(status_code=404, detail=f"Element {it.element_id} not found")
+        bounds[sym] = (it.min, it.max)
+        symbol_to_id[sym] = it.element_id
+
+    try:
+        result = await ml_executor.run(
+            "optimize",
+            ml_model_id=payload.ml_model_id,
+            category=payload.category,
+            rolling_type=payload.rolling_type,
+            size=payload.size,
+            bounds=bounds,
+            total=payload.total,
+            maximize=payload.maximize,
+            population=payload.population,
+            generations=payload.generations,
+            top_k=payload.top_k,
+            seed=payload.seed,
+        )
+    except InferenceQueueFull as e:
+        raise _queue_full_error(e)
     except ValueError as e:
         raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"ML error: {str(e)}")
+
+    result["results"] = [
+        {
+            "elements": [
+                {"element_id": symbol_to_id[sym], "percentage": pct}
+                for sym, pct in item["composition"].items()
+            ],
+            "prop_value": item["prop_value"],
+        }
+        for item in result["results"]
+    ]
+    return result
+
+
+ML_SCORE_CSV_CHUNK_SIZE = app_config.getint('ML', 'score_csv_chunk_size', fallback=10000)
+# Загрузка до этого размера держится в памяти, больше — во временном файле
+ML_SCORE_CSV_SPOOL_BYTES = 8 * 1024 * 1024
+
+@router.post("/ml/score_csv", status_code=200)
+async def ml_score_csv(request: Request, ml_model_id: int, chunk_size: int = ML_SCORE_CSV_CHUNK_SIZE):
+    """
+    Прогноз CSV-файла с составами (тело запроса — сам CSV, text/csv).
+    Столбцы: category, rolling_type, size и символы элементов; в ответ потоком
+    возвращается тот же CSV с добавленными prop_value и error.
+    Тело сначала сохраняется во временный файл (в ASGI 2.3 тело нельзя читать
+    во время потоковой отдачи), затем обрабатывается блоками по chunk_size строк —
+    один вызов модели на блок, память не зависит от размера файла.
+    Разбор и форматирование блоков идут в пуле потоков, прогноз — в пуле инференса:
+    event loop воркера не блокируется.
+    """
+    chunk_size = max(min(chunk_size, 100000), 1)
+    spool = tempfile.SpooledTemporaryFile(max_size=ML_SCORE_CSV_SPOOL_BYTES)
+    async for data in request.stream():
+        spool.write(data)
+    spool.seek(0)
+    text = io.TextIOWrapper(spool, encoding="utf-8-sig", newline="")
+    reader = csv.reader(text)
+
+    async def score(rows):
+        return await ml_executor.run("predict_table", ml_model_id=ml_model_id, columns=header, rows=rows)
+
+    # заголовок и первый блок проверяем до начала ответа, чтобы ошибки вернулись кодом HTTP
+    try:
+        header = await run_in_threadpool(csv_scoring.read_header, reader)
+        chunks = csv_scoring.iter_chunks(reader, chunk_size)
+        first = await run_in_threadpool(next, chunks, [])
+        first_result = await score(first)
+    except InferenceQueueFull as e:
+        text.close()
+        raise _queue_full_error(e)
+    except (ValueError, csv.Error) as e:
+        text.close()
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        text.close()
+        raise HTTPException(status_code=500, detail=f"ML error: {str(e)}")
+
+    async def stream():
+        try:
+            yield csv_scoring.format_header(header)
+            rows, (values, errors) = first, first_result
+            while rows:
+                yield await run_in_threadpool(csv_scoring.format_scored, rows, values, errors)
+                rows = await run_in_threadpool(next, chunks, [])
+                if rows:
+                    values, errors = await score(rows)
+        finally:
+            text.close()
+
+    return StreamingResponse(stream(), media_type="text/csv")
+
+
+@router.get("/ml/cache/stats", status_code=200)
+async def ml_cache_stats():
+    """Статистика LRU-кэша прогнозов и микро-пакетирования"""
+    return {**ml_infer.cache_stats(), "batching": ml_batcher.stats()}
+
+
+@router.get("/ml/models/status", status_code=200)
+async def ml_models_status():
+    """Состояние реестра ML-моделей: наличие файлов, загрузка, время и память"""
+    return ml_infer.models_status()
+
+
+@router.post("/ml/models/reload", status_code=200)
+async def ml_models_reload(ml_model_id: int | None = None):
+    """
+    Горячая перезагрузка ML-моделей (одной или всех) из ml_models/ без рестарта.
+    Новая версия загружается и проверяется в фоне, старая обслуживает запросы до подмены.
+    Действует на воркер, принявший запрос (при [ML] executor = process пул процессов
+    этого воркера пересоздаётся); для нескольких воркеров используйте [ML] watch_interval.
+    """
+    try:
+        results = await run_in_threadpool(ml_infer.reload, ml_model_id)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"ML reload error: {str(e)}")
+    if any(result["reloaded"] for result in results):
+        ml_executor.restart()
+    return {"results": results}
@@ -0,0 +1,118 @@
+# application/services/composition_optimizer.py
+import numpy as np
+from application.services.prediction_cache import PERCENTAGE_DECIMALS
+
+"""
+    Обратный подбор состава: какой состав в заданных границах элементов
+    даёт максимальный (или минимальный) прогноз prop_value.
+    Эволюционный поиск целиком на сервере: каждое поколение кандидатов
+    оценивается одним пакетным вызовом модели (MLInference.predict_grid),
+    каждый кандидат проецируется на границы элементов и ограничение sum = total.
+"""
+
+_BISECTION_STEPS = 60
+
+
+def project_to_bounds(X, lower, upper, total: float = 100.0) -> np.ndarray:
+    """
+    Евклидова проекция строк X на множество {lower <= x <= upper, sum(x) = total}.
+    Решение имеет вид clip(x - tau, lower, upper); tau ищется бисекцией сразу для всех строк.
+    """
+    X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+    lower = np.asarray(lower, dtype=np.float64)
+    upper = np.asarray(upper, dtype=np.float64)
+    if lower.sum() - 1e-9 > total or upper.sum() + 1e-9 < total:
+        raise ValueError(f"Границы элементов не допускают суммы {total}%: "
+                         f"минимум {lower.sum():g}, максимум {upper.sum():g}")
+
+    # при tau = lo все элементы на нижней границе, при tau = hi — на верхней
+    lo = (X - upper).min(axis=1, keepdims=True)
+    hi = (X - lower).max(axis=1, keepdims=True)
+    for _ in range(_BISECTION_STEPS):
+        tau = (lo + hi) / 2
+        too_big = np.clip(X - tau, lower, upper).sum(axis=1, keepdims=True) > total
+        lo = np.where(too_big, tau, lo)
+        hi = np.where(too_big, hi, tau)
+    return np.clip(X - (lo + hi) / 2, lower, upper)
+
+
+def optimize_composition(inference, ml_model_id: int, category: str, rolling_type: str, size,
+                         bounds: dict, total: float = 100.0, maximize: bool = True,
+                         population: int = 256, generations: int = 40, top_k: int = 10,
+                         seed: int = None) -> dict:
+    """
+    bounds: {символ: (min, max)}. Элементы вне bounds в составе не участвуют.
+    Возвращает top_k лучших различных составов и число оценок модели.
+    """
+    if not bounds:
+        raise ValueError("Не заданы границы элементов")
+    symbols = [str(sym).strip().lower() for sym in bounds]
+    lower = np.array([float(bounds[s][0]) for s in bounds])
+    upper = np.array([float(bounds[s][1]) for s in bounds])
+    if (lower < 0).any() or (upper > total).any() or (lower > upper).any():
+        raise ValueError(f"Границы элементов должны удовлетворять 0 <= min <= max <= {total:g}")
+
+    population = max(int(population), 4)
+    generations = max(int(generations), 1)
+    top_k = max(int(top_k), 1)
+    sign = 1.0 if maximize else -1.0
+    rng = np.random.default_rng(seed)
+
+    # элементы, которых нет среди признаков модели, участвуют только в сумме
+    index = inference.registry.get(int(ml_model_id)).index
+    used = [i for i, sym in enumerate(symbols) if sym in index.position]
+    used_symbols = [symbols[i] for i in used]
+    if not used:
+        raise ValueError(f"Ни один из элементов не используется моделью {ml_model_id}")
+
+    def evaluate(candidates):
+        values = inference.predict_grid(ml_model_id, category, rolling_type, size,
+                                        {}, used_symbols, candidates[:, used])
+        return np.asarray(values, dtype=np.float64)
+
+    def prepare(candidates):
+        return np.round(project_to_bounds(candidates, lower, upper, total), PERCENTAGE_DECIMALS)
+
+    elite_size = max(population // 4, 2)
+    sigma = 0.15 * (upper - lower)
+
+    pop = prepare(rng.uniform(lower, upper, size=(population, len(symbols))))
+    scores = evaluate(pop)
+    evaluations = len(pop)
+    seen = {row.tobytes(): score for row, score in zip(pop, scores)}
+
+    for generation in range(1, generations):
+        order = np.argsort(-sign * scores)[:elite_size]
+        elite, elite_scores = pop[order], scores[order]
+
+        # потомки: равномерное скрещивание двух родителей из элиты + гауссова мутация
+        n_children = population - elite_size
+        a = elite[rng.integers(0, elite_size, n_children)]
+        b = elite[rng.integers(0, elite_size, n_children)]
+        mask = rng.random(a.shape) < 0.5
+        decay = 1.0 - generation / generations
+        children = np.where(mask, a, b) + rng.normal(0.0, 1.0, a.shape) * sigma * (0.1 + decay)
+        children = prepare(children)
+
+        fresh = np.array([row.tobytes() not in seen for row in children], dtype=bool)
+        child_scores = np.empty(len(children))
+        if fresh.any():
+            child_scores[fresh] = evaluate(children[fresh])
+            evaluations += int(fresh.sum())
+        for i in np.flatnonzero(~fresh):
+            child_scores[i] = seen[children[i].tobytes()]
+        for row, score in zip(children[fresh], child_scores[fresh]):
+            seen[row.tobytes()] = score
+
+        pop = np.vstack([elite, children])
+        scores = np.concatenate([elite_scores, child_scores])
+
+    ranked = sorted(seen.items(), key=lambda item: -sign * item[1])[:top_k]
+    results = []
+    for key, score in ranked:
+        row = np.frombuffer(key, dtype=np.float64)
+        results.append({
+            "composition": {sym: float(v) for sym, v in zip(symbols, row) if v > 0},
+            "prop_value": float(score),
+        })
+    return {"results": results, "evaluations": evaluations, "generations": generations}
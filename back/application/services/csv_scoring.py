@@ -0,0 +1,77 @@
+# application/services/csv_scoring.py
+import csv
+import io
+import time
+
+"""
+    Потоковый прогноз CSV-файлов с составами-кандидатами.
+    Файл читается блоками по chunk_size строк; каждый блок превращается в матрицу
+    признаков и считается одним вызовом модели (MLInference.predict_table),
+    результат дописывается сразу — расход памяти не зависит от размера файла.
+    Входные столбцы: category, rolling_type, size и символы элементов (Fe, C, Cr, ...),
+    остальные (например, id кандидата) копируются в результат как есть.
+"""
+
+RESULT_COLUMN = "prop_value"
+ERROR_COLUMN = "error"
+
+
+def read_header(reader) -> list:
+    header = next(reader, None)
+    if not header:
+        raise ValueError("Пустой CSV: нет строки заголовка")
+    return header
+
+
+def iter_chunks(reader, chunk_size: int):
+    """Блоки непустых строк csv.reader по chunk_size штук"""
+    chunk = []
+    for row in reader:
+        if not row:
+            continue
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def format_header(header: list) -> str:
+    return format_rows([header + [RESULT_COLUMN, ERROR_COLUMN]])
+
+
+def format_scored(rows: list, values: list, errors: list) -> str:
+    return format_rows([
+        row + ["" if value is None else repr(value), error or ""]
+        for row, value, error in zip(rows, values, errors)
+    ])
+
+
+def format_rows(rows: list) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerows(rows)
+    return buffer.getvalue()
+
+
+def score_csv(inference, ml_model_id: int, src, dst, chunk_size: int = 10000) -> dict:
+    """Прогноз CSV из текстового потока src в dst; возвращает число строк, ошибок и скорость"""
+    started = time.perf_counter()
+    reader = csv.reader(src)
+    header = read_header(reader)
+    dst.write(format_header(header))
+
+    n_rows = n_errors = 0
+    for chunk in iter_chunks(reader, max(int(chunk_size), 1)):
+        values, errors = inference.predict_table(ml_model_id, header, chunk)
+        dst.write(format_scored(chunk, values, errors))
+        n_rows += len(chunk)
+        n_errors += sum(1 for err in errors if err)
+
+    seconds = time.perf_counter() - started
+    return {
+        "rows": n_rows,
+        "errors": n_errors,
+        "seconds": seconds,
+        "rows_per_second": n_rows / seconds if seconds > 0 else 0.0,
+    }
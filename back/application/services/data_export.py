@@ -0,0 +1,146 @@
+# application/services/data_export.py
+import csv
+import io
+import json
+import tempfile
+
+"""
+    Форматирование потоковой выгрузки сплавов и прогнозов с составами
+    (строки — repository_service.iter_alloys_with_compositions / iter_predictions_with_compositions).
+    Состав разворачивается по символам элементов:
+      ndjson  — объект на строку, состав — {"Fe": 95.5, "C": 0.4};
+      csv     — столбец на каждый элемент справочника, пустая ячейка — элемента нет
+                (выгрузку сплавов можно снова загрузить через /api/import/alloys);
+      arrow   — Arrow IPC stream, пакет записей на каждые batch_size строк;
+      parquet — для переобучения моделей; пишется во временный файл (метаданные
+                parquet — в конце файла) и отдаётся по мере чтения.
+    Форматы arrow и parquet требуют необязательный пакет pyarrow.
+    Данные отдаются пакетами по batch_size строк — память не зависит от размера таблицы.
+"""
+
+FORMATS = ("ndjson", "csv", "arrow", "parquet")
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+EXTENSIONS = {"ndjson": "ndjson", "csv": "csv", "arrow": "arrows", "parquet": "parquet"}
+# Текстовые поля строк выгрузки; prop_value — число с плавающей точкой, остальные — целые id
+TEXT_FIELDS = ("category", "rolling_type")
+PARQUET_READ_BYTES = 1024 * 1024
+
+
+def check_format(fmt: str):
+    """ValueError для неизвестного формата, ImportError — если для формата нет pyarrow"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Неизвестный формат выгрузки: {fmt} (ожидается {', '.join(FORMATS)})")
+    if fmt in ("arrow", "parquet"):
+        import pyarrow  # noqa: F401
+
+
+def iter_export(records, fmt: str, fields: tuple, elements: list, batch_size: int = 1000):
+    """
+    Куски выгрузки записей records в формате fmt: str для ndjson/csv, bytes для arrow/parquet.
+    elements — [(element_id, символ)] справочника в порядке столбцов.
+    """
+    check_format(fmt)
+    batches = _batches(records, max(int(batch_size), 1))
+    if fmt == "ndjson":
+        id_to_symbol = dict(elements)
+        for batch in batches:
+            yield "".join(_ndjson_line(record, fields, id_to_symbol) for record in batch)
+    elif fmt == "csv":
+        yield _csv_rows([list(fields) + [symbol for _, symbol in elements]])
+        for batch in batches:
+            yield _csv_rows([
+                [record[name] for name in fields]
+                + ["" if element_id not in record["elements"] else repr(record["elements"][element_id])
+                   for element_id, _ in elements]
+                for record in batch
+            ])
+    elif fmt == "arrow":
+        yield from _iter_arrow(batches, fields, elements)
+    else:
+        yield from _iter_parquet(batches, fields, elements)
+
+
+def _batches(records, size: int):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _ndjson_line(record: dict, fields: tuple, id_to_symbol: dict) -> str:
+    obj = {name: record[name] for name in fields}
+    obj["elements"] = {id_to_symbol.get(element_id, str(element_id)): percentage
+                       for element_id, percentage in record["elements"].items()}
+    return json.dumps(obj, ensure_ascii=False) + "\n"
+
+
+def _csv_rows(rows: list) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerows(rows)
+    return buffer.getvalue()
+
+
+# ---------- Arrow / Parquet ----------
+
+def _arrow_schema(fields: tuple, elements: list):
+    import pyarrow as pa
+    columns = []
+    for name in fields:
+        if name in TEXT_FIELDS:
+            columns.append(pa.field(name, pa.string()))
+        elif name == "prop_value":
+            columns.append(pa.field(name, pa.float64()))
+        else:
+            columns.append(pa.field(name, pa.int64()))
+    columns += [pa.field(symbol, pa.float64()) for _, symbol in elements]
+    return pa.schema(columns)
+
+
+def _record_batch(batch: list, schema, fields: tuple, elements: list):
+    import pyarrow as pa
+    arrays = [[record[name] for record in batch] for name in fields]
+    arrays += [[record["elements"].get(element_id) for record in batch] for element_id, _ in elements]
+    return pa.RecordBatch.from_arrays([pa.array(values, type=field.type) for values, field in zip(arrays, schema)],
+                                      schema=schema)
+
+
+def _iter_arrow(batches, fields: tuple, elements: list):
+    import pyarrow as pa
+    schema = _arrow_schema(fields, elements)
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for batch in batches:
+            writer.write_batch(_record_batch(batch, schema, fields, elements))
+            yield _drain(sink)
+    yield _drain(sink)
+
+
+def _drain(sink: io.BytesIO) -> bytes:
+    data = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return data
+
+
+def _iter_parquet(batches, fields: tuple, elements: list):
+    import pyarrow.parquet as pq
+    schema = _arrow_schema(fields, elements)
+    with tempfile.TemporaryFile() as f:
+        with pq.ParquetWriter(f, schema) as writer:
+            for batch in batches:
+                writer.write_batch(_record_batch(batch, schema, fields, elements))
+        f.seek(0)
+        while True:
+            data = f.read(PARQUET_READ_BYTES)
+            if not data:
+                break
+            yield data
@@ -0,0 +1,118 @@
+# application/services/data_import.py
+import csv
+import io
+import json
+
+"""
+    Разбор файлов массового импорта сплавов (см. repository_service.import_alloys).
+    Одна запись — один сплав: поля патента, сплава и состав.
+      CSV:    patent_name,authors_name,prop_value,category,rolling_type,Fe,C,Cr,...
+              (столбцы-символы элементов, пустая ячейка — элемента нет)
+      NDJSON: {"patent_name": ..., "authors_name": ..., "prop_value": ..., "category": ...,
+               "rolling_type": ..., "elements": {"Fe": 95.5, "C": 0.4}} — по объекту на строку
+      JSON:   массив таких объектов (читается целиком; для больших файлов — NDJSON или CSV)
+    Вместо patent_name/authors_name можно указать patent_id существующего патента.
+    Разбор потоковый: записи отдаются генератором, файл целиком в память не читается.
+"""
+
+IMPORT_FIELDS = (
+    "patent_id", "patent_name", "authors_name", "patent_description",
+    "prop_value", "category", "rolling_type",
+)
+FORMATS = ("csv", "ndjson", "json")
+# Столбцы выгрузки (data_export), которые при импорте не используются: id назначает БД
+IGNORED_COLUMNS = ("id",)
+
+
+def detect_format(filename: str, fallback: str = "csv") -> str:
+    name = (filename or "").lower()
+    for fmt in FORMATS:
+        if name.endswith("." + fmt) or (fmt == "ndjson" and name.endswith(".jsonl")):
+            return fmt
+    return fallback
+
+
+def iter_records(f, fmt: str):
+    """
+    Записи импорта из текстового потока f: словари
+    {"row": номер строки, "fields": {поле: значение}, "elements": {символ: процент}, "error": None | текст}
+    """
+    fmt = (fmt or "csv").lower()
+    if fmt == "csv":
+        yield from _iter_csv(f)
+    elif fmt == "ndjson":
+        yield from _iter_ndjson(f)
+    elif fmt == "json":
+        yield from _iter_json(f)
+    else:
+        raise ValueError(f"Неизвестный формат импорта: {fmt} (ожидается {', '.join(FORMATS)})")
+
+
+def _iter_csv(f):
+    reader = csv.reader(f)
+    header = next(reader, None)
+    if not header:
+        raise ValueError("Пустой CSV: нет строки заголовка")
+    names = [h.strip() for h in header]
+    keys = [name.lower() for name in names]
+    for line, row in enumerate(reader, start=2):
+        if not any(cell.strip() for cell in row):
+            continue
+        fields, elements = {}, {}
+        for name, key, value in zip(names, keys, row):
+            value = value.strip()
+            if key in IGNORED_COLUMNS:
+                continue
+            if key in IMPORT_FIELDS or key == "description":
+                fields["patent_description" if key == "description" else key] = value
+            elif value:
+                elements[name] = value
+        yield {"row": line, "fields": fields, "elements": elements, "error": None}
+
+
+def _iter_ndjson(f):
+    for line, text in enumerate(f, start=1):
+        if not text.strip():
+            continue
+        try:
+            obj = json.loads(text)
+        except json.JSONDecodeError as e:
+            yield {"row": line, "fields": {}, "elements": {}, "error": f"некорректный JSON: {e.msg}"}
+            continue
+        yield _record(line, obj)
+
+
+def _iter_json(f):
+    try:
+        data = json.load(f)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Некорректный JSON: {e.msg} (строка {e.lineno})")
+    if not isinstance(data, list):
+        raise ValueError("JSON для импорта должен быть массивом объектов")
+    for n, obj in enumerate(data, start=1):
+        yield _record(n, obj)
+
+
+def _record(row: int, obj) -> dict:
+    if not isinstance(obj, dict):
+        return {"row": row, "fields": {}, "elements": {}, "error": "запись должна быть объектом"}
+    fields = {key: obj[key] for key in IMPORT_FIELDS if key in obj}
+    if "description" in obj and "patent_description" not in fields:
+        fields["patent_description"] = obj["description"]
+    elements = obj.get("elements") or {}
+    if isinstance(elements, list):
+        # [{"symbol": "Fe", "percentage": 95.5}, ...]
+        try:
+            elements = {item["symbol"]: item["percentage"] for item in elements}
+        except (TypeError, KeyError):
+            return {"row": row, "fields": fields, "elements": {},
+                    "error": "elements: ожидается {символ: процент} или [{symbol, percentage}]"}
+    if not isinstance(elements, dict):
+        return {"row": row, "fields": fields, "elements": {},
+                "error": "elements: ожидается {символ: процент} или [{symbol, percentage}]"}
+    return {"row": row, "fields": fields, "elements": elements, "error": None}
+
+
+def open_text(binary, encoding: str = "utf-8-sig"):
+    """Текстовая обёртка над бинарным потоком (загруженный файл) без чтения его целиком"""
+    return io.TextIOWrapper(binary, encoding=encoding, newline="")
@@ -0,0 +1,95 @@
+# application/services/inference_batcher.py
+import asyncio
+
+"""
+    Микро-пакетирование одновременных запросов /api/ml/predict.
+    Запросы к одной модели, пришедшие в пределах короткого окна (несколько мс),
+    собираются в один вызов MLInference.predict_many; каждый вызывающий получает
+    своё значение через future. Для клиента API не меняется.
+"""
+
+
+class InferenceBatcher:
+    """Копит прогнозы одной модели до window_ms или max_batch строк и считает их одним вызовом"""
+
+    def __init__(self, executor, window_ms: float = 2.0, max_batch: int = 64):
+        self.executor = executor
+        self.window = max(float(window_ms), 0.0) / 1000.0
+        self.max_batch = max(int(max_batch), 1)
+        self._pending = {}
+        self._timers = {}
+        self.batches = 0
+        self.rows = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0 and self.max_batch > 1
+
+    async def predict(self, ml_model_id: int, category: str, rolling_type: str, size,
+                      composition_by_symbol: dict) -> float:
+        ml_model_id = int(ml_model_id)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        row = {
+            "category": category,
+            "rolling_type": rolling_type,
+            "size": size,
+            "composition_by_symbol": composition_by_symbol,
+        }
+
+        pending = self._pending.setdefault(ml_model_id, [])
+        pending.append((row, future))
+        if len(pending) >= self.max_batch:
+            self._flush(ml_model_id)
+        elif len(pending) == 1:
+            self._timers[ml_model_id] = loop.call_later(self.window, self._flush, ml_model_id)
+
+        return await future
+
+    def _flush(self, ml_model_id: int):
+        timer = self._timers.pop(ml_model_id, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(ml_model_id, None)
+        if not batch:
+            return
+
+        rows = [row for row, _ in batch]
+        futures = [future for _, future in batch]
+        self.batches += 1
+        self.rows += len(rows)
+
+        try:
+            done = asyncio.wrap_future(self.executor.submit("predict_many", ml_model_id=ml_model_id, rows=rows))
+        except Exception as e:
+            # например, InferenceQueueFull — получат все участники пакета
+            _resolve(futures, error=e)
+            return
+
+        def on_done(f):
+            if f.cancelled():
+                _resolve(futures, error=asyncio.CancelledError())
+            elif f.exception() is not None:
+                _resolve(futures, error=f.exception())
+            else:
+                _resolve(futures, values=f.result())
+
+        done.add_done_callback(on_done)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "rows": self.rows,
+            "avg_batch_size": self.rows / self.batches if self.batches else 0.0,
+        }
+
+
+def _resolve(futures: list, values: list = None, error: BaseException = None):
+    for i, future in enumerate(futures):
+        if future.done():
+            # вызывающий мог отменить ожидание (клиент отключился)
+            continue
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(values[i])
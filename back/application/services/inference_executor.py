@@ -0,0 +1,117 @@
+# application/services/inference_executor.py
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+"""
+    Выделенный пул для блокирующего ML-инференса.
+    predict у XGBoost/RandomForest — синхронный CPU-вызов; если выполнять его
+    прямо в async-обработчике, встаёт весь event loop воркера uvicorn.
+"""
+
+
+class InferenceQueueFull(Exception):
+    """Все слоты пула и очереди заняты — запрос нужно отклонить (503)"""
+
+
+# Экземпляр MLInference внутри процесса пула (режим process)
+_worker_inference = None
+
+
+def _init_process_worker(settings: dict, watch_interval: float = 0.0):
+    global _worker_inference
+    if _worker_inference is None:
+        # при старте через spawn/forkserver модели загружаются заново в дочернем процессе
+        # с теми же настройками, что и у родителя (MLInference.settings)
+        from application.services.ml_inference import MLInference
+        _worker_inference = MLInference(**settings)
+        _worker_inference.watch(watch_interval)
+
+
+def _call_in_process(method: str, args: tuple, kwargs: dict):
+    return getattr(_worker_inference, method)(*args, **kwargs)
+
+
+class InferenceExecutor:
+    """
+    Пул потоков (по умолчанию) или процессов для вызовов MLInference.
+    Число одновременно принятых задач ограничено: workers выполняются,
+    ещё queue_size ждут в очереди, остальные получают InferenceQueueFull.
+    """
+
+    def __init__(self, inference, kind: str = "thread", workers: int = 2,
+                 queue_size: int = 32, retry_after: int = 1):
+        self.inference = inference
+        self.kind = (kind or "thread").strip().lower()
+        self.workers = max(int(workers), 1)
+        self.queue_size = max(int(queue_size), 0)
+        self.retry_after = int(retry_after)
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+        if self.kind not in ("thread", "process"):
+            raise ValueError(f"Неизвестный тип пула инференса: {kind}")
+        self._pool = None
+        self._pool_pid = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self):
+        # Пул создаётся лениво и заново в каждом процессе: объект, созданный
+        # до fork (см. serve.py), нельзя использовать в воркере
+        if self._pool is not None and self._pool_pid == os.getpid():
+            return self._pool
+        with self._pool_lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                if self._pool_pid != os.getpid():
+                    self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+                if self.kind == "process":
+                    # при fork дочерние процессы наследуют уже загруженные модели
+                    global _worker_inference
+                    _worker_inference = self.inference
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        initializer=_init_process_worker,
+                        initargs=(self.inference.settings(), self.inference.watch_interval),
+                    )
+                else:
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ml-inference")
+                self._pool_pid = os.getpid()
+        return self._pool
+
+    def submit(self, method: str, *args, **kwargs):
+        """Ставит вызов inference.<method>(...) в пул, возвращает concurrent.futures.Future"""
+        pool = self._get_pool()
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            raise InferenceQueueFull(f"ML inference queue is full ({self.workers + self.queue_size} tasks)")
+        try:
+            if self.kind == "process":
+                future = pool.submit(_call_in_process, method, args, kwargs)
+            else:
+                future = pool.submit(getattr(self.inference, method), *args, **kwargs)
+        except Exception:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        return future
+
+    async def run(self, method: str, *args, **kwargs):
+        """Асинхронно выполняет inference.<method>(...) в пуле, не блокируя event loop"""
+        return await asyncio.wrap_future(self.submit(method, *args, **kwargs))
+
+    def restart(self):
+        """
+        Пересоздать пул процессов после перезагрузки моделей в родителе:
+        модели и кэш прогнозов процессов пула — копии, сделанные при их старте.
+        Уже принятые задачи досчитываются старым пулом. Для пула потоков ничего не делает.
+        """
+        if self.kind != "process":
+            return
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+    def shutdown(self, wait: bool = True):
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+            self._pool = None
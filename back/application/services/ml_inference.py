@@ -1,74 +1,662 @@
 # application/services/ml_inference.py
 import os
+import threading
+import time
 import joblib
 import pandas as pd
 import numpy as np
+from application.services.composition_optimizer import optimize_composition
+from application.services.prediction_cache import (
+    PredictionCache, PERCENTAGE_DECIMALS, canonical_composition, make_key,
+)
+from application.services.tree_engine import FlatTreeEnsemble, flat_path
 
-class MLInference:
-    def __init__(self):
-        base = os.path.join(os.path.dirname(__file__), "..", "ml_models")
-        base = os.path.abspath(base)
-
-        # Модель №1 (RandomForest) — как в app.py
-        self.rf_model = joblib.load(os.path.join(base, "random_forest_model.joblib"))
-        self.rf_features = joblib.load(os.path.join(base, "model_features.joblib"))
 
-        # Модель №2 (XGBoost) — из train.py (см. ниже примечание про feature columns)
-        self.xgb_model = None
-        self.xgb_selector = None
-        self.xgb_features = None
+class FeatureIndex:
+    """
+    Предвычисленное отображение "имя признака -> позиция столбца" для одной модели.
+    Строится один раз при загрузке модели, чтобы не собирать DataFrame на каждый прогноз.
+    """
 
-        xgb_model_path = os.path.join(base, "final_xgb_model.joblib")
-        xgb_selector_path = os.path.join(base, "final_feature_selector.joblib")
-        xgb_features_path = os.path.join(base, "xgb_feature_columns.joblib")  # нужно добавить
+    def __init__(self, feature_columns):
+        self.columns = [str(c) for c in feature_columns]
+        self.position = {col: i for i, col in enumerate(self.columns)}
+        self.size_pos = self.position.get("size")
 
-        if os.path.exists(xgb_model_path) and os.path.exists(xgb_selector_path) and os.path.exists(xgb_features_path):
-            self.xgb_model = joblib.load(xgb_model_path)
-            self.xgb_selector = joblib.load(xgb_selector_path)
-            self.xgb_features = joblib.load(xgb_features_path)
+    def __len__(self):
+        return len(self.columns)
 
-    def _make_frame(self, feature_columns, category, rolling_type, size, composition_by_symbol: dict):
-        df = pd.DataFrame([{col: 0 for col in feature_columns}]).astype(float)
+    def fill_row(self, x: np.ndarray, category, rolling_type, size, composition_by_symbol: dict):
+        """Заполняет строку x (уже обнулённую) признаками одного состава"""
+        position = self.position
 
         # элементы
         for sym, val in (composition_by_symbol or {}).items():
-            sym = str(sym).strip().lower()
-            if sym in df.columns:
-                df.at[0, sym] = float(val)
+            pos = position.get(str(sym).strip().lower())
+            if pos is not None:
+                x[pos] = float(val)
 
         # size (если есть)
-        if "size" in df.columns and size is not None and str(size).strip() != "":
-            df.at[0, "size"] = float(size)
+        if self.size_pos is not None and size is not None and str(size).strip() != "":
+            x[self.size_pos] = float(size)
 
-        # one-hot category/rolling (как в твоём app.py)
+        # one-hot category/rolling
         if category:
-            ccol = f"category_{category}"
-            if ccol in df.columns:
-                df.at[0, ccol] = 1.0
+            pos = position.get(f"category_{category}")
+            if pos is not None:
+                x[pos] = 1.0
 
         if rolling_type:
-            rcol = f"rolling_{rolling_type}"
-            if rcol in df.columns:
-                df.at[0, rcol] = 1.0
+            pos = position.get(f"rolling_{rolling_type}")
+            if pos is not None:
+                x[pos] = 1.0
+
+    def make_matrix(self, rows: list) -> np.ndarray:
+        """Собирает матрицу признаков (N x F) для списка составов"""
+        X = np.zeros((len(rows), len(self.columns)), dtype=np.float64)
+        for i, row in enumerate(rows):
+            self.fill_row(
+                X[i],
+                row.get("category"),
+                row.get("rolling_type"),
+                row.get("size"),
+                row.get("composition_by_symbol"),
+            )
+        return X
+
+    def is_element(self, column: str) -> bool:
+        return (column in self.position and column != "size"
+                and not column.startswith("category_") and not column.startswith("rolling_"))
+
+    def table_matrix(self, columns: list, rows: list):
+        """
+        Матрица признаков для табличных строк (CSV): столбцы category, rolling_type, size
+        и символы элементов (регистр не важен), прочие столбцы игнорируются.
+        Числовые столбцы разбираются векторно; возвращает (X, errors),
+        где errors[i] — текст ошибки разбора строки i или None.
+        """
+        names = [str(c).strip().lower() for c in columns]
+        X = np.zeros((len(rows), len(self.columns)), dtype=np.float64)
+        errors = [None] * len(rows)
+
+        for j, name in enumerate(names):
+            if self.is_element(name):
+                X[:, self.position[name]] = np.round(_float_column(rows, j, name, errors), PERCENTAGE_DECIMALS)
+            elif name == "size" and self.size_pos is not None:
+                X[:, self.size_pos] = _float_column(rows, j, name, errors)
+
+        for prefix, name in (("category_", "category"), ("rolling_", "rolling_type")):
+            if name not in names:
+                continue
+            j = names.index(name)
+            for i, row in enumerate(rows):
+                if j < len(row) and row[j]:
+                    pos = self.position.get(prefix + row[j].strip())
+                    if pos is not None:
+                        X[i, pos] = 1.0
+        return X, errors
+
+
+def _float_column(rows: list, j: int, name: str, errors: list) -> np.ndarray:
+    """Столбец j как float (пустые ячейки = 0); нечисловые ячейки отмечаются в errors"""
+    cells = [row[j].strip() if j < len(row) else "" for row in rows]
+    try:
+        return np.array([c or 0 for c in cells], dtype=np.float64)
+    except ValueError:
+        values = np.zeros(len(cells))
+        for i, c in enumerate(cells):
+            try:
+                values[i] = float(c or 0)
+            except ValueError:
+                errors[i] = errors[i] or f"{name}: не число '{c}'"
+        return values
+
+
+def _needs_frame(model) -> bool:
+    """Модель обучалась на DataFrame и сверяет имена столбцов при predict"""
+    return getattr(model, "feature_names_in_", None) is not None
+
+
+def _rss_bytes():
+    """Текущий RSS процесса (для оценки памяти, занятой моделью); None если недоступно"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def axis_values(start: float, stop: float, step: float) -> np.ndarray:
+    """Значения одной оси сетки: start, start+step, ... <= stop (с точностью процентов БД)"""
+    if step <= 0:
+        raise ValueError("Шаг сетки должен быть больше нуля")
+    if stop < start:
+        raise ValueError("Конец диапазона меньше начала")
+    if start < 0 or stop > 100:
+        raise ValueError("Диапазон процентов должен лежать в пределах 0..100")
+    count = int(np.floor((stop - start) / step + 1e-9)) + 1
+    return np.round(start + step * np.arange(count), PERCENTAGE_DECIMALS)
+
+
+def grid_points(axes: list) -> np.ndarray:
+    """Декартово произведение осей -> матрица точек (N x число осей), первая ось внешняя"""
+    mesh = np.meshgrid(*axes, indexing="ij")
+    return np.stack([m.ravel() for m in mesh], axis=1)
+
+
+ML_MODELS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "ml_models"))
+
+# Model.id -> файлы артефактов в ml_models/
+DEFAULT_MODEL_SPECS = {
+    # Модель №1 (RandomForest) — как в app.py
+    1: {"name": "RandomForest", "model": "random_forest_model.joblib", "features": "model_features.joblib"},
+    # Модель №2 (XGBoost) — из train.py
+    2: {"name": "XGBoost", "model": "final_xgb_model.joblib", "features": "xgb_feature_columns.joblib"},
+}
+
+
+class LoadedModel:
+    """
+    Загруженная модель вместе с индексом признаков и метриками загрузки.
+    compiled — плоская версия деревьев (tree_engine); она быстрее на единичных
+    строках, а большие пакеты эффективнее считает исходная модель (если загружена).
+    """
+
+    def __init__(self, model_id: int, name: str, model, feature_columns,
+                 load_seconds: float = None, memory_bytes: int = None,
+                 compiled: FlatTreeEnsemble = None, compiled_max_rows: int = 64,
+                 signature: tuple = None):
+        self.model_id = model_id
+        self.name = name
+        self.model = model
+        self.feature_columns = list(feature_columns)
+        self.index = FeatureIndex(self.feature_columns)
+        self.needs_frame = model is not None and _needs_frame(model)
+        self.load_seconds = load_seconds
+        self.memory_bytes = memory_bytes
+        self.compiled = compiled
+        self.compiled_max_rows = compiled_max_rows
+        # размеры и mtime файлов, из которых загружена модель (для отслеживания замены)
+        self.signature = signature
+        self.loaded_at = time.time()
+
+    @property
+    def engine(self) -> str:
+        if self.compiled is None:
+            return "native"
+        return "compiled" if self.model is None else "hybrid"
+
+    def predict_matrix(self, X: np.ndarray) -> list:
+        if self.compiled is not None and (self.model is None or len(X) <= self.compiled_max_rows):
+            return [float(v) for v in self.compiled.predict(X)]
+        # DataFrame оборачиваем только если модель действительно проверяет имена столбцов
+        if self.needs_frame:
+            X = pd.DataFrame(X, columns=self.index.columns, copy=False)
+        return [float(v) for v in self.model.predict(X)]
+
+
+def _validate(loaded: LoadedModel):
+    """
+    Проверяет согласованность модели и списка признаков и делает пробный прогноз:
+    битые артефакты не попадают в реестр, а ленивые структуры библиотеки
+    инициализируются до первого запроса пользователя.
+    """
+    n_columns = len(loaded.feature_columns)
+    expected = loaded.compiled.n_features if loaded.compiled is not None else None
+    if loaded.model is not None:
+        expected = getattr(loaded.model, "n_features_in_", expected)
+    if expected is not None and int(expected) != n_columns:
+        raise ValueError(f"Модель {loaded.model_id} ожидает {expected} признаков, "
+                         f"а в файле признаков их {n_columns}")
+    names = getattr(loaded.model, "feature_names_in_", None)
+    if names is not None and list(names) != loaded.feature_columns:
+        raise ValueError(f"Имена признаков модели {loaded.model_id} не совпадают с файлом признаков")
+
+    X = loaded.index.make_matrix([{"composition_by_symbol": {}}])
+    values = loaded.predict_matrix(X)
+    if loaded.compiled is not None and loaded.model is not None:
+        # в гибридном режиме прогреваем и путь исходной модели
+        values += loaded.predict_matrix(np.repeat(X, loaded.compiled_max_rows + 1, axis=0))[:1]
+    if not np.isfinite(values).all():
+        raise ValueError(f"Модель {loaded.model_id} вернула некорректный пробный прогноз")
+
+
+class ModelRegistry:
+    """
+    Реестр моделей: Model.id -> артефакты.
+    Модель загружается при первом обращении (или фоновым прогревом),
+    отсутствующие файлы не мешают старту воркера и работе остальных моделей.
+    """
+
+    def __init__(self, base_dir: str = None, specs: dict = None, mmap_mode: str = None,
+                 engine: str = "native", compiled_max_rows: int = 64):
+        self.base_dir = base_dir or ML_MODELS_DIR
+        # native — predict самой библиотеки; compiled — плоские массивы tree_engine
+        self.engine = (engine or "native").strip().lower()
+        self.compiled_max_rows = int(compiled_max_rows)
+        self.specs = {int(k): dict(v) for k, v in (specs or DEFAULT_MODEL_SPECS).items()}
+        # mmap_mode='r': NumPy-массивы несжатых joblib-файлов отображаются в память
+        # и разделяются всеми процессами через page cache
+        self.mmap_mode = mmap_mode or None
+        self._loaded = {}
+        self._errors = {}
+        self._locks = {model_id: threading.Lock() for model_id in self.specs}
+        # перезагрузка идёт под отдельной блокировкой: запросы продолжают брать старую модель
+        self._reload_locks = {model_id: threading.Lock() for model_id in self.specs}
+
+    def _paths(self, model_id: int) -> dict:
+        spec = self.specs[model_id]
+        return {key: os.path.join(self.base_dir, spec[key]) for key in ("model", "features")}
+
+    def missing_files(self, model_id: int) -> list:
+        return [os.path.basename(p) for p in self._paths(model_id).values() if not os.path.exists(p)]
+
+    def is_available(self, model_id: int) -> bool:
+        return model_id in self.specs and not self.missing_files(model_id)
+
+    def is_loaded(self, model_id: int) -> bool:
+        return model_id in self._loaded
 
-        # гарантируем порядок колонок
-        df = df.reindex(columns=list(feature_columns), fill_value=0)
-        return df
+    def is_current(self, loaded: LoadedModel) -> bool:
+        """Модель всё ещё обслуживает запросы (не заменена перезагрузкой)"""
+        return self._loaded.get(loaded.model_id) is loaded
+
+    def loaded_models(self) -> list:
+        return list(self._loaded.values())
+
+    def artifact_signature(self, model_id: int) -> tuple:
+        """(размер, mtime) файлов модели, признаков и .flat.npz; None для отсутствующих"""
+        paths = self._paths(model_id)
+        result = []
+        for path in (paths["model"], paths["features"], flat_path(paths["model"])):
+            try:
+                st = os.stat(path)
+                result.append((st.st_size, st.st_mtime_ns))
+            except OSError:
+                result.append(None)
+        return tuple(result)
+
+    def _check_available(self, model_id: int):
+        if model_id not in self.specs:
+            raise ValueError(f"Неизвестная ml_model_id={model_id}")
+        missing = self.missing_files(model_id)
+        if missing:
+            raise ValueError(f"Модель {model_id} не настроена: нет {', '.join(missing)}")
+
+    def _load(self, model_id: int) -> LoadedModel:
+        paths = self._paths(model_id)
+        # подпись снимаем до чтения: если файл заменят во время загрузки, это будет видно
+        signature = self.artifact_signature(model_id)
+        rss_before = _rss_bytes()
+        started = time.perf_counter()
+
+        model, compiled = None, None
+        if self.engine == "compiled":
+            # готовый .flat.npz (python -m application.services.tree_engine ...) позволяет
+            # вообще не распаковывать исходную модель и не импортировать xgboost
+            npz = flat_path(paths["model"])
+            if os.path.exists(npz) and os.path.getmtime(npz) >= os.path.getmtime(paths["model"]):
+                compiled = FlatTreeEnsemble.load(npz)
+        if compiled is None:
+            model = joblib.load(paths["model"], mmap_mode=self.mmap_mode)
+            if self.engine == "compiled":
+                try:
+                    compiled = FlatTreeEnsemble.from_model(model)
+                except NotImplementedError as e:
+                    print(f"Warning: model {model_id} can't be compiled, using native predict: {e}")
+        features = joblib.load(paths["features"])
+
+        load_seconds = time.perf_counter() - started
+        rss_after = _rss_bytes()
+        memory_bytes = rss_after - rss_before if rss_before is not None and rss_after is not None else None
+        loaded = LoadedModel(model_id, self.specs[model_id].get("name"), model, features,
+                             load_seconds=load_seconds, memory_bytes=memory_bytes,
+                             compiled=compiled, compiled_max_rows=self.compiled_max_rows,
+                             signature=signature)
+        _validate(loaded)
+        return loaded
+
+    def get(self, model_id: int) -> LoadedModel:
+        """Возвращает загруженную модель, при необходимости загружая её"""
+        model_id = int(model_id)
+        loaded = self._loaded.get(model_id)
+        if loaded is not None:
+            return loaded
+
+        self._check_available(model_id)
+
+        with self._locks[model_id]:
+            loaded = self._loaded.get(model_id)
+            if loaded is None:
+                try:
+                    loaded = self._load(model_id)
+                except Exception as e:
+                    self._errors[model_id] = str(e)
+                    raise
+                self._errors.pop(model_id, None)
+                self._loaded[model_id] = loaded
+        return loaded
+
+    def reload(self, model_id: int) -> LoadedModel:
+        """
+        Загружает артефакты заново, проверяет и прогревает их, затем атомарно
+        подменяет модель в реестре. Запросы, уже получившие старую модель, досчитываются
+        на ней; при ошибке продолжает работать старая.
+        """
+        model_id = int(model_id)
+        self._check_available(model_id)
+        with self._reload_locks[model_id]:
+            try:
+                loaded = self._load(model_id)
+            except Exception as e:
+                self._errors[model_id] = f"reload failed: {e}"
+                raise
+            self._errors.pop(model_id, None)
+            self._loaded[model_id] = loaded
+        return loaded
+
+    def load_all(self) -> list:
+        """Синхронно загружает все модели, у которых есть файлы; возвращает их id"""
+        loaded = []
+        for model_id in self.specs:
+            if not self.is_available(model_id):
+                continue
+            try:
+                self.get(model_id)
+                loaded.append(model_id)
+            except Exception as e:
+                print(f"Warning: could not load ML model {model_id}: {e}")
+        return loaded
+
+    def warm_up(self) -> threading.Thread:
+        """Прогревает модели в фоновом потоке, не задерживая старт воркера"""
+        thread = threading.Thread(target=self.load_all, name="ml-warm-up", daemon=True)
+        thread.start()
+        return thread
+
+    def unload(self, model_id: int = None):
+        if model_id is None:
+            self._loaded.clear()
+        else:
+            self._loaded.pop(int(model_id), None)
+
+    def status(self) -> list:
+        result = []
+        for model_id, spec in self.specs.items():
+            loaded = self._loaded.get(model_id)
+            result.append({
+                "ml_model_id": model_id,
+                "name": spec.get("name"),
+                "available": self.is_available(model_id),
+                "missing_files": self.missing_files(model_id),
+                "loaded": loaded is not None,
+                "engine": loaded.engine if loaded else None,
+                "load_seconds": loaded.load_seconds if loaded else None,
+                "memory_bytes": loaded.memory_bytes if loaded else None,
+                "loaded_at": loaded.loaded_at if loaded else None,
+                "error": self._errors.get(model_id),
+            })
+        return result
+
+
+class MLInference:
+    def __init__(self, cache_size: int = 4096, base_dir: str = None, specs: dict = None,
+                 mmap_mode: str = None, engine: str = "native", compiled_max_rows: int = 64):
+        # LRU-кэш прогнозов: одинаковые составы не прогоняются через модель повторно
+        self.cache = PredictionCache(cache_size)
+        # модели грузятся лениво — конструктор не трогает диск
+        self.registry = ModelRegistry(base_dir, specs, mmap_mode=mmap_mode,
+                                      engine=engine, compiled_max_rows=compiled_max_rows)
+        self.watch_interval = 0.0
+        self._watch_stop = None
+        self._fork_hook = False
+
+    def settings(self) -> dict:
+        """Аргументы конструктора, с которыми создан экземпляр (для процессов пула инференса)"""
+        registry = self.registry
+        return {
+            "cache_size": self.cache.max_size,
+            "base_dir": registry.base_dir,
+            "specs": registry.specs,
+            "mmap_mode": registry.mmap_mode,
+            "engine": registry.engine,
+            "compiled_max_rows": registry.compiled_max_rows,
+        }
+
+    def reload(self, ml_model_id: int = None) -> list:
+        """
+        Горячая перезагрузка моделей (одной или всех доступных) без рестарта воркера:
+        новая версия загружается и прогревается рядом со старой, подменяется
+        атомарно, после чего сбрасываются её прогнозы в кэше.
+        """
+        if ml_model_id is not None:
+            model_ids = [int(ml_model_id)]
+        else:
+            model_ids = [model_id for model_id in self.registry.specs if self.registry.is_available(model_id)]
+
+        results = []
+        for model_id in model_ids:
+            try:
+                loaded = self.registry.reload(model_id)
+            except Exception as e:
+                if ml_model_id is not None:
+                    raise
+                results.append({"ml_model_id": model_id, "reloaded": False, "error": str(e)})
+                continue
+            self.cache.invalidate_model(model_id)
+            results.append({"ml_model_id": model_id, "reloaded": True,
+                            "load_seconds": loaded.load_seconds, "error": None})
+        return results
+
+    def watch(self, interval: float):
+        """
+        Следит за файлами загруженных моделей и перезагружает изменившиеся.
+        Работает в каждом процессе (после fork поток запускается заново),
+        поэтому подхватывает новые артефакты во всех воркерах.
+        """
+        self.watch_interval = float(interval)
+        if self.watch_interval <= 0:
+            return
+        self._start_watcher()
+        if not self._fork_hook and hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._start_watcher)
+            self._fork_hook = True
+
+    def stop_watching(self):
+        """Останавливает наблюдение в текущем процессе (дочерние процессы запустят своё)"""
+        if self._watch_stop is not None:
+            self._watch_stop.set()
+            self._watch_stop = None
+
+    def _start_watcher(self):
+        if self.watch_interval <= 0:
+            return
+        self._watch_stop = threading.Event()
+        threading.Thread(target=self._watch_loop, args=(self._watch_stop,),
+                         name="ml-model-watch", daemon=True).start()
+
+    def _watch_loop(self, stop: threading.Event):
+        pending = {}
+        failed = {}
+        while not stop.wait(self.watch_interval):
+            for loaded in self.registry.loaded_models():
+                model_id = loaded.model_id
+                signature = self.registry.artifact_signature(model_id)
+                if signature == loaded.signature or signature == failed.get(model_id):
+                    pending.pop(model_id, None)
+                    continue
+                # файл ещё копируется, пока подпись меняется между опросами
+                if pending.get(model_id) != signature:
+                    pending[model_id] = signature
+                    continue
+                try:
+                    self.reload(model_id)
+                    print(f"ML model {model_id} reloaded from changed artifacts")
+                except Exception as e:
+                    failed[model_id] = signature
+                    print(f"Warning: could not reload ML model {model_id}: {e}")
+                pending.pop(model_id, None)
 
     def predict(self, ml_model_id: int, category: str, rolling_type: str, size, composition_by_symbol: dict) -> float:
+        row = {
+            "category": category,
+            "rolling_type": rolling_type,
+            "size": size,
+            "composition_by_symbol": composition_by_symbol,
+        }
+        return self.predict_many(ml_model_id, [row])[0]
+
+    def predict_many(self, ml_model_id: int, rows: list) -> list:
+        """
+        Пакетный прогноз: rows — список словарей с ключами
+        category, rolling_type, size, composition_by_symbol.
+        Модель вызывается один раз (только для составов, которых нет в кэше),
+        порядок результатов совпадает с порядком rows.
+        """
         ml_model_id = int(ml_model_id)
+        loaded = self.registry.get(ml_model_id)
+        if not rows:
+            return []
+
+        results = [None] * len(rows)
+        missing_pos, missing_keys, missing_rows = [], [], []
+        for i, row in enumerate(rows):
+            # Состав приводим к точности БД: и ключ кэша, и вход модели одинаковы
+            composition = canonical_composition(row.get("composition_by_symbol"))
+            key = make_key(ml_model_id, row.get("category"), row.get("rolling_type"), row.get("size"), composition)
+            cached = self.cache.get(key)
+            if cached is not None:
+                results[i] = cached
+                continue
+            missing_pos.append(i)
+            missing_keys.append(key)
+            missing_rows.append({
+                "category": row.get("category"),
+                "rolling_type": row.get("rolling_type"),
+                "size": row.get("size"),
+                "composition_by_symbol": dict(composition),
+            })
+
+        if missing_rows:
+            X = loaded.index.make_matrix(missing_rows)
+            values = loaded.predict_matrix(X)
+            # модель могли заменить во время расчёта — её значения в кэш не кладём
+            current = self.registry.is_current(loaded)
+            for pos, key, value in zip(missing_pos, missing_keys, values):
+                results[pos] = value
+                if current:
+                    self.cache.put(key, value)
+
+        return results
+
+    def predict_grid(self, ml_model_id: int, category: str, rolling_type: str, size,
+                     base_composition: dict, axis_symbols: list, points) -> list:
+        """
+        Прогноз по сетке составов: базовый состав, в котором значения элементов
+        axis_symbols заменены на столбцы points (N x len(axis_symbols)).
+        Матрица строится повторением одной базовой строки, модель вызывается один раз.
+        """
+        loaded = self.registry.get(int(ml_model_id))
+        points = np.asarray(points, dtype=np.float64).reshape(-1, len(axis_symbols))
+        if len(points) == 0:
+            return []
+
+        positions = []
+        for sym in axis_symbols:
+            pos = loaded.index.position.get(str(sym).strip().lower())
+            if pos is None:
+                raise ValueError(f"Элемент {sym} не используется моделью {ml_model_id}")
+            positions.append(pos)
+
+        base = loaded.index.make_matrix([{
+            "category": category,
+            "rolling_type": rolling_type,
+            "size": size,
+            "composition_by_symbol": dict(canonical_composition(base_composition)),
+        }])
+        X = np.repeat(base, len(points), axis=0)
+        X[:, positions] = np.round(points, PERCENTAGE_DECIMALS)
+        return loaded.predict_matrix(X)
+
+    def predict_table(self, ml_model_id: int, columns: list, rows: list):
+        """
+        Векторный прогноз табличного блока (CSV) одним вызовом модели, без кэша.
+        Возвращает (values, errors); для строк с ошибкой разбора значение None.
+        """
+        loaded = self.registry.get(int(ml_model_id))
+        names = [str(c).strip().lower() for c in columns]
+        if not any(loaded.index.is_element(name) for name in names):
+            raise ValueError(f"В таблице нет столбцов элементов, известных модели {ml_model_id}")
+        if not rows:
+            return [], []
+
+        X, errors = loaded.index.table_matrix(columns, rows)
+        values = loaded.predict_matrix(X)
+        return [None if err else v for v, err in zip(values, errors)], errors
+
+    def explain(self, ml_model_id: int, category: str, rolling_type: str, size,
+                composition_by_symbol: dict, delta: float = 1.0) -> dict:
+        """
+        Прогноз с вкладами элементов состава. Для каждого элемента в одной матрице
+        возмущений (1 + 3 строки на элемент, один вызов модели) считаются:
+        contribution — на сколько изменится прогноз, если элемент убрать (x - f(без элемента)),
+        sensitivity — центральная разность на 1% содержания (шаг delta, в пределах 0..100).
+        Деревья кусочно-постоянны, поэтому delta берётся порядка процента, а не бесконечно малым.
+        """
+        if delta <= 0:
+            raise ValueError("Шаг delta должен быть больше нуля")
+        loaded = self.registry.get(int(ml_model_id))
+        composition = dict(canonical_composition(composition_by_symbol))
+        base = loaded.index.make_matrix([{
+            "category": category,
+            "rolling_type": rolling_type,
+            "size": size,
+            "composition_by_symbol": composition,
+        }])
+
+        used = [(sym, loaded.index.position[sym]) for sym in composition if sym in loaded.index.position]
+        X = np.repeat(base, 1 + 3 * len(used), axis=0)
+        steps = []
+        for k, (sym, pos) in enumerate(used):
+            value = composition[sym]
+            up, down = min(value + delta, 100.0), max(value - delta, 0.0)
+            X[1 + 3 * k, pos] = 0.0
+            X[2 + 3 * k, pos] = up
+            X[3 + 3 * k, pos] = down
+            steps.append(up - down)
+        values = loaded.predict_matrix(X)
 
-        if ml_model_id == 1:
-            X = self._make_frame(self.rf_features, category, rolling_type, size, composition_by_symbol)
-            pred = self.rf_model.predict(X)[0]
-            return float(pred)
+        base_value = values[0]
+        contributions = []
+        by_symbol = {sym: k for k, (sym, _) in enumerate(used)}
+        for sym, percentage in composition.items():
+            k = by_symbol.get(sym)
+            if k is None:
+                # элемент не входит в признаки модели и на прогноз не влияет
+                contributions.append({"symbol": sym, "percentage": percentage, "used": False,
+                                      "contribution": 0.0, "sensitivity": 0.0})
+                continue
+            contributions.append({
+                "symbol": sym,
+                "percentage": percentage,
+                "used": True,
+                "contribution": base_value - values[1 + 3 * k],
+                "sensitivity": (values[2 + 3 * k] - values[3 + 3 * k]) / steps[k] if steps[k] else 0.0,
+            })
+        return {"prop_value": base_value, "contributions": contributions}
 
-        if ml_model_id == 2:
-            if self.xgb_model is None or self.xgb_features is None:
-                raise ValueError("XGBoost модель не настроена: нет final_xgb_model / xgb_feature_columns")
+    def optimize(self, ml_model_id: int, category: str, rolling_type: str, size,
+                 bounds: dict, **options) -> dict:
+        """Подбор состава в границах bounds {символ: (min, max)}, см. composition_optimizer"""
+        return optimize_composition(self, ml_model_id, category, rolling_type, size, bounds, **options)
 
-            X = self._make_frame(self.xgb_features, category, rolling_type, size, composition_by_symbol)
-            pred = self.xgb_model.predict(X)[0]
-            return float(pred)
+    def cache_stats(self) -> dict:
+        return self.cache.stats()
 
-        raise ValueError(f"Неизвестная ml_model_id={ml_model_id}")
+    def models_status(self) -> list:
+        return self.registry.status()
@@ -0,0 +1,34 @@
+# application/services/pagination.py
+import base64
+import json
+
+"""
+    Курсорная (keyset) пагинация списков: страница — «id > последнего id прошлой страницы»
+    по индексу первичного ключа, поэтому стоимость страницы не зависит от её глубины
+    (в отличие от OFFSET, который читает и отбрасывает skip строк).
+    Курсор для клиента непрозрачен: base64 от {"after_id": ...}.
+"""
+
+
+def encode_cursor(after_id: int) -> str:
+    data = json.dumps({"after_id": int(after_id)}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """after_id из курсора; ValueError для испорченного курсора"""
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        after_id = json.loads(data)["after_id"]
+    except (ValueError, TypeError, KeyError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(after_id, int) or isinstance(after_id, bool):
+        raise ValueError("Invalid cursor")
+    return after_id
+
+
+def next_cursor(items: list, limit: int):
+    """Курсор следующей страницы или None, если страница неполная (дальше записей нет)"""
+    if not items or len(items) < limit:
+        return None
+    return encode_cursor(items[-1].id)
@@ -0,0 +1,93 @@
+# application/services/prediction_cache.py
+import threading
+from collections import OrderedDict
+
+"""
+    LRU-кэш результатов ML-прогнозов.
+    Ключ — канонический кортеж состава, поэтому повторный запуск того же
+    состава из PredictionForm не вызывает модель повторно.
+"""
+
+# Точность хранения процентов в БД: Numeric(5, 3)
+PERCENTAGE_DECIMALS = 3
+
+
+def canonical_composition(composition_by_symbol: dict) -> tuple:
+    """Отсортированный по символу состав, округлённый до точности БД, без нулевых элементов"""
+    items = {}
+    for sym, val in (composition_by_symbol or {}).items():
+        value = round(float(val), PERCENTAGE_DECIMALS)
+        if value == 0:
+            continue
+        items[str(sym).strip().lower()] = value
+    return tuple(sorted(items.items()))
+
+
+def canonical_size(size):
+    if size is None or str(size).strip() == "":
+        return None
+    return float(size)
+
+
+def make_key(ml_model_id: int, category, rolling_type, size, composition: tuple) -> tuple:
+    return (int(ml_model_id), category or "", rolling_type or "", canonical_size(size), composition)
+
+
+class PredictionCache:
+    """Ограниченный по размеру LRU-кэш со счётчиками попаданий/промахов/вытеснений"""
+
+    def __init__(self, max_size: int = 4096):
+        self.max_size = max(int(max_size), 0)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def get(self, key):
+        """Возвращает значение или None (промах)"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_model(self, ml_model_id: int):
+        """Удаляет все записи одной модели (например, после перезагрузки её файла)"""
+        ml_model_id = int(ml_model_id)
+        with self._lock:
+            for key in [k for k in self._data if k[0] == ml_model_id]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,106 @@
+# application/services/reference_cache.py
+import threading
+import time
+
+"""
+    Процессный кэш справочных данных (химические элементы).
+    Справочник меняется крайне редко, поэтому читаем его из БД один раз
+    и держим в памяти воркера; TTL ограничивает рассинхронизацию между воркерами.
+"""
+
+
+class ElementCache:
+    """Кэш таблицы chemical_element: id <-> символ"""
+
+    def __init__(self, ttl: float = 300.0, session_factory=None):
+        self.ttl = float(ttl)
+        self._session_factory = session_factory
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._elements = []
+        self._by_id = {}
+        self._by_symbol = {}
+        self._id_to_symbol = {}
+        self._symbol_to_id = {}
+
+    def configure(self, ttl: float = None, session_factory=None):
+        if ttl is not None:
+            self.ttl = float(ttl)
+        if session_factory is not None:
+            self._session_factory = session_factory
+        self.invalidate()
+
+    def invalidate(self):
+        """Сбросить кэш: следующее обращение перечитает справочник из БД"""
+        with self._lock:
+            self._loaded_at = None
+
+    def _is_fresh(self) -> bool:
+        if self._loaded_at is None:
+            return False
+        return self.ttl <= 0 or (time.monotonic() - self._loaded_at) < self.ttl
+
+    def _load(self):
+        session_factory = self._session_factory
+        if session_factory is None:
+            from application.config import SessionLocal
+            session_factory = SessionLocal
+
+        from application.models.dao import ChemicalElement
+
+        db = session_factory()
+        try:
+            rows = db.query(
+                ChemicalElement.id,
+                ChemicalElement.name,
+                ChemicalElement.atomic_number,
+                ChemicalElement.symbol,
+            ).all()
+        finally:
+            db.close()
+
+        elements = [
+            {"id": int(r.id), "name": r.name, "atomic_number": r.atomic_number, "symbol": r.symbol}
+            for r in rows
+        ]
+        self._elements = elements
+        self._by_id = {e["id"]: e for e in elements}
+        # символ ищется без учёта регистра, как в запросе к БД (collation MariaDB)
+        self._by_symbol = {str(e["symbol"]).lower(): e for e in elements}
+        self._id_to_symbol = {e["id"]: str(e["symbol"]).lower() for e in elements}
+        self._symbol_to_id = {sym: el_id for el_id, sym in self._id_to_symbol.items()}
+        self._loaded_at = time.monotonic()
+
+    def _ensure_loaded(self):
+        if self._is_fresh():
+            return
+        with self._lock:
+            if not self._is_fresh():
+                self._load()
+
+    def get_all(self) -> list:
+        self._ensure_loaded()
+        return list(self._elements)
+
+    def get_by_id(self, element_id: int):
+        self._ensure_loaded()
+        return self._by_id.get(int(element_id))
+
+    def get_by_symbol(self, symbol: str):
+        """Элемент по символу без учёта регистра: "fe", "Fe" и "FE" — железо"""
+        self._ensure_loaded()
+        return self._by_symbol.get(str(symbol).strip().lower())
+
+    def id_to_symbol(self) -> dict:
+        """{element_id: символ в нижнем регистре} — в том виде, как их ждёт MLInference"""
+        self._ensure_loaded()
+        return self._id_to_symbol
+
+    def symbol_to_id(self) -> dict:
+        """{символ в нижнем регистре: element_id}"""
+        self._ensure_loaded()
+        return self._symbol_to_id
+
+
+# Единственный экземпляр на процесс
+element_cache = ElementCache()
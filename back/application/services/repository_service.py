@@ -1,7 +1,13 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import bindparam, exists, func, inspect, select, text, update
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.dialects import mysql, postgresql, sqlite
 from typing import List, Optional, Type
 from application.models.dao import *
+from application.services.reference_cache import element_cache
+from application.services.text_search import text_condition
 import functools
+import time
 import traceback
 from typing import TypeVar, Any
 
@@ -199,7 +205,7 @@ def remove_element_from_alloy(db: Session, alloy_id: int, element_id: int):
 def add_element_to_prediction(db: Session, prediction_id: int, element_id: int, percentage: float):
     """Добавляет связь между прогнозом и химическим элементом с указанием процентного содержания"""
     # Проверяем существование сплава и элемента через ORM
-    prediction = db.query(Prediction).filter(Prediction.id == prediction_id).first()
+    prediction = _lock_prediction(db, prediction_id)
     if not prediction:
         raise ValueError(f"Prediction with id {prediction_id} not found")
 
@@ -224,6 +230,7 @@ def add_element_to_prediction(db: Session, prediction_id: int, element_id: int,
 
     # Создаем новую связь
     try:
+        had_composition = _has_composition(db, prediction_id)
         stmt = prediction_element_association.insert().values(
             prediction_id=prediction_id,
             element_id=element_id,
@@ -231,6 +238,9 @@ def add_element_to_prediction(db: Session, prediction_id: int, element_id: int,
         )
 
         db.execute(stmt)
+        _count_elements(db, [element_id], 1)
+        if not had_composition:
+            _count_composition(db, _stats_keys(prediction), 1)
         db.commit()
 
         # Исправляем запрос для получения созданной записи:
@@ -306,7 +316,7 @@ def remove_element_from_prediction(db: Session, prediction_id: int, element_id:
     """Удаляет связь между прогнозом и химическим элементом"""
 
     # 1. Проверяем существование прогноза
-    prediction = db.query(Prediction).filter(Prediction.id == prediction_id).first()
+    prediction = _lock_prediction(db, prediction_id)
     if not prediction:
         raise ValueError(f"Prediction with id {prediction_id} not found")
 
@@ -334,12 +344,16 @@ def remove_element_from_prediction(db: Session, prediction_id: int, element_id:
         )
 
         result = db.execute(stmt)
-        db.commit()
 
         if result.rowcount == 0:
             # На случай, если запись была удалена параллельным процессом
             raise ValueError(f"Association not found or already deleted")
 
+        _count_elements(db, [element_id], -1)
+        if not _has_composition(db, prediction_id):
+            _count_composition(db, _stats_keys(prediction), -1)
+        db.commit()
+
         return True  # Успешное удаление
 
     except Exception as e:
@@ -356,8 +370,12 @@ def get_alloys_by_patent(db: Session, patent_id: int) -> List[Type[Alloy]]:
     return db.query(Alloy).filter(Alloy.patent_id == patent_id).all()
 
 @dbexception
-def get_all_alloys(db: Session, skip: int = 0, limit: int = 100) -> List[Type[Alloy]]:
-    return db.query(Alloy).offset(skip).limit(limit).all()
+def get_all_alloys(db: Session, skip: int = 0, limit: int = 100, after_id: int = None) -> List[Type[Alloy]]:
+    """Страница по возрастанию id: after_id — keyset-пагинация по первичному ключу, иначе OFFSET skip"""
+    query = db.query(Alloy).order_by(Alloy.id)
+    if after_id is not None:
+        return query.filter(Alloy.id > after_id).limit(limit).all()
+    return query.offset(skip).limit(limit).all()
 
 @dbexception
 def update_alloy(db: Session, alloy_id: int, **kwargs) -> Optional[Alloy]:
@@ -390,25 +408,33 @@ def create_prediction(db: Session, prop_value: float, category: str, ml_model_id
         person_id=person_id
     )
     db.add(prediction)
+    _count_prediction(db, _stats_keys(prediction), 1)
     db.commit()
     db.refresh(prediction)
     return prediction
 
 @dbexception
 def update_prediction(db: Session, prediction_id: int, **kwargs) -> Optional[Prediction]:
-    prediction = db.query(Prediction).filter(Prediction.id == prediction_id).first()
+    prediction = _lock_prediction(db, prediction_id)
     if prediction:
+        before = _stats_keys(prediction)
         for key, value in kwargs.items():
             if hasattr(prediction, key):
                 setattr(prediction, key, value)
+        if _stats_keys(prediction) != before:
+            # прогноз переходит в другие группы статистики
+            element_ids = _composition_element_ids(db, prediction_id)
+            _count_prediction(db, before, -1, element_ids, count_elements=False)
+            _count_prediction(db, _stats_keys(prediction), 1, element_ids, count_elements=False)
         db.commit()
         db.refresh(prediction)
     return prediction
 
 @dbexception
 def delete_prediction(db: Session, prediction_id: int) -> bool:
-    prediction = db.query(Prediction).filter(Prediction.id == prediction_id).first()
+    prediction = _lock_prediction(db, prediction_id)
     if prediction:
+        _count_prediction(db, _stats_keys(prediction), -1, _composition_element_ids(db, prediction_id))
         db.delete(prediction)
         db.commit()
         return True
@@ -432,8 +458,12 @@ def get_predictions_by_element(db: Session, element_id: int) -> List[Type[Predic
     ).all()
 
 @dbexception
-def get_all_predictions(db: Session, skip: int = 0, limit: int = 100) -> List[Type[Prediction]]:
-    return db.query(Prediction).offset(skip).limit(limit).all()
+def get_all_predictions(db: Session, skip: int = 0, limit: int = 100, after_id: int = None) -> List[Type[Prediction]]:
+    """Страница прогнозов — как get_all_alloys"""
+    query = db.query(Prediction).order_by(Prediction.id)
+    if after_id is not None:
+        return query.filter(Prediction.id > after_id).limit(limit).all()
+    return query.offset(skip).limit(limit).all()
 
 @dbexception
 def create_patent(db: Session, authors_name: str, patent_name: str, description: str = None) -> Patent:
@@ -464,8 +494,12 @@ def get_patent_by_name(db: Session, patent_name: str) -> Optional[Patent]:
     return db.query(Patent).filter(Patent.patent_name == patent_name).first()
 
 @dbexception
-def get_all_patents(db: Session, skip: int = 0, limit: int = 100) -> List[Type[Patent]]:
-    return db.query(Patent).offset(skip).limit(limit).all()
+def get_all_patents(db: Session, skip: int = 0, limit: int = 100, after_id: int = None) -> List[Type[Patent]]:
+    """Страница патентов — как get_all_alloys"""
+    query = db.query(Patent).order_by(Patent.id)
+    if after_id is not None:
+        return query.filter(Patent.id > after_id).limit(limit).all()
+    return query.offset(skip).limit(limit).all()
 
 @dbexception
 def update_patent(db: Session, patent_id: int, **kwargs) -> Optional[Patent]:
@@ -496,6 +530,8 @@ def create_chemical_element(db: Session, name: str, atomic_number: int, symbol:
             symbol=symbol
         )
         db.add(element)
+        # Справочник элементов изменился — сбрасываем процессный кэш
+        element_cache.invalidate()
         # Не делаем commit здесь - это сделает декоратор @dbexception
         return element
 
@@ -624,6 +660,9 @@ def delete_person(db: Session, person_id: int) -> bool:
     person = db.query(Person).filter(Person.id == person_id).first()
     if person:
         db.delete(person)
+        # пользователя с прогнозами удалить не даст внешний ключ; строку статистики
+        # (нулевые счётчики после удаления его прогнозов) убираем вместе с ним
+        db.execute(PersonPredictionStats.__table__.delete().where(PersonPredictionStats.person_id == person_id))
         db.commit()
         return True
     return False
@@ -637,8 +676,12 @@ def get_persons_by_role(db: Session, role_id: int) -> List[Type[Person]]:
     return db.query(Person).filter(Person.role_id == role_id).all()
 
 @dbexception
-def get_all_persons(db: Session, skip: int = 0, limit: int = 100) -> List[Type[Person]]:
-    return db.query(Person).offset(skip).limit(limit).all()
+def get_all_persons(db: Session, skip: int = 0, limit: int = 100, after_id: int = None) -> List[Type[Person]]:
+    """Страница пользователей — как get_all_alloys"""
+    query = db.query(Person).order_by(Person.id)
+    if after_id is not None:
+        return query.filter(Person.id > after_id).limit(limit).all()
+    return query.offset(skip).limit(limit).all()
 
 @dbexception
 def get_alloys_with_details(db: Session):
@@ -649,8 +692,78 @@ def get_predictions_with_details(db: Session):
     return db.query(Prediction).join(Person).all()
 
 @dbexception
-def search_alloys_by_category(db: Session, category: str) -> List[Type[Alloy]]:
-    return db.query(Alloy).filter(Alloy.category.ilike(f"%{category}%")).all()
+def search_alloys_by_category(db: Session, category: str, match: str = "contains") -> List[Type[Alloy]]:
+    """
+    Сплавы по категории без учёта регистра: match = exact | prefix | contains.
+    Все режимы — по индексу alloy.category_norm (см. text_search)
+    """
+    return db.query(Alloy).filter(text_condition(Alloy.category_norm, category, match)).all()
+
+
+@dbexception
+def search_patents(db: Session, patent_name: str = None, authors_name: str = None, match: str = "contains",
+                   skip: int = 0, limit: int = 100) -> List[Type[Patent]]:
+    """Патенты по названию и/или авторам — как search_alloys_by_category; по алфавиту искомого поля"""
+    query = db.query(Patent)
+    order = []
+    if patent_name is not None:
+        query = query.filter(text_condition(Patent.patent_name_norm, patent_name, match))
+        order.append(Patent.patent_name_norm)
+    if authors_name is not None:
+        query = query.filter(text_condition(Patent.authors_name_norm, authors_name, match))
+        order.append(Patent.authors_name_norm)
+    return query.order_by(*order, Patent.id).offset(skip).limit(limit).all()
+
+
+# {таблица: [(исходный столбец, нормализованный столбец)]} — поиск идёт по *_norm (text_search)
+SEARCH_COLUMNS = {
+    Alloy.__table__: [('category', 'category_norm')],
+    Patent.__table__: [('patent_name', 'patent_name_norm'), ('authors_name', 'authors_name_norm')],
+}
+SEARCH_BACKFILL_BATCH = 1000
+
+
+def ensure_search_columns(db: Session, full: bool = False) -> dict:
+    """
+    Добавляет в таблицы, созданные до появления поиска, недостающие столбцы *_norm
+    и их индексы и заполняет их. full=True — пересчитать *_norm во всех строках.
+    {таблица: [добавленные столбцы, нормализовано строк]}
+    """
+    bind = db.get_bind()
+    result = {}
+    for table, pairs in SEARCH_COLUMNS.items():
+        existing = {column['name'] for column in inspect(bind).get_columns(table.name)}
+        added = [norm for _, norm in pairs if norm not in existing]
+        for norm in added:
+            ddl = CreateColumn(table.c[norm]).compile(dialect=bind.dialect)
+            db.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+        db.commit()
+        for index in table.indexes:
+            if any(column.name.endswith('_norm') for column in index.columns):
+                index.create(bind=bind, checkfirst=True)
+        rows = _backfill_search_columns(db, table, pairs) if added or full else 0
+        result[table.name] = [added, rows]
+    return result
+
+
+def _backfill_search_columns(db: Session, table, pairs) -> int:
+    """Заполняет *_norm пакетами по первичному ключу, транзакция на пакет"""
+    sources = [table.c[source] for source, _ in pairs]
+    statement = update(table).where(table.c.id == bindparam('_id')).values(
+        {norm: bindparam(f'_{norm}') for _, norm in pairs})
+    last_id, total = 0, 0
+    while True:
+        rows = db.execute(select(table.c.id, *sources).where(table.c.id > last_id)
+                          .order_by(table.c.id).limit(SEARCH_BACKFILL_BATCH)).all()
+        if not rows:
+            return total
+        db.execute(statement, [
+            {'_id': row.id, **{f'_{norm}': normalize_search_text(row._mapping[source]) for source, norm in pairs}}
+            for row in rows
+        ])
+        db.commit()
+        last_id, total = rows[-1].id, total + len(rows)
+
 
 def get_alloys_count(db: Session) -> int:
     return db.query(Alloy).count()
@@ -658,107 +771,381 @@ def get_alloys_count(db: Session) -> int:
 def get_chemical_element_by_symbol(db: Session, symbol: str):
     return db.query(ChemicalElement).filter(ChemicalElement.symbol == symbol).first()
 
+# Numeric(5, 3) в ассоциативных таблицах
+MAX_PERCENTAGE = 99.999
+
+
+def _composition_rows(db: Session, element_percentages: dict) -> list:
+    """
+    Проверяет состав {element_id: percentage} одним запросом к chemical_element
+    и возвращает строки для многострочного INSERT в ассоциативную таблицу
+    """
+    rows = [
+        {'element_id': int(element_id), 'percentage': min(float(percentage), MAX_PERCENTAGE)}
+        for element_id, percentage in (element_percentages or {}).items()
+    ]
+    for row in rows:
+        if row['percentage'] <= 0:
+            raise ValueError(f"Percentage for element {row['element_id']} must be positive")
+    if rows:
+        ids = {row['element_id'] for row in rows}
+        found = set(db.scalars(select(ChemicalElement.id).where(ChemicalElement.id.in_(ids))))
+        missing = sorted(ids - found)
+        if missing:
+            raise ValueError(f"Element with id {missing[0]} not found")
+    return rows
+
+
+# ---------- Статистика прогнозов ----------
+# Таблицы prediction_stats, person_prediction_stats, element_prediction_stats (см. dao)
+# обновляются в той же транзакции, что и сами прогнозы; отчёты читают только их.
+
+def _stats_keys(prediction) -> tuple:
+    """(category, rolling_type, ml_model_id, person_id) прогноза в виде ключей статистики"""
+    return (prediction.category or '', prediction.rolling_type or '', prediction.ml_model_id, prediction.person_id)
+
+
+def _bump(db: Session, table, key_columns: tuple, rows: list):
+    """
+    Прибавляет к счётчикам строк статистики приращения из rows (словари: ключ + счётчики).
+    Один upsert-запрос (executemany для нескольких строк): ON DUPLICATE KEY UPDATE в MariaDB/MySQL,
+    ON CONFLICT в SQLite/PostgreSQL.
+    """
+    if not rows:
+        return
+    counters = [name for name in rows[0] if name not in key_columns]
+    dialect = db.get_bind().dialect.name
+    if dialect in ("mysql", "mariadb"):
+        stmt = mysql.insert(table)
+        stmt = stmt.on_duplicate_key_update({name: table.c[name] + stmt.inserted[name] for name in counters})
+    elif dialect in ("sqlite", "postgresql"):
+        stmt = (sqlite.insert if dialect == "sqlite" else postgresql.insert)(table)
+        stmt = stmt.on_conflict_do_update(index_elements=list(key_columns),
+                                          set_={name: table.c[name] + stmt.excluded[name] for name in counters})
+    else:
+        for row in rows:
+            key = [table.c[name] == row[name] for name in key_columns]
+            updated = db.execute(table.update().where(*key).values(
+                {name: table.c[name] + row[name] for name in counters}))
+            if updated.rowcount == 0:
+                db.execute(table.insert().values(row))
+        return
+    db.execute(stmt, rows)
+
+
+def _count_prediction(db: Session, keys: tuple, sign: int, element_ids=(), count_elements: bool = True):
+    """Учитывает прогноз с ключами keys (_stats_keys) и составом element_ids со знаком sign (+1 / -1)"""
+    category, rolling_type, ml_model_id, person_id = keys
+    _bump(db, PredictionStats.__table__, ("category", "rolling_type", "ml_model_id"), [{
+        "category": category, "rolling_type": rolling_type, "ml_model_id": ml_model_id,
+        "count": sign, "with_composition": sign if element_ids else 0,
+    }])
+    _bump(db, PersonPredictionStats.__table__, ("person_id",), [{"person_id": person_id, "count": sign}])
+    if count_elements:
+        _count_elements(db, element_ids, sign)
+
+
+def _count_composition(db: Session, keys: tuple, sign: int):
+    """Прогноз с ключами keys получил первый элемент состава (+1) или потерял последний (-1)"""
+    category, rolling_type, ml_model_id, _ = keys
+    _bump(db, PredictionStats.__table__, ("category", "rolling_type", "ml_model_id"), [{
+        "category": category, "rolling_type": rolling_type, "ml_model_id": ml_model_id, "with_composition": sign,
+    }])
+
+
+def _count_elements(db: Session, element_ids, sign: int):
+    _bump(db, ElementPredictionStats.__table__, ("element_id",),
+          [{"element_id": element_id, "count": sign} for element_id in element_ids])
+
+
+def _lock_prediction(db: Session, prediction_id: int) -> Optional[Prediction]:
+    """
+    Прогноз под SELECT ... FOR UPDATE: изменения одного прогноза, влияющие на статистику,
+    идут по очереди, и проверка «был ли состав» не расходится со счётчиками
+    """
+    return (db.query(Prediction).filter(Prediction.id == prediction_id)
+            .populate_existing().with_for_update().first())
+
+
+# Состав читается блокирующим чтением — актуальные строки, а не снимок начала транзакции
+def _has_composition(db: Session, prediction_id: int) -> bool:
+    return db.scalar(select(prediction_element_association.c.element_id)
+                     .where(prediction_element_association.c.prediction_id == prediction_id)
+                     .limit(1).with_for_update()) is not None
+
+
+def _composition_element_ids(db: Session, prediction_id: int) -> list:
+    return list(db.scalars(select(prediction_element_association.c.element_id)
+                           .where(prediction_element_association.c.prediction_id == prediction_id)
+                           .with_for_update()))
+
+
+def _expected_prediction_stats(db: Session) -> dict:
+    """Статистика, посчитанная заново по базовым таблицам: {таблица: {ключ: счётчики}}"""
+    category = func.coalesce(Prediction.category, '')
+    rolling_type = func.coalesce(Prediction.rolling_type, '')
+    groups = db.execute(
+        select(category, rolling_type, Prediction.ml_model_id,
+               func.count(func.distinct(Prediction.id)),
+               func.count(func.distinct(prediction_element_association.c.prediction_id)))
+        .outerjoin(prediction_element_association, prediction_element_association.c.prediction_id == Prediction.id)
+        .group_by(category, rolling_type, Prediction.ml_model_id)
+    )
+    persons = db.execute(select(Prediction.person_id, func.count(Prediction.id)).group_by(Prediction.person_id))
+    elements = db.execute(
+        select(prediction_element_association.c.element_id, func.count())
+        .group_by(prediction_element_association.c.element_id)
+    )
+    return {
+        PredictionStats: {(c, r, m): (n, w) for c, r, m, n, w in groups},
+        PersonPredictionStats: {(person_id,): (n,) for person_id, n in persons},
+        ElementPredictionStats: {(element_id,): (n,) for element_id, n in elements},
+    }
+
+
+_STATS_COLUMNS = {
+    PredictionStats: (("category", "rolling_type", "ml_model_id"), ("count", "with_composition")),
+    PersonPredictionStats: (("person_id",), ("count",)),
+    ElementPredictionStats: (("element_id",), ("count",)),
+}
+
+
+def rebuild_prediction_stats(db: Session) -> dict:
+    """Пересчитывает таблицы статистики по базовым таблицам одной транзакцией; {таблица: строк}"""
+    try:
+        expected = _expected_prediction_stats(db)
+        result = {}
+        for dao, stats in expected.items():
+            keys, counters = _STATS_COLUMNS[dao]
+            db.execute(dao.__table__.delete())
+            rows = [dict(zip(keys + counters, key + values)) for key, values in stats.items()]
+            if rows:
+                db.execute(dao.__table__.insert(), rows)
+            result[dao.__tablename__] = len(rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return result
+
+
+STATS_TABLES = [PredictionStats.__table__, PersonPredictionStats.__table__, ElementPredictionStats.__table__]
+
+
+def ensure_prediction_stats(db: Session) -> bool:
+    """
+    Создаёт недостающие таблицы статистики и заполняет их, если они новые
+    или пусты при непустой prediction (БД, созданная до появления статистики).
+    True — статистика пересчитана.
+    """
+    bind = db.get_bind()
+    missing = [table for table in STATS_TABLES if not inspect(bind).has_table(table.name)]
+    if missing:
+        Base.metadata.create_all(bind=bind, tables=missing)
+    elif (db.scalar(select(PredictionStats.count).limit(1)) is not None
+          or db.scalar(select(Prediction.id).limit(1)) is None):
+        return False
+    rebuild_prediction_stats(db)
+    return True
+
+
+def check_prediction_stats(db: Session) -> list:
+    """
+    Сверка таблиц статистики с базовыми таблицами: [{table, key, expected, actual}] по расхождениям.
+    Строки с нулевыми счётчиками равны отсутствующим.
+    """
+    mismatches = []
+    for dao, expected in _expected_prediction_stats(db).items():
+        keys, counters = _STATS_COLUMNS[dao]
+        table = dao.__table__
+        actual = {
+            tuple(row[:len(keys)]): tuple(row[len(keys):])
+            for row in db.execute(select(*[table.c[name] for name in keys + counters]))
+        }
+        zero = (0,) * len(counters)
+        for key in sorted(set(expected) | set(actual), key=str):
+            if expected.get(key, zero) != actual.get(key, zero):
+                mismatches.append({
+                    "table": dao.__tablename__, "key": dict(zip(keys, key)),
+                    "expected": dict(zip(counters, expected.get(key, zero))),
+                    "actual": dict(zip(counters, actual.get(key, zero))),
+                })
+    return mismatches
+
+
 def create_alloy_with_elements(db: Session, prop_value: float, category: str, rolling_type: str,
                               patent_id: int, element_percentages: dict):
     """
-    Создает сплав с несколькими химическими элементами
+    Создает сплав с несколькими химическими элементами одной транзакцией:
+    строка сплава и все строки состава (один многострочный INSERT), один commit.
     element_percentages: словарь {element_id: percentage, ...}
     """
-    # Создаем сплав
-    alloy = create_alloy(
-        db,
-        prop_value=prop_value,
-        category=category,
-        rolling_type=rolling_type,
-        patent_id=patent_id
-    )
-
-    # Связываем сплав с элементами и указываем процентное содержание
-    for element_id, percentage in element_percentages.items():
-        percentage = min(float(percentage), 99.999)
-        add_element_to_alloy(
-            db,
-            alloy_id=alloy.id,
-            element_id=element_id,
-            percentage=percentage
+    rows = _composition_rows(db, element_percentages)
+    try:
+        alloy = Alloy(
+            prop_value=prop_value,
+            category=category,
+            rolling_type=rolling_type,
+            patent_id=patent_id,
         )
-
+        db.add(alloy)
+        db.flush()
+        if rows:
+            db.execute(alloy_element_association.insert().values(
+                [{'alloy_id': alloy.id, **row} for row in rows]
+            ))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    db.refresh(alloy)
     return alloy
 
 
 def create_prediction_with_elements(db: Session, prop_value: float, category: str, ml_model_id: int,
                                    rolling_type: str, person_id: int, element_percentages: dict):
     """
-    Создает прогноз с несколькими химическими элементами
+    Создает прогноз с несколькими химическими элементами одной транзакцией
+    (один многострочный INSERT состава, один commit).
     element_percentages: словарь {element_id: percentage, ...}
     """
-    # Создаем прогноз
-    prediction = create_prediction(
-        db,
-        prop_value=prop_value,
-        category=category,
-        ml_model_id=ml_model_id,
-        rolling_type=rolling_type,
-        person_id=person_id
-    )
-
-    # Связываем прогноз с элементами и указываем процентное содержание
-    for element_id, percentage in element_percentages.items():
-        percentage = min(float(percentage), 99.999)
-        add_element_to_prediction(
-            db,
-            prediction_id=prediction.id,
-            element_id=element_id,
-            percentage=percentage
+    rows = _composition_rows(db, element_percentages)
+    try:
+        prediction = Prediction(
+            prop_value=prop_value,
+            category=category,
+            ml_model_id=ml_model_id,
+            rolling_type=rolling_type,
+            person_id=person_id
         )
-
+        db.add(prediction)
+        db.flush()
+        if rows:
+            db.execute(prediction_element_association.insert().values(
+                [{'prediction_id': prediction.id, **row} for row in rows]
+            ))
+        _count_prediction(db, _stats_keys(prediction), 1, [row['element_id'] for row in rows])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    db.refresh(prediction)
     return prediction
 
 def get_alloy_elements_with_percentages(db: Session, alloy_id: int):
-    """Получает элементы сплава с их процентным содержанием"""
-    alloy = db.query(Alloy).filter(Alloy.id == alloy_id).first()
-    if alloy:
-        elements_with_percentages = []
-        for element in alloy.elements:
-            # Получаем процентное содержание из ассоциативной таблицы
-            assoc = db.execute(
-                alloy_element_association.select().where(
-                    alloy_element_association.c.alloy_id == alloy_id,
-                    alloy_element_association.c.element_id == element.id
-                )
-            ).first()
-            if assoc:
-                elements_with_percentages.append({
-                    'element_id': element.id,  # ← ИЗМЕНИТЬ
-                    'element_name': element.name,  # ← ИЗМЕНИТЬ
-                    'element_symbol': element.symbol,  # ← ИЗМЕНИТЬ
-                    'element_atomic_number': element.atomic_number,  # ← ИЗМЕНИТЬ
-                    'percentage': float(assoc.percentage)  # Конвертируем Decimal в float
-                })
-        return elements_with_percentages
-    return []
+    """Получает элементы сплава с их процентным содержанием (один запрос с JOIN)"""
+    rows = db.execute(
+        select(
+            ChemicalElement.id,
+            ChemicalElement.name,
+            ChemicalElement.symbol,
+            ChemicalElement.atomic_number,
+            alloy_element_association.c.percentage,
+        )
+        .join(alloy_element_association, alloy_element_association.c.element_id == ChemicalElement.id)
+        .where(alloy_element_association.c.alloy_id == alloy_id)
+        .order_by(ChemicalElement.id)
+    ).all()
+    return [
+        {
+            'element_id': element_id,
+            'element_name': name,
+            'element_symbol': symbol,
+            'element_atomic_number': atomic_number,
+            'percentage': float(percentage)  # Конвертируем Decimal в float
+        }
+        for element_id, name, symbol, atomic_number, percentage in rows
+    ]
+
+def get_alloys_elements_with_percentages(db: Session, alloy_ids: list = None, skip: int = 0,
+                                         limit: int = 100) -> dict:
+    """
+    Составы нескольких сплавов одним запросом: {alloy_id: [элементы как в get_alloy_elements_with_percentages]}.
+    Сплавы задаются списком alloy_ids или тем же окном skip/limit, что и get_all_alloys.
+    """
+    query = (
+        select(
+            alloy_element_association.c.alloy_id,
+            ChemicalElement.id,
+            ChemicalElement.name,
+            ChemicalElement.symbol,
+            ChemicalElement.atomic_number,
+            alloy_element_association.c.percentage,
+        )
+        .join(ChemicalElement, ChemicalElement.id == alloy_element_association.c.element_id)
+        .order_by(alloy_element_association.c.alloy_id, ChemicalElement.id)
+    )
+    if alloy_ids is not None:
+        result = {int(alloy_id): [] for alloy_id in alloy_ids}
+        if not result:
+            return result
+        query = query.where(alloy_element_association.c.alloy_id.in_(list(result)))
+    else:
+        result = {}
+        # окно через производную таблицу: MariaDB не поддерживает LIMIT внутри IN (...)
+        window = select(Alloy.id).order_by(Alloy.id).offset(skip).limit(limit).subquery()
+        query = query.join(window, window.c.id == alloy_element_association.c.alloy_id)
+
+    for alloy_id, element_id, name, symbol, atomic_number, percentage in db.execute(query):
+        result.setdefault(alloy_id, []).append({
+            'element_id': element_id,
+            'element_name': name,
+            'element_symbol': symbol,
+            'element_atomic_number': atomic_number,
+            'percentage': float(percentage)
+        })
+    return result
 
 def get_prediction_elements_with_percentages(db: Session, prediction_id: int):
-    """Получает элементы прогноза с их процентным содержанием"""
-    prediction = db.query(Prediction).filter(Prediction.id == prediction_id).first()
-    if prediction:
-        elements_with_percentages = []
-        for element in prediction.elements:
-            # Получаем процентное содержание из ассоциативной таблицы
-            assoc = db.execute(
-                prediction_element_association.select().where(
-                    prediction_element_association.c.prediction_id == prediction_id,  # ← ИСПРАВЛЕНО
-                    prediction_element_association.c.element_id == element.id
-                )
-            ).first()
-            if assoc:
-                elements_with_percentages.append({
-                    'prediction_id': prediction_id,  # ← исправлено для соответствия DTO
-                    'element_id': element.id,
-                    'percentage': float(assoc.percentage)
-                })
-        return elements_with_percentages
-    return []
+    """Получает элементы прогноза с их процентным содержанием (один запрос к ассоциативной таблице)"""
+    rows = db.execute(
+        select(
+            prediction_element_association.c.element_id,
+            prediction_element_association.c.percentage,
+        )
+        .where(prediction_element_association.c.prediction_id == prediction_id)
+        .order_by(prediction_element_association.c.element_id)
+    ).all()
+    return [
+        {
+            'prediction_id': prediction_id,
+            'element_id': element_id,
+            'percentage': float(percentage)
+        }
+        for element_id, percentage in rows
+    ]
+
+def get_predictions_elements_with_percentages(db: Session, prediction_ids: list = None, skip: int = 0,
+                                              limit: int = 100) -> dict:
+    """
+    Составы нескольких прогнозов одним запросом: {prediction_id: [элементы]}.
+    Прогнозы задаются списком prediction_ids или окном skip/limit, как в get_all_predictions.
+    """
+    query = (
+        select(
+            prediction_element_association.c.prediction_id,
+            prediction_element_association.c.element_id,
+            prediction_element_association.c.percentage,
+        )
+        .order_by(prediction_element_association.c.prediction_id, prediction_element_association.c.element_id)
+    )
+    if prediction_ids is not None:
+        result = {int(prediction_id): [] for prediction_id in prediction_ids}
+        if not result:
+            return result
+        query = query.where(prediction_element_association.c.prediction_id.in_(list(result)))
+    else:
+        result = {}
+        window = select(Prediction.id).order_by(Prediction.id).offset(skip).limit(limit).subquery()
+        query = query.join(window, window.c.id == prediction_element_association.c.prediction_id)
+
+    for prediction_id, element_id, percentage in db.execute(query):
+        result.setdefault(prediction_id, []).append({
+            'prediction_id': prediction_id,
+            'element_id': element_id,
+            'percentage': float(percentage)
+        })
+    return result
 
 
 @dbexception
@@ -807,4 +1194,422 @@ def get_predictions_by_model(db: Session, model_id: int) -> List[Type[Prediction
 
 @dbexception
 def get_all_models(db: Session) -> List[Type[Model]]:
-    return db.query(Model).all()
\ No newline at end of file
+    return db.query(Model).all()
+
+# ---------- Составные фильтры списков ----------
+
+# Поля сортировки списков; "-поле" — по убыванию, при равенстве — по id
+SORT_FIELDS = ("id", "prop_value", "category", "rolling_type")
+
+
+def filter_alloys(db: Session, category: str = None, rolling_type: str = None, prop_min: float = None,
+                  prop_max: float = None, patent_id: int = None, elements: list = None, sort: str = "id",
+                  skip: int = 0, limit: int = 100, after_id: int = None) -> List[Type[Alloy]]:
+    """
+    Сплавы по набору условий — один SQL-запрос (индексы — в dao.Alloy и alloy_element_association).
+    elements: [(element_id, мин. процент | None, макс. процент | None)] — сплав должен содержать
+    каждый из элементов в своём диапазоне (условие EXISTS на каждый элемент).
+    after_id — keyset-пагинация, только для sort="id" / "-id".
+    """
+    return _filter_list(db, Alloy, alloy_element_association.c.alloy_id, alloy_element_association,
+                        {"category": category, "rolling_type": rolling_type, "patent_id": patent_id},
+                        prop_min, prop_max, elements, sort, skip, limit, after_id)
+
+
+def filter_predictions(db: Session, category: str = None, rolling_type: str = None, prop_min: float = None,
+                       prop_max: float = None, person_id: int = None, ml_model_id: int = None,
+                       elements: list = None, sort: str = "id", skip: int = 0, limit: int = 100,
+                       after_id: int = None) -> List[Type[Prediction]]:
+    """Прогнозы по набору условий — как filter_alloys"""
+    return _filter_list(db, Prediction, prediction_element_association.c.prediction_id,
+                        prediction_element_association,
+                        {"category": category, "rolling_type": rolling_type, "person_id": person_id,
+                         "ml_model_id": ml_model_id},
+                        prop_min, prop_max, elements, sort, skip, limit, after_id)
+
+
+def _filter_list(db: Session, model, owner_column, association, equals: dict, prop_min, prop_max,
+                 elements, sort, skip, limit, after_id):
+    descending = (sort or "id").startswith("-")
+    field = (sort or "id").lstrip("-")
+    if field not in SORT_FIELDS:
+        raise ValueError(f"Unknown sort field: {field} (expected one of {', '.join(SORT_FIELDS)})")
+    if after_id is not None and field != "id":
+        raise ValueError("Cursor pagination is only supported with sort=id or sort=-id")
+
+    query = db.query(model)
+    for name, value in equals.items():
+        if value is not None:
+            query = query.filter(getattr(model, name) == value)
+    if prop_min is not None:
+        query = query.filter(model.prop_value >= prop_min)
+    if prop_max is not None:
+        query = query.filter(model.prop_value <= prop_max)
+    for element_id, low, high in elements or ():
+        conditions = [owner_column == model.id, association.c.element_id == element_id]
+        if low is not None:
+            conditions.append(association.c.percentage >= low)
+        if high is not None:
+            conditions.append(association.c.percentage <= high)
+        query = query.filter(exists().where(*conditions))
+
+    column = getattr(model, field)
+    order = [column.desc() if descending else column]
+    if field != "id":
+        order.append(model.id.desc() if descending else model.id)
+    query = query.order_by(*order)
+    if after_id is not None:
+        query = query.filter(model.id < after_id if descending else model.id > after_id)
+    else:
+        query = query.offset(skip)
+    return query.limit(limit).all()
+
+
+# ---------- Отчёты ----------
+# Разрезы по прогнозам читаются из таблиц статистики (см. «Статистика прогнозов») —
+# несколько строк на группу вместо GROUP BY по всем прогнозам и их составам.
+
+def get_report_totals(db: Session) -> dict:
+    """Число строк основных таблиц — одним запросом из скалярных подзапросов"""
+    tables = {
+        "users": Person, "roles": Role, "elements": ChemicalElement,
+        "alloys": Alloy, "patents": Patent, "models": Model,
+    }
+    columns = [
+        select(func.count()).select_from(table).scalar_subquery().label(name)
+        for name, table in tables.items()
+    ]
+    columns.append(select(func.coalesce(func.sum(PredictionStats.count), 0)).scalar_subquery().label("predictions"))
+    row = db.execute(select(*columns)).one()
+    return dict(row._mapping)
+
+
+def _group_counts(db: Session, query, limit: int = None) -> list:
+    """[{"name", "count"}] по запросу (ключ, SUM счётчика), по убыванию количества, без нулевых групп"""
+    key, count = query.selected_columns[0], query.selected_columns[1]
+    query = query.having(count > 0).order_by(count.desc(), key)
+    if limit is not None:
+        query = query.limit(limit)
+    return [{"name": name, "count": int(n)} for name, n in db.execute(query)]
+
+
+def get_users_by_role(db: Session) -> list:
+    count = func.count(Person.id).label("count")
+    return _group_counts(db, select(Role.name, count).join(Person, Person.role_id == Role.id).group_by(Role.name))
+
+
+def get_predictions_by_field(db: Session, field: str, limit: int = None) -> list:
+    """Прогнозы по category / rolling_type / model (название модели)"""
+    count = func.sum(PredictionStats.count).label("count")
+    if field == "model":
+        query = (select(Model.name, count).join(PredictionStats, PredictionStats.ml_model_id == Model.id)
+                 .group_by(Model.name))
+    elif field in ("category", "rolling_type"):
+        column = getattr(PredictionStats, field)
+        # в статистике «не указано» хранится пустой строкой
+        query = select(func.nullif(column, '').label(field), count).group_by(column)
+    else:
+        raise ValueError(f"Unknown prediction field: {field}")
+    return _group_counts(db, query, limit)
+
+
+def get_top_organizations(db: Session, limit: int = 10) -> list:
+    """Организации по числу прогнозов их пользователей"""
+    count = func.sum(PersonPredictionStats.count).label("count")
+    query = (
+        select(Person.organization, count)
+        .join(PersonPredictionStats, PersonPredictionStats.person_id == Person.id)
+        .group_by(Person.organization)
+    )
+    return _group_counts(db, query, limit)
+
+
+def get_most_active_users(db: Session, limit: int = 10) -> list:
+    rows = db.execute(
+        select(Person.id, Person.login, Person.first_name, Person.last_name, Person.organization, Role.name,
+               PersonPredictionStats.count)
+        .join(PersonPredictionStats, PersonPredictionStats.person_id == Person.id)
+        .outerjoin(Role, Role.id == Person.role_id)
+        .where(PersonPredictionStats.count > 0)
+        .order_by(PersonPredictionStats.count.desc(), Person.login)
+        .limit(limit)
+    )
+    return [
+        {
+            "person_id": person_id, "login": login, "first_name": first_name, "last_name": last_name,
+            "organization": organization, "role": role, "count": n,
+        }
+        for person_id, login, first_name, last_name, organization, role, n in rows
+    ]
+
+
+def get_element_ranking(db: Session, limit: int = 15) -> dict:
+    """Как часто элементы встречаются в составах прогнозов (по всем прогнозам)"""
+    rows = db.execute(
+        select(ChemicalElement.id, ChemicalElement.name, ChemicalElement.symbol, ElementPredictionStats.count)
+        .join(ElementPredictionStats, ElementPredictionStats.element_id == ChemicalElement.id)
+        .where(ElementPredictionStats.count > 0)
+        .order_by(ElementPredictionStats.count.desc(), ChemicalElement.name)
+        .limit(limit)
+    )
+    used = db.scalar(select(func.coalesce(func.sum(PredictionStats.with_composition), 0)))
+    return {
+        "elements": [
+            {"element_id": element_id, "name": name, "symbol": symbol, "count": n}
+            for element_id, name, symbol, n in rows
+        ],
+        "predictions_with_composition": int(used),
+    }
+
+
+def get_recent_predictions(db: Session, limit: int = 10) -> List[Type[Prediction]]:
+    return db.query(Prediction).order_by(Prediction.id.desc()).limit(limit).all()
+
+
+def get_reports_summary(db: Session, top: int = 10) -> dict:
+    """Все блоки сводки страницы отчётов: небольшие результаты GROUP BY вместо полных таблиц"""
+    return {
+        "totals": get_report_totals(db),
+        "users_by_role": get_users_by_role(db),
+        "top_organizations": get_top_organizations(db, top),
+        "most_active_users": get_most_active_users(db, top),
+        "element_ranking": get_element_ranking(db),
+        "predictions_by_category": get_predictions_by_field(db, "category", top),
+        "predictions_by_rolling_type": get_predictions_by_field(db, "rolling_type", top),
+        "predictions_by_model": get_predictions_by_field(db, "model", top),
+        "recent_predictions": get_recent_predictions(db, top),
+    }
+
+
+# ---------- Потоковая выгрузка ----------
+
+# Поля строк выгрузки (кроме состава) — в порядке столбцов CSV
+ALLOY_EXPORT_FIELDS = ("id", "patent_id", "prop_value", "category", "rolling_type")
+PREDICTION_EXPORT_FIELDS = ("id", "person_id", "ml_model_id", "prop_value", "category", "rolling_type")
+
+
+def iter_alloys_with_compositions(db: Session, batch_size: int = 1000):
+    """
+    Все сплавы с составом: генератор словарей {поле: значение, ..., "elements": {element_id: процент}}.
+    Один запрос (сплав LEFT JOIN состав, по возрастанию id) читается серверным курсором
+    пакетами по batch_size строк — ни ORM-объектов, ни всей таблицы в памяти.
+    """
+    query = (
+        select(Alloy.id, Alloy.patent_id, Alloy.prop_value, Alloy.category, Alloy.rolling_type,
+               alloy_element_association.c.element_id, alloy_element_association.c.percentage)
+        .outerjoin(alloy_element_association, alloy_element_association.c.alloy_id == Alloy.id)
+        .order_by(Alloy.id)
+    )
+    return _iter_with_compositions(db, query, ALLOY_EXPORT_FIELDS, batch_size)
+
+
+def iter_predictions_with_compositions(db: Session, batch_size: int = 1000):
+    """Все прогнозы с составом — как iter_alloys_with_compositions"""
+    query = (
+        select(Prediction.id, Prediction.person_id, Prediction.ml_model_id, Prediction.prop_value,
+               Prediction.category, Prediction.rolling_type,
+               prediction_element_association.c.element_id, prediction_element_association.c.percentage)
+        .outerjoin(prediction_element_association, prediction_element_association.c.prediction_id == Prediction.id)
+        .order_by(Prediction.id)
+    )
+    return _iter_with_compositions(db, query, PREDICTION_EXPORT_FIELDS, batch_size)
+
+
+def _iter_with_compositions(db: Session, query, fields: tuple, batch_size: int):
+    n_fields = len(fields)
+    current = None
+    for row in db.execute(query.execution_options(yield_per=max(int(batch_size), 1))):
+        if current is None or current["id"] != row[0]:
+            if current is not None:
+                yield current
+            current = dict(zip(fields, row[:n_fields]))
+            if current["prop_value"] is not None:
+                current["prop_value"] = float(current["prop_value"])
+            current["elements"] = {}
+        element_id, percentage = row[n_fields], row[n_fields + 1]
+        if element_id is not None:
+            current["elements"][element_id] = float(percentage)
+    if current is not None:
+        yield current
+
+
+# ---------- Массовый импорт ----------
+
+# Сколько ошибок по строкам хранить в отчёте (счётчик failed считает все)
+IMPORT_MAX_ERRORS = 1000
+
+
+def import_alloys(db: Session, records, chunk_size: int = 1000) -> dict:
+    """
+    Массовый импорт сплавов с патентами и составами (записи — data_import.iter_records).
+    Символы элементов разрешаются по заранее загруженному справочнику, записи пишутся
+    пакетами по chunk_size: патенты и сплавы — пакетной вставкой ORM, состав — одним
+    executemany в ассоциативную таблицу, один commit на пакет.
+    Ошибочные строки попадают в отчёт и не прерывают загрузку.
+    """
+    started = time.perf_counter()
+    chunk_size = max(int(chunk_size), 1)
+    symbol_to_id = {
+        symbol.strip().lower(): element_id
+        for element_id, symbol in db.execute(select(ChemicalElement.id, ChemicalElement.symbol))
+    }
+    patent_ids = {}
+    report = {"rows": 0, "imported": 0, "failed": 0, "patents_created": 0, "composition_rows": 0, "errors": []}
+
+    chunk = []
+    for record in records:
+        report["rows"] += 1
+        try:
+            chunk.append(_import_row(record, symbol_to_id))
+        except ValueError as e:
+            _import_error(report, record.get("row"), str(e))
+        if len(chunk) >= chunk_size:
+            _import_chunk_safe(db, chunk, patent_ids, report)
+            chunk = []
+    if chunk:
+        _import_chunk_safe(db, chunk, patent_ids, report)
+
+    report["seconds"] = time.perf_counter() - started
+    report["rows_per_second"] = report["rows"] / report["seconds"] if report["seconds"] > 0 else 0.0
+    return report
+
+
+def _import_error(report: dict, row, message: str):
+    report["failed"] += 1
+    if len(report["errors"]) < IMPORT_MAX_ERRORS:
+        report["errors"].append({"row": row, "error": message})
+
+
+def _import_text(fields: dict, name: str, max_length: int, required: bool = True):
+    value = fields.get(name)
+    value = "" if value is None else str(value).strip()
+    if not value:
+        if required:
+            raise ValueError(f"{name}: обязательное поле")
+        return None
+    if len(value) > max_length:
+        raise ValueError(f"{name}: длиннее {max_length} символов")
+    return value
+
+
+def _import_row(record: dict, symbol_to_id: dict) -> dict:
+    """Проверяет запись импорта и приводит её к строке для вставки; ValueError — ошибка строки"""
+    if record.get("error"):
+        raise ValueError(record["error"])
+    fields = record.get("fields") or {}
+
+    try:
+        prop_value = float(fields.get("prop_value"))
+    except (TypeError, ValueError):
+        raise ValueError("prop_value: ожидается число")
+
+    patent_id = fields.get("patent_id")
+    patent_key = None
+    if patent_id not in (None, ""):
+        try:
+            patent_id = int(patent_id)
+        except (TypeError, ValueError):
+            raise ValueError("patent_id: ожидается целое число")
+    else:
+        patent_id = None
+        patent_key = (_import_text(fields, "patent_name", 100), _import_text(fields, "authors_name", 100))
+
+    composition = {}
+    for symbol, value in (record.get("elements") or {}).items():
+        element_id = symbol_to_id.get(str(symbol).strip().lower())
+        if element_id is None:
+            raise ValueError(f"{symbol}: неизвестный химический элемент")
+        try:
+            percentage = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{symbol}: ожидается число, получено '{value}'")
+        if percentage < 0 or percentage > 100:
+            raise ValueError(f"{symbol}: процент вне диапазона 0..100")
+        if percentage > 0:
+            composition[element_id] = min(percentage, MAX_PERCENTAGE)
+
+    return {
+        "row": record.get("row"),
+        "patent_id": patent_id,
+        "patent_key": patent_key,
+        "patent_description": _import_text(fields, "patent_description", 200, required=False),
+        "prop_value": prop_value,
+        "category": _import_text(fields, "category", 100),
+        "rolling_type": _import_text(fields, "rolling_type", 50),
+        "composition": composition,
+    }
+
+
+def _import_chunk_safe(db: Session, rows: list, patent_ids: dict, report: dict):
+    """Пишет пакет; если пакет целиком не прошёл, повторяет построчно, чтобы найти плохие строки"""
+    try:
+        _import_chunk(db, rows, patent_ids, report)
+        return
+    except Exception as e:
+        db.rollback()
+        if len(rows) == 1:
+            _import_error(report, rows[0]["row"], f"ошибка записи в БД: {e}")
+            return
+    for row in rows:
+        _import_chunk_safe(db, [row], patent_ids, report)
+
+
+def _import_chunk(db: Session, rows: list, patent_ids: dict, report: dict):
+    # существующие патенты по id — одним запросом; список вызывающего не меняется:
+    # при откате пакета он повторяется построчно целиком
+    missing = []
+    wanted_ids = {row["patent_id"] for row in rows if row["patent_id"] is not None}
+    if wanted_ids:
+        found = set(db.scalars(select(Patent.id).where(Patent.id.in_(wanted_ids))))
+        missing = [row for row in rows if row["patent_id"] is not None and row["patent_id"] not in found]
+        rows = [row for row in rows if row["patent_id"] is None or row["patent_id"] in found]
+
+    # патенты по (название, авторы): известные из прошлых пакетов, найденные в БД, новые
+    keys = {row["patent_key"] for row in rows if row["patent_key"] and row["patent_key"] not in patent_ids}
+    resolved = {}
+    created = 0
+    if keys:
+        names = {name for name, _ in keys}
+        for patent_id, name, authors in db.execute(
+                select(Patent.id, Patent.patent_name, Patent.authors_name).where(Patent.patent_name.in_(names))):
+            if (name, authors) in keys:
+                resolved.setdefault((name, authors), patent_id)
+        descriptions = {row["patent_key"]: row["patent_description"] for row in rows if row["patent_key"]}
+        new_patents = [
+            Patent(patent_name=name, authors_name=authors, description=descriptions.get((name, authors)))
+            for name, authors in keys if (name, authors) not in resolved
+        ]
+        if new_patents:
+            db.add_all(new_patents)
+            db.flush()
+            for patent in new_patents:
+                resolved[(patent.patent_name, patent.authors_name)] = patent.id
+            created = len(new_patents)
+
+    alloys = []
+    for row in rows:
+        patent_id = row["patent_id"]
+        if patent_id is None:
+            patent_id = patent_ids.get(row["patent_key"]) or resolved[row["patent_key"]]
+        alloys.append(Alloy(prop_value=row["prop_value"], category=row["category"],
+                            rolling_type=row["rolling_type"], patent_id=patent_id))
+    db.add_all(alloys)
+    db.flush()
+
+    composition_rows = [
+        {"alloy_id": alloy.id, "element_id": element_id, "percentage": percentage}
+        for alloy, row in zip(alloys, rows)
+        for element_id, percentage in row["composition"].items()
+    ]
+    if composition_rows:
+        db.execute(alloy_element_association.insert(), composition_rows)
+    db.commit()
+    # объекты пакета больше не нужны — память сессии не растёт с размером файла
+    db.expunge_all()
+
+    patent_ids.update(resolved)
+    for row in missing:
+        _import_error(report, row["row"], f"patent_id: патент {row['patent_id']} не найден")
+    report["imported"] += len(rows)
+    report["patents_created"] += created
+    report["composition_rows"] += len(composition_rows)
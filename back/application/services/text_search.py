@@ -0,0 +1,34 @@
+# application/services/text_search.py
+from sqlalchemy import and_, select
+from application.models.dao.alloys import normalize_search_text
+
+"""
+    Поиск по текстовым полям без LIKE '%...%' по строкам таблицы.
+    Все режимы работают с индексированными нормализованными столбцами
+    (alloy.category_norm, patent.patent_name_norm, patent.authors_name_norm):
+      exact    — равенство;
+      prefix   — LIKE 'x%' с нижней границей (поиск по диапазону индекса);
+      contains — различные значения столбца, содержащие подстроку, ищутся
+                 просмотром одного индекса (строки таблицы не читаются),
+                 затем строки выбираются по равенству: столбец IN (SELECT DISTINCT ...).
+    Значения берутся из БД в момент запроса — записи других воркеров видны сразу.
+"""
+
+MATCH_MODES = ("exact", "prefix", "contains")
+
+
+def check_match(match: str):
+    if match not in MATCH_MODES:
+        raise ValueError(f"Unknown match mode: {match} (expected one of {', '.join(MATCH_MODES)})")
+
+
+def text_condition(column, text: str, match: str):
+    """Условие на нормализованный столбец column для строки поиска text"""
+    check_match(match)
+    value = normalize_search_text(text) or ""
+    if match == "exact":
+        return column == value
+    if match == "prefix":
+        # нижняя граница даёт поиск по индексу и там, где LIKE его не использует (SQLite)
+        return and_(column >= value, column.startswith(value, autoescape=True))
+    return column.in_(select(column).where(column.contains(value, autoescape=True)).distinct())
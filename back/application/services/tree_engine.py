@@ -0,0 +1,249 @@
+# application/services/tree_engine.py
+import json
+import os
+import sys
+import numpy as np
+
+"""
+    Компактный вычислитель ансамблей деревьев (RandomForest / XGBoost).
+    Загруженная модель переводится в плоские NumPy-массивы узлов
+    (признак, порог, левый/правый потомок, значение листа), а прогноз
+    считается векторизованным спуском сразу по всем деревьям и строкам.
+    Так пропадают накладные расходы generic predict на маленьких входах,
+    а сохранённый .flat.npz позволяет обслуживать модель без импорта xgboost.
+"""
+
+FLAT_SUFFIX = ".flat.npz"
+
+# Целевые функции XGBoost с тождественной связью (прогноз = сумма листьев + base_score)
+_XGB_IDENTITY_OBJECTIVES = {
+    "reg:squarederror",
+    "reg:squaredlogerror",
+    "reg:absoluteerror",
+    "reg:pseudohubererror",
+    "reg:quantileerror",
+}
+
+
+def flat_path(model_path: str) -> str:
+    """Путь к скомпилированной версии модели: final_xgb_model.joblib -> final_xgb_model.flat.npz"""
+    root, _ = os.path.splitext(model_path)
+    return root + FLAT_SUFFIX
+
+
+class FlatTreeEnsemble:
+    """
+    Ансамбль деревьев в виде плоских массивов.
+    Все деревья склеены в один массив узлов; у листьев оба потомка указывают
+    на сам лист, поэтому спуск — это ровно max_depth одинаковых шагов без ветвлений.
+    Переход влево: x < threshold (для NaN — по default_left).
+    Прогноз = sum(листьев) * scale + base_score.
+    """
+
+    def __init__(self, feature, threshold, left, right, default_left, value, roots,
+                 max_depth: int, n_features: int, base_score: float = 0.0, scale: float = 1.0):
+        self.feature = np.asarray(feature, dtype=np.int32)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.left = np.asarray(left, dtype=np.int32)
+        self.right = np.asarray(right, dtype=np.int32)
+        self.default_left = np.asarray(default_left, dtype=bool)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.roots = np.asarray(roots, dtype=np.int32)
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+        self.base_score = float(base_score)
+        self.scale = float(scale)
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.feature)
+
+    def predict(self, X) -> np.ndarray:
+        # Обе исходные библиотеки сравнивают признаки в float32
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"Ожидалось {self.n_features} признаков, получено {X.shape[1]}")
+
+        n_rows, n_features = X.shape
+        # работаем с плоскими векторами длины n_rows * n_trees: индекс значения признака
+        # в X.ravel() = смещение строки + номер признака
+        row_offset = np.repeat(np.arange(n_rows) * n_features, self.n_trees)
+        node = np.tile(self.roots, n_rows)
+        flat_x = X.ravel()
+        has_nan = np.isnan(flat_x).any()
+        for _ in range(self.max_depth):
+            x = flat_x[row_offset + self.feature[node]]
+            go_left = x < self.threshold[node]
+            if has_nan:
+                go_left = np.where(np.isnan(x), self.default_left[node], go_left)
+            node = np.where(go_left, self.left[node], self.right[node])
+
+        return self.value[node].reshape(n_rows, self.n_trees).sum(axis=1) * self.scale + self.base_score
+
+    # ---------- сохранение ----------
+
+    def save(self, path: str):
+        meta = {
+            "max_depth": self.max_depth,
+            "n_features": self.n_features,
+            "base_score": self.base_score,
+            "scale": self.scale,
+        }
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                feature=self.feature, threshold=self.threshold, left=self.left, right=self.right,
+                default_left=self.default_left, value=self.value, roots=self.roots,
+                meta=np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8),
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "FlatTreeEnsemble":
+        with np.load(path) as data:
+            meta = json.loads(data["meta"].tobytes().decode())
+            return cls(
+                data["feature"], data["threshold"], data["left"], data["right"],
+                data["default_left"], data["value"], data["roots"], **meta,
+            )
+
+    # ---------- конвертация ----------
+
+    @classmethod
+    def _from_trees(cls, trees: list, n_features: int, base_score: float, scale: float):
+        """trees: список кортежей (feature, threshold, left, right, default_left, value), -1 у листьев"""
+        parts = {k: [] for k in ("feature", "threshold", "left", "right", "default_left", "value")}
+        roots = []
+        max_depth = 0
+        offset = 0
+        for feature, threshold, left, right, default_left, value in trees:
+            n = len(feature)
+            left = np.asarray(left, dtype=np.int64)
+            right = np.asarray(right, dtype=np.int64)
+            is_leaf = left < 0
+            own = np.arange(n)
+
+            # лист указывает сам на себя, признак 0 — чтобы индексирование было валидным
+            parts["feature"].append(np.where(is_leaf, 0, feature))
+            parts["threshold"].append(np.where(is_leaf, 0.0, threshold))
+            parts["left"].append(np.where(is_leaf, own, left) + offset)
+            parts["right"].append(np.where(is_leaf, own, right) + offset)
+            parts["default_left"].append(default_left)
+            parts["value"].append(np.where(is_leaf, value, 0.0))
+            roots.append(offset)
+
+            max_depth = max(max_depth, _tree_depth(left, right))
+            offset += n
+
+        return cls(
+            np.concatenate(parts["feature"]), np.concatenate(parts["threshold"]),
+            np.concatenate(parts["left"]), np.concatenate(parts["right"]),
+            np.concatenate(parts["default_left"]), np.concatenate(parts["value"]),
+            np.asarray(roots), max_depth, n_features, base_score, scale,
+        )
+
+    @classmethod
+    def from_sklearn_forest(cls, model) -> "FlatTreeEnsemble":
+        """RandomForestRegressor / ExtraTreesRegressor / DecisionTreeRegressor (один выход)"""
+        estimators = getattr(model, "estimators_", None)
+        if estimators is None:
+            estimators = [model]
+        if getattr(model, "n_outputs_", 1) != 1:
+            raise NotImplementedError("Поддерживаются только модели с одним выходом")
+
+        trees = []
+        for est in estimators:
+            t = est.tree_
+            # sklearn идёт влево при x <= thr; для строгого x < thr' берём следующее число
+            threshold = np.nextafter(t.threshold, np.inf)
+            missing_left = getattr(t, "missing_go_to_left", None)
+            default_left = (np.asarray(missing_left, dtype=bool) if missing_left is not None
+                            else np.zeros(t.node_count, dtype=bool))
+            trees.append((t.feature, threshold, t.children_left, t.children_right,
+                          default_left, t.value[:, 0, 0]))
+
+        return cls._from_trees(trees, model.n_features_in_, base_score=0.0, scale=1.0 / len(estimators))
+
+    @classmethod
+    def from_xgboost(cls, model) -> "FlatTreeEnsemble":
+        """XGBRegressor или Booster (gbtree, регрессия с тождественной связью)"""
+        booster = model.get_booster() if hasattr(model, "get_booster") else model
+        learner = json.loads(booster.save_raw(raw_format="json"))["learner"]
+
+        objective = learner["objective"]["name"]
+        if objective not in _XGB_IDENTITY_OBJECTIVES:
+            raise NotImplementedError(f"Целевая функция {objective} не поддерживается")
+        gbm = learner["gradient_booster"]
+        if gbm["name"] != "gbtree":
+            raise NotImplementedError(f"Бустер {gbm['name']} не поддерживается")
+        params = learner["learner_model_param"]
+        if int(params.get("num_target", 1)) != 1 or int(params.get("num_class", 0)) > 1:
+            raise NotImplementedError("Поддерживаются только модели с одним выходом")
+
+        # base_score в XGBoost 3.x хранится как "[6.06E2]"
+        base_score = float(str(params["base_score"]).strip("[]"))
+
+        raw_trees = gbm["model"]["trees"]
+        # при раннем останове XGBRegressor.predict использует только лучшие итерации
+        best_iteration = booster.attr("best_iteration")
+        if best_iteration is not None:
+            per_round = int(gbm["model"]["gbtree_model_param"].get("num_parallel_tree", 1))
+            raw_trees = raw_trees[:(int(best_iteration) + 1) * per_round]
+
+        trees = []
+        for t in raw_trees:
+            if any(t.get("split_type", [])):
+                raise NotImplementedError("Категориальные разбиения не поддерживаются")
+            left = np.asarray(t["left_children"])
+            # у листьев split_conditions хранит значение листа
+            conditions = np.asarray(t["split_conditions"], dtype=np.float32).astype(np.float64)
+            trees.append((t["split_indices"], conditions, left, t["right_children"],
+                          np.asarray(t["default_left"], dtype=bool), conditions))
+
+        return cls._from_trees(trees, int(params["num_feature"]), base_score=base_score, scale=1.0)
+
+    @classmethod
+    def from_model(cls, model) -> "FlatTreeEnsemble":
+        if hasattr(model, "get_booster"):
+            return cls.from_xgboost(model)
+        if hasattr(model, "estimators_") or hasattr(model, "tree_"):
+            return cls.from_sklearn_forest(model)
+        raise NotImplementedError(f"Модель {type(model).__name__} не поддерживается")
+
+
+def _tree_depth(left: np.ndarray, right: np.ndarray) -> int:
+    depth = 0
+    level = [0]
+    while level:
+        nxt = []
+        for n in level:
+            if left[n] >= 0:
+                nxt.append(left[n])
+                nxt.append(right[n])
+        if nxt:
+            depth += 1
+        level = nxt
+    return depth
+
+
+def compile_model_file(model_path: str) -> str:
+    """Компилирует joblib-модель в .flat.npz рядом с исходным файлом"""
+    import joblib
+
+    model = joblib.load(model_path)
+    flat = FlatTreeEnsemble.from_model(model)
+    out = flat_path(model_path)
+    flat.save(out)
+    return out
+
+
+if __name__ == "__main__":
+    # python -m application.services.tree_engine application/ml_models/final_xgb_model.joblib
+    for path in sys.argv[1:]:
+        out = compile_model_file(path)
+        print(f"{path} -> {out}")
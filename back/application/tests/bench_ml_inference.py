@@ -0,0 +1,216 @@
+# bench_ml_inference.py
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+# запускается как скрипт: нужен каталог back/ (родитель пакета application)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from application.services.ml_inference import MLInference
+
+"""
+    Микробенчмарк инференса без HTTP и БД: реальные артефакты из ml_models/,
+    для каждой модели и движка (native / compiled):
+      - задержка одиночного прогноза MLInference.predict (кэш выключен): p50/p90/p99;
+      - пропускная способность predict_matrix на пакетах 1..10^5 строк;
+      - выделения памяти Python/NumPy на вызов (tracemalloc) и пиковый RSS.
+    Результат — JSON для сравнения между коммитами.
+
+    python application/tests/bench_ml_inference.py -o bench.json
+    python application/tests/bench_ml_inference.py --engines native --max-batch 10000
+"""
+
+BATCH_SIZES = [1, 10, 100, 1000, 10000, 100000]
+CATEGORIES = ["die tool steel", "wrought titanium alloys", "spring-spring structural steel"]
+ROLLING_TYPES = ["rod", "wire", "casting"]
+ELEMENTS = ["fe", "c", "cr", "ni", "mo", "ti", "si", "cu", "co", "zr"]
+
+
+def random_rows(n: int, seed: int = 0) -> list:
+    """Составы, похожие на реальные: основа + несколько легирующих элементов"""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i in range(n):
+        alloying = rng.choice(ELEMENTS[1:], size=rng.integers(1, 5), replace=False)
+        composition = {str(sym): round(float(rng.uniform(0.01, 8)), 3) for sym in alloying}
+        composition["fe"] = round(100 - sum(composition.values()), 3)
+        rows.append({
+            "category": CATEGORIES[i % len(CATEGORIES)],
+            "rolling_type": ROLLING_TYPES[i % len(ROLLING_TYPES)],
+            "size": float(rng.integers(1, 60)),
+            "composition_by_symbol": composition,
+        })
+    return rows
+
+
+def percentiles(samples: list) -> dict:
+    ms = np.asarray(samples) * 1000.0
+    return {
+        "n": len(ms),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p90_ms": float(np.percentile(ms, 90)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+    }
+
+
+def bench_single_row(infer: MLInference, model_id: int, rows: list, iterations: int) -> dict:
+    """Полный путь predict: построение признаков + модель, без кэша"""
+    for row in rows[:20]:
+        infer.predict(model_id, **row)
+    samples = []
+    for i in range(iterations):
+        row = rows[i % len(rows)]
+        started = time.perf_counter()
+        infer.predict(model_id, **row)
+        samples.append(time.perf_counter() - started)
+    return percentiles(samples)
+
+
+def bench_throughput(loaded, batch_sizes: list, min_seconds: float) -> list:
+    """predict_matrix на готовой матрице признаков: строк в секунду по размерам пакета"""
+    base = loaded.index.make_matrix(random_rows(1000, seed=1))
+    result = []
+    for size in batch_sizes:
+        X = base[np.arange(size) % len(base)]
+        loaded.predict_matrix(X)
+        calls = 0
+        started = time.perf_counter()
+        while True:
+            loaded.predict_matrix(X)
+            calls += 1
+            elapsed = time.perf_counter() - started
+            if elapsed >= min_seconds:
+                break
+        result.append({
+            "batch_size": size,
+            "calls": calls,
+            "seconds_per_call": elapsed / calls,
+            "rows_per_second": size * calls / elapsed,
+        })
+    return result
+
+
+def bench_allocations(infer: MLInference, model_id: int, rows: list, batch_size: int) -> dict:
+    """
+    Выделения через аллокаторы Python/NumPy (tracemalloc) за один вызов:
+    пик временной памяти и число блоков. Память внутри C++ библиотек (xgboost) не видна.
+    """
+    loaded = infer.registry.get(model_id)
+    X = loaded.index.make_matrix(rows[:batch_size])
+    result = {}
+    for name, call in (("single_row", lambda: infer.predict(model_id, **rows[0])),
+                       (f"batch_{batch_size}", lambda: loaded.predict_matrix(X))):
+        call()
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+        call()
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        stats = after.compare_to(before, "filename")
+        result[name] = {
+            "peak_bytes": peak,
+            "retained_bytes": sum(s.size_diff for s in stats),
+            "retained_blocks": sum(s.count_diff for s in stats),
+        }
+    return result
+
+
+def peak_rss_bytes() -> int:
+    # ru_maxrss в Linux — в килобайтах
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def environment() -> dict:
+    versions = {}
+    for module in ("numpy", "pandas", "sklearn", "xgboost", "joblib"):
+        try:
+            versions[module] = __import__(module).__version__
+        except ImportError:
+            versions[module] = None
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "versions": versions,
+    }
+
+
+def run(engines: list, iterations: int, max_batch: int, min_seconds: float, model_ids: list = None) -> dict:
+    rows = random_rows(1000)
+    batch_sizes = [size for size in BATCH_SIZES if size <= max_batch]
+    results = []
+    for engine in engines:
+        infer = MLInference(cache_size=0, engine=engine)
+        for model_id, spec in infer.registry.specs.items():
+            if model_ids and model_id not in model_ids:
+                continue
+            entry = {"ml_model_id": model_id, "name": spec.get("name"), "engine": engine}
+            if not infer.registry.is_available(model_id):
+                entry["skipped"] = "missing files: " + ", ".join(infer.registry.missing_files(model_id))
+                results.append(entry)
+                continue
+
+            loaded = infer.registry.get(model_id)
+            entry.update({
+                "engine": loaded.engine,
+                "n_features": len(loaded.feature_columns),
+                "load_seconds": loaded.load_seconds,
+                "load_memory_bytes": loaded.memory_bytes,
+                "single_row": bench_single_row(infer, model_id, rows, iterations),
+                "throughput": bench_throughput(loaded, batch_sizes, min_seconds),
+                "allocations": bench_allocations(infer, model_id, rows, min(1000, max_batch)),
+            })
+            results.append(entry)
+            print(f"model {model_id} [{entry['engine']}]: p50={entry['single_row']['p50_ms']:.3f}ms "
+                  f"p99={entry['single_row']['p99_ms']:.3f}ms, "
+                  f"batch {batch_sizes[-1]}: {entry['throughput'][-1]['rows_per_second']:.0f} rows/s",
+                  file=sys.stderr)
+        infer.registry.unload()
+    return {"environment": environment(), "models": results, "peak_rss_bytes": peak_rss_bytes()}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Микробенчмарк MLInference (без HTTP и БД)")
+    parser.add_argument("-o", "--output", default="-", help="файл JSON ('-' — stdout)")
+    parser.add_argument("--engines", default="native,compiled", help="движки через запятую")
+    parser.add_argument("--models", default="", help="ml_model_id через запятую (по умолчанию все)")
+    parser.add_argument("--iterations", type=int, default=2000, help="замеров одиночного прогноза")
+    parser.add_argument("--max-batch", type=int, default=100000, help="наибольший размер пакета")
+    parser.add_argument("--min-seconds", type=float, default=0.5, help="минимальное время замера пакета")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = run(
+        engines=[e.strip() for e in args.engines.split(",") if e.strip()],
+        iterations=args.iterations,
+        max_batch=args.max_batch,
+        min_seconds=args.min_seconds,
+        model_ids=[int(m) for m in args.models.split(",") if m.strip()],
+    )
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
@@ -0,0 +1,341 @@
+# test_ml_inference.py
+import os
+import sys
+import asyncio
+import csv
+import io
+import multiprocessing
+import shutil
+import tempfile
+import threading
+import unittest
+from concurrent.futures import Future
+from types import SimpleNamespace
+import joblib
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from application.services.ml_inference import (
+    MLInference, ModelRegistry, DEFAULT_MODEL_SPECS, ML_MODELS_DIR, axis_values, grid_points,
+)
+from application.services.inference_batcher import InferenceBatcher
+from application.services import inference_executor
+from application.services.inference_executor import InferenceExecutor, InferenceQueueFull
+from application.services.csv_scoring import score_csv
+from application.services.composition_optimizer import optimize_composition, project_to_bounds
+
+
+XGB_MODEL_ID = 2
+
+
+class TestMLInference(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.infer = MLInference(cache_size=16)
+        if not cls.infer.registry.is_available(XGB_MODEL_ID):
+            raise unittest.SkipTest("Нет артефактов XGBoost модели в ml_models/")
+
+        cls.rows = [
+            {"category": "die tool steel", "rolling_type": "rod", "size": 10,
+             "composition_by_symbol": {"fe": 90.0, "c": 1.2, "cr": 5.0}},
+            {"category": "wrought titanium alloys", "rolling_type": "wire", "size": None,
+             "composition_by_symbol": {"ti": 90.0, "fe": 0.3}},
+            {"category": "unknown", "rolling_type": "unknown", "size": "",
+             "composition_by_symbol": {}},
+        ]
+
+    def setUp(self):
+        self.infer.cache.clear()
+
+    def test_predict_many_matches_predict(self):
+        """Пакетный прогноз совпадает с поштучным и сохраняет порядок"""
+        many = self.infer.predict_many(XGB_MODEL_ID, self.rows)
+        self.infer.cache.clear()
+        single = [self.infer.predict(XGB_MODEL_ID, **row) for row in self.rows]
+
+        self.assertEqual(len(many), len(self.rows))
+        for a, b in zip(many, single):
+            self.assertAlmostEqual(a, b, places=4)
+
+    def test_cache_hit_for_equivalent_composition(self):
+        """Состав, отличающийся регистром символов и шумом ниже точности БД, берётся из кэша"""
+        row = self.rows[0]
+        first = self.infer.predict(XGB_MODEL_ID, **row)
+        second = self.infer.predict(
+            XGB_MODEL_ID, row["category"], row["rolling_type"], 10.0,
+            {"Cr": 5.0001, "FE": 90, "c": 1.2, "ni": 0},
+        )
+
+        self.assertEqual(first, second)
+        stats = self.infer.cache_stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+
+    def test_predict_grid_matches_predict_many(self):
+        """Сетка составов считается одной матрицей и совпадает с поштучным прогнозом"""
+        base = self.rows[0]
+        points = grid_points([axis_values(0, 2, 0.5), axis_values(0, 10, 5)])
+        self.assertEqual(points.shape, (15, 2))
+
+        grid = self.infer.predict_grid(
+            XGB_MODEL_ID, base["category"], base["rolling_type"], base["size"],
+            base["composition_by_symbol"], ["C", "cr"], points,
+        )
+        rows = [
+            {**base, "composition_by_symbol": {**base["composition_by_symbol"], "c": c, "cr": cr}}
+            for c, cr in points
+        ]
+        many = self.infer.predict_many(XGB_MODEL_ID, rows)
+        for a, b in zip(grid, many):
+            self.assertAlmostEqual(a, b, places=4)
+
+        with self.assertRaises(ValueError):
+            axis_values(1, 0, 0.1)
+
+    def test_explain_matches_occlusion(self):
+        """Вклад элемента равен разнице прогнозов с элементом и без него"""
+        row = self.rows[0]
+        result = self.infer.explain(XGB_MODEL_ID, **row, delta=0.5)
+
+        self.assertAlmostEqual(result["prop_value"], self.infer.predict(XGB_MODEL_ID, **row), places=4)
+        by_symbol = {item["symbol"]: item for item in result["contributions"]}
+        self.assertEqual(set(by_symbol), {"fe", "c", "cr"})
+
+        without_c = {k: v for k, v in row["composition_by_symbol"].items() if k != "c"}
+        expected = result["prop_value"] - self.infer.predict(
+            XGB_MODEL_ID, row["category"], row["rolling_type"], row["size"], without_c)
+        self.assertAlmostEqual(by_symbol["c"]["contribution"], expected, places=3)
+
+    def test_score_csv_in_chunks(self):
+        """CSV считается блоками, значения совпадают с поштучным прогнозом, плохие строки помечаются"""
+        src = io.StringIO(
+            "id,Category,rolling_type,size,Fe,C,Cr,Unknown\n"
+            "a,die tool steel,rod,10,90,1.2,5,x\n"
+            "b,wrought titanium alloys,wire,,0.3,,,\n"
+            "c,die tool steel,rod,abc,90,,,\n"
+        )
+        dst = io.StringIO()
+        stats = score_csv(self.infer, XGB_MODEL_ID, src, dst, chunk_size=2)
+
+        self.assertEqual((stats["rows"], stats["errors"]), (3, 1))
+        out = list(csv.DictReader(io.StringIO(dst.getvalue())))
+        self.assertEqual([row["id"] for row in out], ["a", "b", "c"])
+        self.assertAlmostEqual(float(out[0]["prop_value"]), self.infer.predict(XGB_MODEL_ID, **self.rows[0]), places=4)
+        self.assertEqual(out[2]["prop_value"], "")
+        self.assertIn("size", out[2]["error"])
+
+    def test_unknown_model(self):
+        with self.assertRaises(ValueError):
+            self.infer.predict(999, "x", "y", None, {})
+
+    def test_missing_artifacts_do_not_break_registry(self):
+        """Модель без файлов помечается недоступной, остальные работают"""
+        specs = dict(DEFAULT_MODEL_SPECS)
+        specs[77] = {"name": "Missing", "model": "no_such_model.joblib", "features": "no_such_features.joblib"}
+        registry = ModelRegistry(specs=specs)
+
+        self.assertFalse(registry.is_available(77))
+        with self.assertRaises(ValueError):
+            registry.get(77)
+
+        status = {item["ml_model_id"]: item for item in registry.status()}
+        self.assertIn("no_such_model.joblib", status[77]["missing_files"])
+        self.assertFalse(status[77]["loaded"])
+
+        registry.get(XGB_MODEL_ID)
+        self.assertTrue(registry.is_loaded(XGB_MODEL_ID))
+        self.assertIsNotNone(registry.status()[list(specs).index(XGB_MODEL_ID)]["load_seconds"])
+
+
+class TestModelHotReload(unittest.TestCase):
+    """Замена артефактов подхватывается без рестарта, битые файлы не ломают работающую модель"""
+
+    def setUp(self):
+        if not ModelRegistry().is_available(XGB_MODEL_ID):
+            self.skipTest("Нет артефактов XGBoost модели в ml_models/")
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        self.spec = DEFAULT_MODEL_SPECS[XGB_MODEL_ID]
+        for key in ("model", "features"):
+            shutil.copy(os.path.join(ML_MODELS_DIR, self.spec[key]), self.tmp)
+        self.infer = MLInference(cache_size=16, base_dir=self.tmp)
+        self.row = ("die tool steel", "rod", 10, {"fe": 90.0, "c": 1.2})
+
+    def _replace_model(self, value: float):
+        from sklearn.tree import DecisionTreeRegressor
+        n_features = len(self.infer.registry.get(XGB_MODEL_ID).feature_columns)
+        model = DecisionTreeRegressor().fit(np.zeros((2, n_features)), [value, value])
+        joblib.dump(model, os.path.join(self.tmp, self.spec["model"]))
+
+    def test_reload_swaps_model_and_invalidates_cache(self):
+        old = self.infer.registry.get(XGB_MODEL_ID)
+        before = self.infer.predict(XGB_MODEL_ID, *self.row)
+
+        self._replace_model(123.0)
+        result = self.infer.reload(XGB_MODEL_ID)
+
+        self.assertTrue(result[0]["reloaded"])
+        self.assertEqual(self.infer.predict(XGB_MODEL_ID, *self.row), 123.0)
+        # запрос, уже взявший старую модель, досчитывается на ней
+        self.assertAlmostEqual(old.predict_matrix(old.index.make_matrix([
+            {"category": self.row[0], "rolling_type": self.row[1], "size": self.row[2],
+             "composition_by_symbol": self.row[3]}]))[0], before, places=4)
+
+    def test_invalid_artifacts_keep_old_model(self):
+        current = self.infer.registry.get(XGB_MODEL_ID)
+        joblib.dump(["size", "fe"], os.path.join(self.tmp, self.spec["features"]))
+
+        with self.assertRaises(ValueError):
+            self.infer.reload(XGB_MODEL_ID)
+        self.assertIs(self.infer.registry.get(XGB_MODEL_ID), current)
+        self.assertIn("reload failed", self.infer.models_status()[list(DEFAULT_MODEL_SPECS).index(XGB_MODEL_ID)]["error"])
+
+
+class _LinearInference:
+    """Подменяет MLInference: prop_value = sum(weight * процент), считает пакетные вызовы"""
+
+    def __init__(self, weights: dict):
+        self.weights = weights
+        self.calls = 0
+        index = SimpleNamespace(position={sym: i for i, sym in enumerate(weights)})
+        self.registry = SimpleNamespace(get=lambda ml_model_id: SimpleNamespace(index=index))
+
+    def predict_grid(self, ml_model_id, category, rolling_type, size, base_composition, axis_symbols, points):
+        self.calls += 1
+        w = np.array([self.weights[sym] for sym in axis_symbols])
+        return list(np.asarray(points) @ w)
+
+
+class TestCompositionOptimizer(unittest.TestCase):
+
+    def test_projection_respects_bounds_and_total(self):
+        X = np.random.default_rng(0).uniform(-20, 120, (50, 4))
+        lower, upper = np.array([0, 0, 1, 50]), np.array([5, 10, 20, 99])
+        P = project_to_bounds(X, lower, upper, 100)
+
+        np.testing.assert_allclose(P.sum(axis=1), 100, atol=1e-6)
+        self.assertTrue((P >= lower - 1e-9).all() and (P <= upper + 1e-9).all())
+        with self.assertRaises(ValueError):
+            project_to_bounds(X, lower, [5, 5, 5, 5], 100)
+
+    def test_finds_linear_optimum_with_one_call_per_generation(self):
+        """Для линейной цели оптимум — максимум самого «дорогого» элемента, остаток — следующему"""
+        inference = _LinearInference({"fe": 1.0, "cr": 3.0, "c": 2.0})
+        bounds = {"Fe": (60, 99), "Cr": (0, 18), "C": (0, 2), "Xx": (0, 1)}
+
+        result = optimize_composition(inference, 1, "steel", "rod", None, bounds,
+                                      population=64, generations=30, top_k=3, seed=0)
+
+        self.assertLessEqual(inference.calls, 30)
+        best = result["results"][0]["composition"]
+        self.assertAlmostEqual(best["cr"], 18, delta=0.5)
+        self.assertAlmostEqual(best["c"], 2, delta=0.5)
+        self.assertAlmostEqual(sum(best.values()), 100, delta=0.01)
+        values = [item["prop_value"] for item in result["results"]]
+        self.assertEqual(values, sorted(values, reverse=True))
+
+
+class _RecordingExecutor:
+    """Подменяет InferenceExecutor: считает вызовы и возвращает size каждой строки"""
+
+    def __init__(self):
+        self.calls = []
+
+    def submit(self, method, ml_model_id, rows):
+        self.calls.append((method, ml_model_id, len(rows)))
+        future = Future()
+        future.set_result([float(row["size"]) for row in rows])
+        return future
+
+
+class TestInferenceBatcher(unittest.IsolatedAsyncioTestCase):
+
+    async def test_concurrent_requests_share_one_call(self):
+        """Одновременные запросы одной модели считаются одним predict_many, порядок ответов сохраняется"""
+        executor = _RecordingExecutor()
+        batcher = InferenceBatcher(executor, window_ms=5, max_batch=100)
+
+        values = await asyncio.gather(*[
+            batcher.predict(XGB_MODEL_ID, "steel", "rod", i, {"fe": 90.0}) for i in range(10)
+        ])
+
+        self.assertEqual(values, [float(i) for i in range(10)])
+        self.assertEqual(executor.calls, [("predict_many", XGB_MODEL_ID, 10)])
+
+    async def test_max_batch_flushes_early(self):
+        executor = _RecordingExecutor()
+        batcher = InferenceBatcher(executor, window_ms=1000, max_batch=4)
+
+        values = await asyncio.wait_for(asyncio.gather(*[
+            batcher.predict(1, "steel", "rod", i, {}) for i in range(8)
+        ]), timeout=0.5)
+
+        self.assertEqual(len(values), 8)
+        self.assertEqual([n for _, _, n in executor.calls], [4, 4])
+
+
+class _VersionedInference:
+    """Подменяет MLInference в пуле: отдаёт «версию» моделей, wait держит слот до release"""
+
+    def __init__(self):
+        self.version = 1
+        self.watch_interval = 0.0
+        self.release = threading.Event()
+
+    def settings(self):
+        return {}
+
+    def get_version(self):
+        return self.version
+
+    def wait(self):
+        self.release.wait(5)
+        return self.version
+
+
+class TestInferenceExecutor(unittest.TestCase):
+
+    def test_queue_full_rejects_extra_tasks(self):
+        """Сверх workers + queue_size задачи отклоняются, после завершения слоты освобождаются"""
+        inference = _VersionedInference()
+        executor = InferenceExecutor(inference, workers=1, queue_size=1)
+        self.addCleanup(executor.shutdown)
+
+        futures = [executor.submit("wait"), executor.submit("wait")]
+        with self.assertRaises(InferenceQueueFull):
+            executor.submit("wait")
+        inference.release.set()
+
+        self.assertEqual([future.result(timeout=5) for future in futures], [1, 1])
+        self.assertEqual(executor.submit("get_version").result(timeout=5), 1)
+
+    def test_process_worker_uses_parent_settings(self):
+        """Процесс пула, запущенный не через fork, строит MLInference с настройками родителя"""
+        parent = MLInference(cache_size=8, base_dir=tempfile.gettempdir(), mmap_mode="r",
+                             engine="compiled", compiled_max_rows=5)
+        saved = inference_executor._worker_inference
+        inference_executor._worker_inference = None
+        try:
+            inference_executor._init_process_worker(parent.settings())
+            self.assertEqual(inference_executor._worker_inference.settings(), parent.settings())
+        finally:
+            inference_executor._worker_inference = saved
+
+    @unittest.skipUnless(multiprocessing.get_start_method() == "fork", "нужен старт процессов через fork")
+    def test_restart_propagates_reload_to_process_pool(self):
+        """После restart процессы пула видят модели, перезагруженные в родителе"""
+        inference = _VersionedInference()
+        executor = InferenceExecutor(inference, kind="process", workers=1)
+        self.addCleanup(executor.shutdown)
+
+        self.assertEqual(executor.submit("get_version").result(timeout=30), 1)
+        inference.version = 2
+        self.assertEqual(executor.submit("get_version").result(timeout=30), 1)
+        executor.restart()
+        self.assertEqual(executor.submit("get_version").result(timeout=30), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
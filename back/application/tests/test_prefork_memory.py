@@ -0,0 +1,103 @@
+# test_prefork_memory.py
+import gc
+import json
+import os
+import sys
+import traceback
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from application.services.ml_inference import MLInference
+
+
+WORKERS = 4
+SMAPS = "/proc/self/smaps_rollup"
+
+
+def read_memory() -> dict:
+    """RSS и приватная (нераздeляемая) часть памяти процесса, в байтах"""
+    values = {}
+    with open(SMAPS) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                values[parts[0][:-1]] = int(parts[1]) * 1024
+    return {
+        "rss": values.get("Rss", 0),
+        "private": values.get("Private_Clean", 0) + values.get("Private_Dirty", 0),
+        "shared": values.get("Shared_Clean", 0) + values.get("Shared_Dirty", 0),
+    }
+
+
+@unittest.skipUnless(hasattr(os, "fork") and os.path.exists(SMAPS), "нужен Linux с fork и /proc/self/smaps_rollup")
+class TestPreforkModelMemory(unittest.TestCase):
+    """Модели, загруженные до fork (как в serve.py), разделяются воркерами copy-on-write"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.infer = MLInference(cache_size=0)
+        cls.loaded = cls.infer.registry.load_all()
+        if not cls.loaded:
+            raise unittest.SkipTest("Нет артефактов моделей в ml_models/")
+        cls.master_rss = read_memory()["rss"]
+        gc.collect()
+        gc.freeze()
+
+    @classmethod
+    def tearDownClass(cls):
+        gc.unfreeze()
+
+    def _fork_worker(self):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                os.close(read_fd)
+                # воркер обслуживает запросы: прогоняет каждую модель
+                for model_id in self.loaded:
+                    self.infer.predict(model_id, "die tool steel", "rod", 10, {"fe": 90.0, "c": 1.2})
+                gc.collect()
+                report = read_memory()
+                status = 0
+            except BaseException:
+                report = {"error": traceback.format_exc()}
+            try:
+                os.write(write_fd, json.dumps(report).encode())
+            finally:
+                os._exit(status)
+        os.close(write_fd)
+        return pid, read_fd
+
+    def _collect(self, pid, read_fd) -> dict:
+        """Отчёт воркера; падение воркера — провал теста с его трассировкой"""
+        with os.fdopen(read_fd) as f:
+            output = f.read()
+        _, status = os.waitpid(pid, 0)
+        try:
+            report = json.loads(output)
+        except ValueError:
+            report = {"error": f"unreadable worker report: {output!r}"}
+        if "error" in report:
+            self.fail(f"worker {pid} failed:\n{report['error']}")
+        if os.waitstatus_to_exitcode(status) != 0:
+            self.fail(f"worker {pid} exited with status {os.waitstatus_to_exitcode(status)}")
+        return report
+
+    def test_per_worker_private_memory(self):
+        workers = [self._fork_worker() for _ in range(WORKERS)]
+        reports = [self._collect(pid, read_fd) for pid, read_fd in workers]
+
+        for report in reports:
+            memory = (f"worker rss={report['rss'] / 2**20:.1f}MiB "
+                      f"private={report['private'] / 2**20:.1f}MiB shared={report['shared'] / 2**20:.1f}MiB "
+                      f"(master rss: {self.master_rss / 2**20:.1f}MiB)")
+            # модели и библиотеки остались в общих страницах мастера:
+            # собственная память воркера — малая доля его RSS
+            self.assertLess(report["private"], report["rss"] * 0.25, memory)
+            self.assertGreater(report["shared"], report["private"], memory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,8 @@
 # test_repository_service.py
+import io
 import os
 import sys
+import time
 import unittest
 from decimal import Decimal
 from application.services.repository_service import *
@@ -8,6 +10,7 @@ from application.services.repository_service import *
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from application.config import SessionLocal
+from application.services import data_import
 
 
 class TestRepositoryServiceCRUD(unittest.TestCase):
@@ -127,6 +130,357 @@ class TestRepositoryServiceCRUD(unittest.TestCase):
         self.assertEqual(element2.id, element1.id)
         self.assertEqual(element2.name, 'ТестЭлем')  # Имя должно остаться исходным
 
+    def test_element_cache_invalidation(self):
+        """Кэш справочника элементов сбрасывается при создании элемента"""
+        from application.services.reference_cache import element_cache
+        import time
+        unique_id = int(time.time() * 1000)
+
+        element_cache.configure(ttl=3600, session_factory=SessionLocal)
+        cached_before = len(element_cache.get_all())
+
+        new_element = create_chemical_element(
+            self.session,
+            name='Кэш',
+            atomic_number=300 + unique_id % 100,
+            symbol=f"K{unique_id % 10}"
+        )
+        self.assertIsNotNone(new_element)
+        self.assertEqual(len(element_cache.get_all()), cached_before + 1)
+        self.assertEqual(element_cache.get_by_id(new_element.id)['symbol'], new_element.symbol)
+        self.assertEqual(element_cache.symbol_to_id()[new_element.symbol.lower()], new_element.id)
+
+    def test_element_cache_symbol_case(self):
+        """Поиск элемента в кэше по символу не зависит от регистра, как запрос к БД"""
+        from application.services.reference_cache import element_cache
+        fe = self.fe_element or get_element_by_symbol(self.session, 'Fe')
+
+        element_cache.configure(ttl=3600, session_factory=SessionLocal)
+        for symbol in ('Fe', 'fe', 'FE', ' fe '):
+            self.assertEqual(element_cache.get_by_symbol(symbol)['id'], fe.id, symbol)
+        self.assertIsNone(element_cache.get_by_symbol('Xy'))
+
+    def test_bulk_compositions(self):
+        """Составы нескольких сплавов возвращаются одним запросом и совпадают с поштучными"""
+        fe = self.fe_element or get_element_by_symbol(self.session, 'Fe')
+        c = self.c_element or get_element_by_symbol(self.session, 'C')
+        patent = self.patent1 or create_patent(self.session, authors_name='Тест', patent_name='Пакет')
+
+        alloy1 = create_alloy_with_elements(self.session, prop_value=10.0, category='Пакет',
+                                            rolling_type='rod', patent_id=patent.id,
+                                            element_percentages={fe.id: 98.0, c.id: 2.0})
+        alloy2 = create_alloy_with_elements(self.session, prop_value=20.0, category='Пакет',
+                                            rolling_type='rod', patent_id=patent.id,
+                                            element_percentages={fe.id: 100.0})
+
+        compositions = get_alloys_elements_with_percentages(self.session, [alloy1.id, alloy2.id])
+        self.assertEqual(set(compositions), {alloy1.id, alloy2.id})
+        for alloy in (alloy1, alloy2):
+            self.assertEqual(compositions[alloy.id], get_alloy_elements_with_percentages(self.session, alloy.id))
+
+        window = get_alloys_elements_with_percentages(self.session, skip=0, limit=100000)
+        self.assertEqual(window[alloy1.id], compositions[alloy1.id])
+
+        delete_alloy(self.session, alloy1.id)
+        delete_alloy(self.session, alloy2.id)
+
+    def test_bulk_composition_window_matches_page(self):
+        """Окно skip/limit составов — те же сплавы и прогнозы, что и страница списка с тем же skip/limit"""
+        unique_id = int(time.time() * 1000)
+        fe = self.fe_element or get_element_by_symbol(self.session, 'Fe')
+        patent = self.patent1 or create_patent(self.session, authors_name='Тест', patent_name='Окно')
+        model = self.rf_model or get_model_by_name(self.session, 'RF Test')
+        role = create_role(self.session, name=f'w{unique_id % 10 ** 6}')
+        person = create_person(self.session, first_name='Окно', last_name='Тест', role_id=role.id,
+                               login=f'w{unique_id % 10 ** 8}', password='p')
+        self.session.commit()
+        alloys = [create_alloy_with_elements(self.session, prop_value=float(i), category='Окно', rolling_type='rod',
+                                             patent_id=patent.id, element_percentages={fe.id: 90.0 + i})
+                  for i in range(4)]
+        predictions = [create_prediction_with_elements(self.session, prop_value=float(i), category='Окно',
+                                                       ml_model_id=model.id, rolling_type='rod',
+                                                       person_id=person.id, element_percentages={fe.id: 90.0 + i})
+                       for i in range(4)]
+
+        skip = get_alloys_count(self.session) - 3
+        page = [alloy.id for alloy in get_all_alloys(self.session, skip=skip, limit=2)]
+        window = get_alloys_elements_with_percentages(self.session, skip=skip, limit=2)
+        self.assertEqual(sorted(window), page)
+        self.assertTrue(set(page) <= {alloy.id for alloy in alloys})
+
+        skip = self.session.query(Prediction).count() - 3
+        page = [prediction.id for prediction in get_all_predictions(self.session, skip=skip, limit=2)]
+        window = get_predictions_elements_with_percentages(self.session, skip=skip, limit=2)
+        self.assertEqual(sorted(window), page)
+        self.assertTrue(set(page) <= {prediction.id for prediction in predictions})
+
+        for alloy in alloys:
+            delete_alloy(self.session, alloy.id)
+        for prediction in predictions:
+            delete_prediction(self.session, prediction.id)
+
+    def test_create_with_elements_is_atomic(self):
+        """Сплав с неизвестным элементом не создаётся вовсе — ни строки сплава, ни части состава"""
+        fe = self.fe_element or get_element_by_symbol(self.session, 'Fe')
+        patent = self.patent1 or create_patent(self.session, authors_name='Тест', patent_name='Атомарно')
+        alloys_before = get_alloys_count(self.session)
+
+        with self.assertRaises(ValueError):
+            create_alloy_with_elements(self.session, prop_value=1.0, category='Атомарно', rolling_type='rod',
+                                       patent_id=patent.id, element_percentages={fe.id: 50.0, 10 ** 9: 50.0})
+        self.assertEqual(get_alloys_count(self.session), alloys_before)
+
+        alloy = create_alloy_with_elements(self.session, prop_value=1.0, category='Атомарно', rolling_type='rod',
+                                           patent_id=patent.id, element_percentages={fe.id: 100.0})
+        self.assertEqual(get_alloy_elements_with_percentages(self.session, alloy.id)[0]['percentage'], 99.999)
+        delete_alloy(self.session, alloy.id)
+
+    def test_import_alloys(self):
+        """Импорт пакетами: строка с ошибкой попадает в отчёт, остальные загружаются"""
+        fe = self.fe_element or get_element_by_symbol(self.session, 'Fe')
+        name = f'Импорт {int(time.time() * 1000)}'
+        text = (
+            "patent_name,authors_name,prop_value,category,rolling_type,Fe,Unobtainium\n"
+            f"{name},Тест,500,Импорт,rod,99.5,\n"
+            f"{name},Тест,510,Импорт,wire,100,\n"
+            f"{name},Тест,520,Импорт,rod,90,10\n"
+            f"{name},Тест,не число,Импорт,rod,90,\n"
+        )
+        report = import_alloys(self.session, data_import.iter_records(io.StringIO(text), 'csv'), chunk_size=2)
+
+        self.assertEqual((report['rows'], report['imported'], report['failed']), (4, 2, 2))
+        self.assertEqual(report['patents_created'], 1)
+        self.assertEqual(report['composition_rows'], 2)
+        self.assertEqual(sorted(error['row'] for error in report['errors']), [4, 5])
+
+        patent = self.session.scalars(select(Patent).where(Patent.patent_name == name)).one()
+        alloys = get_alloys_by_patent(self.session, patent.id)
+        self.assertEqual(sorted(alloy.prop_value for alloy in alloys), [500, 510])
+        compositions = get_alloys_elements_with_percentages(self.session, [alloy.id for alloy in alloys])
+        self.assertEqual(sorted(rows[0]['percentage'] for rows in compositions.values()), [99.5, 99.999])
+        self.assertTrue(all(rows[0]['element_id'] == fe.id for rows in compositions.values()))
+
+        for alloy in alloys:
+            delete_alloy(self.session, alloy.id)
+        delete_patent(self.session, patent.id)
+
+    def test_iter_alloys_with_compositions(self):
+        """Потоковая выгрузка: состав каждого сплава собран из соединения с ассоциативной таблицей"""
+        fe = self.fe_element or get_element_by_symbol(self.session, 'Fe')
+        patent = self.patent1 or create_patent(self.session, authors_name='Тест', patent_name='Выгрузка')
+        alloy = create_alloy_with_elements(self.session, prop_value=5.0, category='Выгрузка', rolling_type='rod',
+                                           patent_id=patent.id, element_percentages={fe.id: 99.5})
+        empty = create_alloy_with_elements(self.session, prop_value=6.0, category='Выгрузка', rolling_type='rod',
+                                           patent_id=patent.id, element_percentages={})
+
+        records = {record['id']: record for record in iter_alloys_with_compositions(self.session, batch_size=2)}
+        self.assertEqual(records[alloy.id]['elements'], {fe.id: 99.5})
+        self.assertEqual(records[alloy.id]['prop_value'], 5.0)
+        self.assertEqual(records[empty.id]['elements'], {})
+        self.assertEqual(len(records), get_alloys_count(self.session))
+
+        delete_alloy(self.session, alloy.id)
+        delete_alloy(self.session, empty.id)
+
+    def test_reports_summary(self):
+        """Агрегаты отчётов согласованы с самими таблицами"""
+        rebuild_prediction_stats(self.session)
+        summary = get_reports_summary(self.session, top=5)
+        totals = summary['totals']
+        self.assertEqual(totals['alloys'], get_alloys_count(self.session))
+        self.assertEqual(totals['predictions'], len(get_all_predictions(self.session, limit=1000000)))
+
+        by_category = get_predictions_by_field(self.session, 'category')
+        self.assertEqual(sum(row['count'] for row in by_category), totals['predictions'])
+        self.assertEqual(sum(row['count'] for row in get_users_by_role(self.session)), totals['users'])
+        self.assertLessEqual(len(summary['most_active_users']), 5)
+        counts = [row['count'] for row in summary['predictions_by_model']]
+        self.assertEqual(counts, sorted(counts, reverse=True))
+        with self.assertRaises(ValueError):
+            get_predictions_by_field(self.session, 'password')
+
+    def test_prediction_stats_follow_changes(self):
+        """Таблицы статистики меняются вместе с прогнозами и их составом"""
+        unique_id = int(time.time() * 1000)
+        rebuild_prediction_stats(self.session)
+        self.assertEqual(check_prediction_stats(self.session), [])
+
+        fe = self.fe_element or get_element_by_symbol(self.session, 'Fe')
+        c = self.c_element or get_element_by_symbol(self.session, 'C')
+        model = self.rf_model or get_model_by_name(self.session, 'RF Test')
+        role = create_role(self.session, name=f's{unique_id % 10 ** 6}')
+        person = create_person(self.session, first_name='Стат', last_name='Тест', role_id=role.id,
+                               login=f's{unique_id % 10 ** 8}', password='p')
+        self.session.commit()
+
+        prediction = create_prediction_with_elements(self.session, prop_value=1.0, category=f'Стат {unique_id}',
+                                                     ml_model_id=model.id, rolling_type='rod', person_id=person.id,
+                                                     element_percentages={fe.id: 99.0})
+        empty = create_prediction(self.session, prop_value=2.0, category=None, ml_model_id=model.id,
+                                  rolling_type='rod', person_id=person.id)
+        add_element_to_prediction(self.session, empty.id, c.id, 1.0)
+        remove_element_from_prediction(self.session, prediction.id, fe.id)
+        update_prediction(self.session, empty.id, category=f'Стат {unique_id}', rolling_type='wire')
+        self.assertEqual(check_prediction_stats(self.session), [])
+
+        by_category = {row['name']: row['count'] for row in get_predictions_by_field(self.session, 'category')}
+        self.assertEqual(by_category[f'Стат {unique_id}'], 2)
+        active = {row['person_id']: row['count'] for row in get_most_active_users(self.session, limit=1000)}
+        self.assertEqual(active[person.id], 2)
+
+        delete_prediction(self.session, prediction.id)
+        delete_prediction(self.session, empty.id)
+        self.assertEqual(check_prediction_stats(self.session), [])
+        self.assertNotIn(person.id, {row['person_id'] for row in get_most_active_users(self.session, limit=1000)})
+
+    def test_prediction_stats_backfill_and_person_delete(self):
+        """Пустая статистика при непустых прогнозах заполняется; удаление пользователя убирает его строку"""
+        unique_id = int(time.time() * 1000)
+        model = self.rf_model or get_model_by_name(self.session, 'RF Test')
+        role = create_role(self.session, name=f'b{unique_id % 10 ** 6}')
+        person = create_person(self.session, first_name='Стат', last_name='Удаление', role_id=role.id,
+                               login=f'b{unique_id % 10 ** 8}', password='p')
+        self.session.commit()
+        prediction = create_prediction(self.session, prop_value=1.0, category=f'Заполнение {unique_id}',
+                                       ml_model_id=model.id, rolling_type='rod', person_id=person.id)
+
+        for table in STATS_TABLES:
+            self.session.execute(table.delete())
+        self.session.commit()
+        self.assertTrue(ensure_prediction_stats(self.session))
+        self.assertEqual(check_prediction_stats(self.session), [])
+        self.assertFalse(ensure_prediction_stats(self.session))
+
+        delete_prediction(self.session, prediction.id)
+        self.assertTrue(delete_person(self.session, person.id))
+        self.assertIsNone(self.session.get(PersonPredictionStats, person.id))
+
+    def test_keyset_pagination(self):
+        """Страницы по after_id совпадают со страницами по OFFSET и не зависят от курсора"""
+        from application.services.pagination import decode_cursor, encode_cursor, next_cursor
+
+        patent = self.patent1 or create_patent(self.session, authors_name='Тест', patent_name='Страницы')
+        created = [create_alloy(self.session, prop_value=float(i), category='Страницы', rolling_type='rod',
+                                patent_id=patent.id) for i in range(5)]
+
+        all_ids = [alloy.id for alloy in get_all_alloys(self.session, limit=1000000)]
+        pages, after_id = [], None
+        while True:
+            page = get_all_alloys(self.session, limit=2, after_id=after_id)
+            pages.extend(alloy.id for alloy in page)
+            cursor = next_cursor(page, 2)
+            if cursor is None:
+                break
+            after_id = decode_cursor(cursor)
+        self.assertEqual(pages, all_ids)
+        self.assertEqual(decode_cursor(encode_cursor(42)), 42)
+        with self.assertRaises(ValueError):
+            decode_cursor('not a cursor')
+
+        for alloy in created:
+            delete_alloy(self.session, alloy.id)
+
+    def test_filter_alloys(self):
+        """Составной фильтр: категория, диапазон свойства, элемент в диапазоне процентов, сортировка"""
+        fe = self.fe_element or get_element_by_symbol(self.session, 'Fe')
+        c = self.c_element or get_element_by_symbol(self.session, 'C')
+        patent = self.patent1 or create_patent(self.session, authors_name='Тест', patent_name='Фильтры')
+        category = f'Фильтр_{int(time.time() * 1000)}'
+        created = []
+        for prop_value, carbon in ((100.0, 0.2), (200.0, 0.8), (300.0, 1.5), (400.0, None)):
+            alloy = create_alloy(self.session, prop_value=prop_value, category=category, rolling_type='rod',
+                                 patent_id=patent.id)
+            add_element_to_alloy(self.session, alloy.id, fe.id, 95.0)
+            if carbon is not None:
+                add_element_to_alloy(self.session, alloy.id, c.id, carbon)
+            created.append(alloy)
+
+        found = filter_alloys(self.session, category=category, prop_min=150, elements=[(c.id, 0.5, None)],
+                              sort='-prop_value')
+        self.assertEqual([alloy.id for alloy in found], [created[2].id, created[1].id])
+        found = filter_alloys(self.session, category=category, prop_max=350, elements=[(c.id, None, 1.0)])
+        self.assertEqual([alloy.id for alloy in found], [created[0].id, created[1].id])
+        found = filter_alloys(self.session, category=category, elements=[(fe.id, None, None)], sort='-id',
+                              after_id=created[3].id, limit=2)
+        self.assertEqual([alloy.id for alloy in found], [created[2].id, created[1].id])
+        with self.assertRaises(ValueError):
+            filter_alloys(self.session, sort='name')
+        with self.assertRaises(ValueError):
+            filter_alloys(self.session, sort='prop_value', after_id=1)
+
+        for alloy in created:
+            delete_alloy(self.session, alloy.id)
+
+    def test_search_by_normalized_text(self):
+        """Поиск категории и патента без учёта регистра и ё: точный, по префиксу и по подстроке"""
+        unique_id = int(time.time() * 1000)
+        patent = create_patent(self.session, authors_name=f'Пётр Ёлкин {unique_id}',
+                               patent_name=f'Жаропрочный  СПЛАВ {unique_id}')
+        alloy = create_alloy(self.session, prop_value=1.0, category=f'Ёмкая Сталь {unique_id}', rolling_type='rod',
+                             patent_id=patent.id)
+        self.assertEqual(alloy.category_norm, f'емкая сталь {unique_id}')
+
+        for text, match in ((f'ЕМКАЯ сталь {unique_id}', 'exact'), ('ёмкая ст', 'prefix'),
+                            (f'сталь {unique_id}', 'contains')):
+            found = search_alloys_by_category(self.session, text, match)
+            self.assertIn(alloy.id, [a.id for a in found], (text, match))
+        self.assertEqual(search_alloys_by_category(self.session, f'сталь {unique_id}', 'prefix'), [])
+
+        found = search_patents(self.session, patent_name=f'сплав {unique_id}')
+        self.assertEqual([p.id for p in found], [patent.id])
+        found = search_patents(self.session, patent_name='жаропрочный сплав', authors_name='петр', match='prefix')
+        self.assertIn(patent.id, [p.id for p in found])
+        self.assertEqual(search_patents(self.session, authors_name='100%', match='prefix'), [])
+
+        delete_alloy(self.session, alloy.id)
+        delete_patent(self.session, patent.id)
+
+    def test_contains_search_sees_new_rows(self):
+        """Поиск по подстроке видит строки, записанные после предыдущего поиска другой сессией"""
+        unique_id = int(time.time() * 1000)
+        patent = create_patent(self.session, authors_name='Тест', patent_name=f'Подстрока {unique_id}')
+        first = create_alloy(self.session, prop_value=1.0, category=f'Латунь {unique_id} А', rolling_type='rod',
+                             patent_id=patent.id)
+        self.assertEqual([a.id for a in search_alloys_by_category(self.session, str(unique_id))], [first.id])
+
+        other = SessionLocal()
+        try:
+            second = Alloy(prop_value=2.0, category=f'Бронза {unique_id} Б', rolling_type='rod', patent_id=patent.id)
+            other.add(second)
+            other.commit()
+            second_id = second.id
+        finally:
+            other.close()
+
+        found = search_alloys_by_category(self.session, str(unique_id))
+        self.assertEqual(sorted(a.id for a in found), sorted([first.id, second_id]))
+        # одна буква — LIKE по индексу category_norm, без ограничения на длину запроса
+        self.assertIn(second_id, [a.id for a in search_alloys_by_category(self.session, 'б')])
+
+        delete_alloy(self.session, first.id)
+        delete_alloy(self.session, second_id)
+        delete_patent(self.session, patent.id)
+
+    def test_ensure_search_columns_backfill(self):
+        """Повторный запуск ничего не добавляет, full=True заполняет пустые *_norm"""
+        unique_id = int(time.time() * 1000)
+        patent = create_patent(self.session, authors_name='Ёлкин', patent_name=f'Миграция {unique_id}')
+        alloy = create_alloy(self.session, prop_value=1.0, category=f'Ёмкая {unique_id}', rolling_type='rod',
+                             patent_id=patent.id)
+        self.session.execute(update(Alloy).where(Alloy.id == alloy.id).values(category_norm=None))
+        self.session.commit()
+
+        result = ensure_search_columns(self.session)
+        self.assertTrue(all(added == [] for added, _ in result.values()), result)
+        self.assertEqual(search_alloys_by_category(self.session, f'емкая {unique_id}'), [])
+
+        ensure_search_columns(self.session, full=True)
+        found = search_alloys_by_category(self.session, f'ЁМКАЯ {unique_id}')
+        self.assertEqual([a.id for a in found], [alloy.id])
+
+        delete_alloy(self.session, alloy.id)
+        delete_patent(self.session, patent.id)
+
     def test_role_crud(self):
         """Тестирование CRUD операций для Role"""
         import time
@@ -0,0 +1,108 @@
+# test_routes.py
+import os
+import sys
+import unittest
+from concurrent.futures import Future
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from application import routes
+from application.services.inference_executor import InferenceQueueFull
+
+
+class TestMLRoutes(unittest.TestCase):
+    """Эндпоинты ML без обращения к моделям: пул инференса подменяется"""
+
+    @classmethod
+    def setUpClass(cls):
+        app = FastAPI()
+        app.include_router(routes.router)
+        cls.client = TestClient(app)
+
+    def setUp(self):
+        patcher = mock.patch.object(routes.element_cache, 'id_to_symbol', return_value={1: 'fe', 6: 'c'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_queue_full_returns_503_with_retry_after(self):
+        with mock.patch.object(routes.ml_executor, 'submit', side_effect=InferenceQueueFull("full")):
+            response = self.client.post('/api/ml/predict/batch', json={
+                'ml_model_id': 2,
+                'items': [{'category': 'steel', 'rolling_type': 'rod', 'elements': [{'element_id': 1, 'percentage': 90}]}],
+            })
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], str(routes.ml_executor.retry_after))
+
+    def test_predict_batch_keeps_order(self):
+        """Значения возвращаются в порядке составов запроса, состав передаётся символами"""
+        calls = []
+
+        def submit(method, ml_model_id, rows):
+            calls.append((method, ml_model_id, rows))
+            future = Future()
+            future.set_result([float(row["size"]) for row in rows])
+            return future
+
+        items = [{'category': 'steel', 'rolling_type': 'rod', 'size': size,
+                  'elements': [{'element_id': 1, 'percentage': 90}, {'element_id': 6, 'percentage': 1}]}
+                 for size in (3, 1, 2)]
+        with mock.patch.object(routes.ml_executor, 'submit', side_effect=submit):
+            response = self.client.post('/api/ml/predict/batch', json={'ml_model_id': 2, 'items': items})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'prop_values': [3.0, 1.0, 2.0]})
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(calls[0][2][0]['composition_by_symbol'], {'fe': 90.0, 'c': 1.0})
+
+    def test_predict_batch_limit(self):
+        item = {'category': 'steel', 'rolling_type': 'rod', 'elements': []}
+        with mock.patch.object(routes, 'ML_PREDICT_MAX_BATCH', 2), \
+                mock.patch.object(routes.ml_executor, 'submit') as submit:
+            response = self.client.post('/api/ml/predict/batch', json={'ml_model_id': 2, 'items': [item] * 3})
+        self.assertEqual(response.status_code, 422)
+        submit.assert_not_called()
+
+    def test_score_csv_in_chunks(self):
+        """CSV считается блоками по chunk_size строк, результат сохраняет порядок и исходные столбцы"""
+        calls = []
+
+        def submit(method, ml_model_id, columns, rows):
+            calls.append(len(rows))
+            future = Future()
+            future.set_result(([float(row[columns.index('size')]) for row in rows], [None] * len(rows)))
+            return future
+
+        body = "id,category,rolling_type,size,Fe\n" + "".join(f"{i},steel,rod,{i},90\n" for i in range(5))
+        with mock.patch.object(routes.ml_executor, 'submit', side_effect=submit):
+            response = self.client.post('/api/ml/score_csv?ml_model_id=2&chunk_size=2', content=body.encode(),
+                                        headers={'Content-Type': 'text/csv'})
+
+        self.assertEqual(response.status_code, 200)
+        lines = response.text.splitlines()
+        self.assertEqual(lines[0], "id,category,rolling_type,size,Fe,prop_value,error")
+        self.assertEqual([line.split(',')[-2] for line in lines[1:]], [repr(float(i)) for i in range(5)])
+        self.assertEqual(calls, [2, 2, 1])
+
+
+class TestListRoutes(unittest.TestCase):
+    """Списки с курсорной пагинацией: пустая страница — не ошибка"""
+
+    @classmethod
+    def setUpClass(cls):
+        app = FastAPI()
+        app.include_router(routes.router)
+        cls.client = TestClient(app)
+
+    def test_empty_persons_page(self):
+        with mock.patch.object(routes.service, 'get_all_persons', return_value=[]):
+            response = self.client.get('/api/persons/?after_id=1000000')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [])
+        self.assertNotIn('X-Next-Cursor', response.headers)
+
+
+if __name__ == '__main__':
+    unittest.main()
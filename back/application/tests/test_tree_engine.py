@@ -0,0 +1,101 @@
+# test_tree_engine.py
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from application.services.ml_inference import ModelRegistry, ML_MODELS_DIR, DEFAULT_MODEL_SPECS
+from application.services.tree_engine import FlatTreeEnsemble, compile_model_file, flat_path
+
+
+XGB_MODEL_ID = 2
+BACK_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def random_features(n_rows: int, n_features: int, seed: int = 0) -> np.ndarray:
+    """Составы, похожие на реальные: size, разреженные проценты элементов и one-hot признаки"""
+    rng = np.random.default_rng(seed)
+    X = np.zeros((n_rows, n_features))
+    X[:, 0] = rng.uniform(0, 50, n_rows)
+    n_elements = max(n_features // 2, 1)
+    X[:, 1:n_elements] = rng.uniform(0, 30, (n_rows, n_elements - 1)) * (rng.random((n_rows, n_elements - 1)) < 0.4)
+    X[np.arange(n_rows), rng.integers(n_elements, n_features, n_rows)] = 1.0
+    return X
+
+
+class TestFlatTreeEnsemble(unittest.TestCase):
+    """Плоский вычислитель деревьев совпадает с исходными моделями"""
+
+    def test_sklearn_forest_parity(self):
+        from sklearn.ensemble import RandomForestRegressor
+
+        X = random_features(600, 20, seed=1)
+        y = X[:, 1] * 3 + X[:, 2] ** 2 + np.random.default_rng(2).normal(0, 1, len(X))
+        model = RandomForestRegressor(n_estimators=25, max_depth=10, random_state=0).fit(X[:400], y[:400])
+
+        flat = FlatTreeEnsemble.from_model(model)
+        np.testing.assert_allclose(flat.predict(X), model.predict(X), rtol=1e-9, atol=1e-9)
+        np.testing.assert_allclose(flat.predict(X[0]), model.predict(X[:1]), rtol=1e-9)
+
+    def test_xgboost_parity(self):
+        registry = ModelRegistry()
+        if not registry.is_available(XGB_MODEL_ID):
+            self.skipTest("Нет артефактов XGBoost модели в ml_models/")
+        model = registry.get(XGB_MODEL_ID).model
+
+        flat = FlatTreeEnsemble.from_model(model)
+        X = random_features(1000, flat.n_features)
+        # XGBoost суммирует листья в float32 — сравниваем с относительным допуском
+        np.testing.assert_allclose(flat.predict(X), model.predict(X), rtol=1e-5, atol=1e-2)
+
+    def test_save_load_roundtrip(self):
+        from sklearn.tree import DecisionTreeRegressor
+
+        X = random_features(200, 10, seed=3)
+        model = DecisionTreeRegressor(max_depth=6, random_state=0).fit(X, X[:, 1] - X[:, 2])
+        flat = FlatTreeEnsemble.from_model(model)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "tree.flat.npz")
+            flat.save(path)
+            restored = FlatTreeEnsemble.load(path)
+
+        self.assertEqual(restored.max_depth, flat.max_depth)
+        np.testing.assert_array_equal(restored.predict(X), flat.predict(X))
+
+    def test_compiled_registry_serves_without_xgboost(self):
+        """При наличии .flat.npz модель обслуживается без распаковки joblib и импорта xgboost"""
+        spec = DEFAULT_MODEL_SPECS[XGB_MODEL_ID]
+        if not ModelRegistry().is_available(XGB_MODEL_ID):
+            self.skipTest("Нет артефактов XGBoost модели в ml_models/")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            for key in ("model", "features"):
+                shutil.copy(os.path.join(ML_MODELS_DIR, spec[key]), tmp)
+            compile_model_file(os.path.join(tmp, spec["model"]))
+            self.assertTrue(os.path.exists(flat_path(os.path.join(tmp, spec["model"]))))
+
+            script = textwrap.dedent(f"""
+                import sys
+                from application.services.ml_inference import ModelRegistry
+                registry = ModelRegistry(base_dir={tmp!r}, engine="compiled")
+                loaded = registry.get({XGB_MODEL_ID})
+                X = loaded.index.make_matrix([{{"category": "die tool steel", "rolling_type": "rod",
+                                               "size": 10, "composition_by_symbol": {{"fe": 90}}}}])
+                print(loaded.engine, loaded.predict_matrix(X)[0])
+                assert "xgboost" not in sys.modules
+            """)
+            result = subprocess.run([sys.executable, "-c", script], cwd=BACK_DIR,
+                                    capture_output=True, text=True, timeout=120)
+            self.assertEqual(result.returncode, 0, result.stderr)
+            self.assertTrue(result.stdout.startswith("compiled"))
+
+
+if __name__ == '__main__':
+    unittest.main()
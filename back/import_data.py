@@ -0,0 +1,49 @@
+import argparse
+import sys
+from application.config import SessionLocal
+from application.services import data_import
+from application.services.repository_service import import_alloys
+
+"""
+    Массовый импорт исторического набора патентов и сплавов с составами в БД
+    без запуска API: файл читается потоково, запись идёт пакетами по --chunk-size
+    строк (одна транзакция на пакет), ошибки выводятся по строкам.
+
+    python import_data.py patents.csv --chunk-size 2000
+    python import_data.py patents.ndjson --format ndjson
+"""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="АИС «Сплав»: массовый импорт сплавов, патентов и составов")
+    parser.add_argument('input', help="файл csv / ndjson / json ('-' — stdin)")
+    parser.add_argument('--format', choices=data_import.FORMATS, default=None,
+                        help="формат файла (по умолчанию — по расширению, иначе csv)")
+    parser.add_argument('--chunk-size', type=int, default=1000, help="строк на одну транзакцию")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    fmt = args.format or data_import.detect_format(args.input)
+    src = sys.stdin if args.input == '-' else open(args.input, 'r', encoding='utf-8-sig', newline='')
+
+    db = SessionLocal()
+    try:
+        report = import_alloys(db, data_import.iter_records(src, fmt), chunk_size=args.chunk_size)
+    except ValueError as e:
+        sys.exit(f"Error: {e}")
+    finally:
+        db.close()
+        if src is not sys.stdin:
+            src.close()
+
+    for error in report['errors']:
+        print(f"row {error['row']}: {error['error']}", file=sys.stderr)
+    print(f"Imported {report['imported']} of {report['rows']} rows ({report['failed']} failed, "
+          f"{report['patents_created']} patents created, {report['composition_rows']} composition rows) "
+          f"in {report['seconds']:.1f}s, {report['rows_per_second']:.0f} rows/s", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -12,6 +12,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Разрешить все методы
     allow_headers=["*"],  # Разрешить все заголовки
+    expose_headers=["X-Next-Cursor"],  # курсор следующей страницы списков (keyset-пагинация)
 )
 
 app.include_router(router)      # подключаем обработчик API URI
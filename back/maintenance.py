@@ -0,0 +1,78 @@
+import argparse
+import json
+import sys
+from sqlalchemy import inspect
+from application.config import SessionLocal, engine
+from application.models import dao
+from application.services import repository_service as service
+
+"""
+    Обслуживание производных данных БД без запуска API.
+
+    python maintenance.py rebuild-stats   # создать при необходимости и пересчитать статистику прогнозов
+    python maintenance.py check-stats     # сверить статистику с базовыми таблицами (код 1 при расхождениях)
+    python maintenance.py create-indexes  # создать индексы из dao, которых ещё нет в существующих таблицах
+    python maintenance.py backfill-search # добавить и пересчитать нормализованные столбцы поиска (*_norm)
+"""
+
+
+def rebuild_stats(db) -> int:
+    dao.Base.metadata.create_all(bind=engine, tables=service.STATS_TABLES)
+    for table, rows in service.rebuild_prediction_stats(db).items():
+        print(f"{table}: {rows} rows")
+    return 0
+
+
+def check_stats(db) -> int:
+    mismatches = service.check_prediction_stats(db)
+    for mismatch in mismatches:
+        print(json.dumps(mismatch, ensure_ascii=False))
+    print(f"{len(mismatches)} mismatches", file=sys.stderr)
+    return 1 if mismatches else 0
+
+
+def create_indexes(db) -> int:
+    # create_all не добавляет индексы в уже существующие таблицы
+    existing = set(inspect(engine).get_table_names())
+    for table in dao.Base.metadata.sorted_tables:
+        if table.name not in existing:
+            continue
+        for index in sorted(table.indexes, key=lambda ix: ix.name):
+            index.create(bind=engine, checkfirst=True)
+            print(f"{table.name}: {index.name}")
+    return 0
+
+
+def backfill_search(db) -> int:
+    for table, (added, rows) in service.ensure_search_columns(db, full=True).items():
+        for norm in added:
+            print(f"{table}: added {norm}")
+        print(f"{table}: {rows} rows normalized")
+    return 0
+
+
+COMMANDS = {
+    'rebuild-stats': rebuild_stats,
+    'check-stats': check_stats,
+    'create-indexes': create_indexes,
+    'backfill-search': backfill_search,
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="АИС «Сплав»: обслуживание БД")
+    parser.add_argument('command', choices=list(COMMANDS))
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    db = SessionLocal()
+    try:
+        return COMMANDS[args.command](db)
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,53 @@
+import argparse
+import sys
+from application.services.csv_scoring import score_csv
+from application.services.ml_inference import MLInference
+
+"""
+    Пакетный прогноз CSV-файла с составами без запуска API и без подключения к БД.
+    Столбцы: category, rolling_type, size и символы элементов (Fe, C, Cr, ...);
+    к каждой строке дописываются prop_value и error.
+
+    python score_csv.py candidates.csv -o scored.csv --model 2 --chunk-size 20000
+"""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="АИС «Сплав»: потоковый прогноз CSV с составами")
+    parser.add_argument('input', help="входной CSV ('-' — stdin)")
+    parser.add_argument('-o', '--output', default='-', help="выходной CSV ('-' — stdout)")
+    parser.add_argument('--model', type=int, default=2, help="ml_model_id (Model.id)")
+    parser.add_argument('--chunk-size', type=int, default=10000, help="строк на один вызов модели")
+    parser.add_argument('--engine', default='native', choices=['native', 'compiled'],
+                        help="движок прогноза (см. [ML] engine)")
+    return parser.parse_args()
+
+
+def _open(path: str, mode: str):
+    if path == '-':
+        return sys.stdin if 'r' in mode else sys.stdout
+    return open(path, mode, encoding='utf-8-sig' if 'r' in mode else 'utf-8', newline='')
+
+
+def main():
+    args = parse_args()
+    inference = MLInference(cache_size=0, engine=args.engine)
+
+    src = _open(args.input, 'r')
+    dst = _open(args.output, 'w')
+    try:
+        stats = score_csv(inference, args.model, src, dst, chunk_size=args.chunk_size)
+    except ValueError as e:
+        sys.exit(f"Error: {e}")
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if dst is not sys.stdout:
+            dst.close()
+
+    print(f"Scored {stats['rows']} rows ({stats['errors']} with errors) in {stats['seconds']:.1f}s, "
+          f"{stats['rows_per_second']:.0f} rows/s", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import uvicorn
+from application.config import app_config, engine
+
+"""
+    Запуск сервера по схеме pre-fork:
+    мастер-процесс один раз загружает ML-модели и только потом порождает воркеры
+    через fork(), поэтому деревья моделей лежат в общих страницах памяти
+    (copy-on-write), а не копируются в каждый воркер.
+
+    python serve.py --workers 16
+"""
+
+
+def _server_option(name: str, fallback: str) -> str:
+    # в application.ini встречаются комментарии в конце строки: "workers = 4  # ..."
+    value = app_config.get('Server', name, fallback=fallback)
+    return value.split('#')[0].split(';')[0].strip() or fallback
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="АИС «Сплав»: pre-fork запуск API с общими ML-моделями")
+    parser.add_argument('--host', default=_server_option('host', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(_server_option('port', '8000')))
+    parser.add_argument('--workers', type=int, default=int(_server_option('workers', '1')))
+    parser.add_argument('--mmap', action='store_true',
+                        default=app_config.getboolean('ML', 'mmap_models', fallback=False),
+                        help="загружать NumPy-части моделей через joblib.load(mmap_mode='r')")
+    return parser.parse_args()
+
+
+def preload_app(mmap: bool):
+    """Импортирует приложение и синхронно загружает все модели в мастер-процессе"""
+    if not app_config.has_section('ML'):
+        app_config.add_section('ML')
+    # фоновый прогрев не нужен: модели грузим здесь, до fork (потоки и fork не дружат)
+    app_config.set('ML', 'warm_up', 'false')
+    app_config.set('ML', 'mmap_models', 'true' if mmap else 'false')
+
+    from main import app
+    from application.routes import ml_infer
+
+    loaded = ml_infer.registry.load_all()
+    for item in ml_infer.models_status():
+        if item['loaded']:
+            print(f"Model {item['ml_model_id']} ({item['name']}) loaded in {item['load_seconds']:.2f}s")
+    print(f"Preloaded ML models: {loaded}")
+    # мастер запросы не обслуживает; наблюдение за файлами моделей запустится в каждом воркере
+    ml_infer.stop_watching()
+
+    # Соединения пула БД не должны наследоваться воркерами
+    engine.dispose()
+
+    # Переносим все объекты в "вечное" поколение GC: сборщик в воркерах не будет
+    # трогать их заголовки, и страницы с моделями останутся общими
+    gc.collect()
+    gc.freeze()
+    return app
+
+
+def run_worker(app, sock: socket.socket):
+    config = uvicorn.Config(app, log_level=app_config.get('Logging', 'level', fallback='info').lower())
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+
+
+def main():
+    args = parse_args()
+
+    if not hasattr(os, 'fork'):
+        # Windows: fork недоступен, запускаем обычный uvicorn
+        print("os.fork is not available, starting a single uvicorn process")
+        from main import app
+        uvicorn.run(app, host=args.host, port=args.port)
+        return
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    app = preload_app(args.mmap)
+
+    workers = {}
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            try:
+                run_worker(app, sock)
+            finally:
+                os._exit(0)
+        workers[pid] = True
+        print(f"Started worker {pid}")
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for _ in range(max(args.workers, 1)):
+        spawn()
+
+    print(f"Serving on http://{args.host}:{args.port} with {len(workers)} workers")
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        workers.pop(pid, None)
+        if not stopping:
+            # упавший воркер перезапускаем: модели по-прежнему в памяти мастера
+            print(f"Worker {pid} exited with status {status}, restarting")
+            spawn()
+
+    sock.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
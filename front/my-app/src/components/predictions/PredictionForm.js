@@ -256,16 +256,6 @@ const PredictionForm = ({ isEdit = false }) => {
     }
   };
 
-  const getCreatedPredictionId = async (personId) => {
-    await new Promise(r => setTimeout(r, 500));
-    const userPredictionsRes = await predictionService.getByPerson(personId);
-    const userPredictions = userPredictionsRes.data;
-    if (!userPredictions.length) throw new Error('Прогноз не найден');
-    return userPredictions.reduce((prev, cur) =>
-      prev.id > cur.id ? prev : cur
-    ).id;
-  };
-
   const syncPredictionElements = async (predictionId, newElements) => {
     const old = normalizeElements(originalElements);
     for (const el of old) {
@@ -324,19 +314,8 @@ const PredictionForm = ({ isEdit = false }) => {
         return;
       }
 
-      const createResponse = await predictionService.create(predictionData);
-
-      let predictionId;
-
-      if (createResponse.data && createResponse.data.id) {
-        predictionId = createResponse.data.id;
-      } else {
-        predictionId = await getCreatedPredictionId(predictionData.person_id);
-      }
-
-      for (const el of elements) {
-        await predictionService.addElement(predictionId, el.element_id, el.percentage);
-      }
+      // прогноз и состав сохраняются одним запросом (одна транзакция на сервере)
+      await predictionService.createWithElements(predictionData, elements);
 
       alert('✓ Прогноз сохранен');
       navigate('/predictions');
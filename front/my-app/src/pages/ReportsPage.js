@@ -1,15 +1,7 @@
 import React, { useEffect, useMemo, useState } from "react";
 import { useNavigate } from "react-router-dom";
 import { useAuth } from "../context/AuthContext";
-import {
-  personService,
-  roleService,
-  predictionService,
-  alloyService,
-  patentService,
-  modelService,
-  elementService,
-} from "../services/api";
+import { predictionService, alloyService, modelService, reportService } from "../services/api";
 
 const getField = (obj, keys) => {
   for (const k of keys) {
@@ -30,6 +22,10 @@ const groupCount = (items, keyFn) => {
     .sort((a, b) => b.count - a.count || a.name.localeCompare(b.name));
 };
 
+// строки группировок с сервера: [{ name, count }], пустое значение -> "(пусто)"
+const namedCounts = (rows) =>
+  (rows || []).map((r) => ({ name: String(r.name ?? "").trim() || "(пусто)", count: r.count }));
+
 const toCsv = (rows, headers) => {
   const esc = (v) => {
     const s = String(v ?? "");
@@ -73,86 +69,17 @@ export default function ReportsPage() {
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState("");
 
-  // admin: данные системы
-  const [roles, setRoles] = useState([]);
-  const [persons, setPersons] = useState([]);
-  const [predictions, setPredictions] = useState([]);
-  const [alloys, setAlloys] = useState([]);
-  const [patents, setPatents] = useState([]);
+  // admin: сводка системы — агрегаты считаются на сервере (GET /api/reports/summary)
+  const [summary, setSummary] = useState(null);
   const [models, setModels] = useState([]);
-  const [elements, setElements] = useState([]);
-
-  // admin summary extras
-  const [elementRanking, setElementRanking] = useState([]); // [{ elementId, name, symbol, count }]
-  const [elementStatsInfo, setElementStatsInfo] = useState({ usedPredictions: 0, totalPredictions: 0 });
 
   // everyone: мои прогнозы
   const [myPredictions, setMyPredictions] = useState([]);
 
   const loadAdminData = async () => {
-    const [r, p, pr, a, pa, m, el] = await Promise.all([
-      roleService.getAll(),
-      personService.getAll(0, 100000),
-      predictionService.getAll(0, 100000),
-      alloyService.getAll(0, 100000),
-      patentService.getAll(0, 100000),
-      modelService.getAll(),
-      elementService.getAll(),
-    ]);
-
-    setRoles(r.data || []);
-    setPersons(p.data || []);
-    setPredictions(pr.data || []);
-    setAlloys(a.data || []);
-    setPatents(pa.data || []);
+    const [sm, m] = await Promise.all([reportService.getSummary(10), modelService.getAll()]);
+    setSummary(sm.data || null);
     setModels(m.data || []);
-    setElements(el.data || []);
-
-    // Рейтинг элементов: считаем по последним N прогнозам, чтобы не делать слишком много запросов
-    const allPreds = pr.data || [];
-    const MAX_FOR_ELEMENT_STATS = 200;
-
-    const sorted = [...allPreds].sort((x, y) => (Number(y.id) || 0) - (Number(x.id) || 0));
-    const subset = sorted.slice(0, MAX_FOR_ELEMENT_STATS);
-
-    const elMap = new Map();
-    (el.data || []).forEach((e) => elMap.set(String(e.id), e));
-
-    const responses = await Promise.all(
-      subset.map(async (pred) => {
-        try {
-          const res = await predictionService.getElements(pred.id);
-          return { predId: pred.id, items: res.data || [] };
-        } catch {
-          return { predId: pred.id, items: [] };
-        }
-      })
-    );
-
-    const freq = new Map(); // elementId -> count occurrences
-    for (const r0 of responses) {
-      for (const it of r0.items) {
-        const eid = String(getField(it, ["element_id", "elementid", "elementId"]));
-        if (!eid || eid === "undefined" || eid === "null") continue;
-        freq.set(eid, (freq.get(eid) || 0) + 1);
-      }
-    }
-
-    const ranking = Array.from(freq.entries())
-      .map(([elementId, count]) => {
-        const e = elMap.get(String(elementId));
-        return {
-          elementId,
-          count,
-          name: e?.name || `element#${elementId}`,
-          symbol: e?.symbol || "",
-        };
-      })
-      .sort((a, b) => b.count - a.count || a.name.localeCompare(b.name))
-      .slice(0, 15);
-
-    setElementRanking(ranking);
-    setElementStatsInfo({ usedPredictions: subset.length, totalPredictions: allPreds.length });
   };
 
   const loadMyPredictions = async () => {
@@ -197,107 +124,51 @@ export default function ReportsPage() {
   }, [isAdmin, userId]);
 
   // ---- mappings ----
-  const roleIdToName = useMemo(() => {
-    const map = new Map();
-    for (const r of roles || []) map.set(String(r.id), r.name);
-    return map;
-  }, [roles]);
-
   const modelIdToName = useMemo(() => {
     const map = new Map();
     for (const m of models || []) map.set(String(m.id), m.name);
     return map;
   }, [models]);
 
-  const personIdToUser = useMemo(() => {
-    const map = new Map();
-    for (const p of persons || []) map.set(String(p.id), p);
-    return map;
-  }, [persons]);
-
   // ---- summary blocks ----
-  const adminTotals = useMemo(() => {
-    if (!isAdmin) return null;
-    return {
-      users: persons.length,
-      roles: roles.length,
-      elements: elements.length,
-      predictions: predictions.length,
-      alloys: alloys.length,
-      patents: patents.length,
-      models: models.length,
-    };
-  }, [isAdmin, persons, roles, elements, predictions, alloys, patents, models]);
-
-  const usersByRole = useMemo(() => {
-    if (!isAdmin) return [];
-    return groupCount(persons, (u) => {
-      const rid = getField(u, ["role_id", "roleid"]);
-      return roleIdToName.get(String(rid)) || `role#${rid ?? "?"}`;
-    });
-  }, [isAdmin, persons, roleIdToName]);
-
-  const predictionsByCategory = useMemo(() => {
-    if (!isAdmin) return [];
-    return groupCount(predictions, (p) => getField(p, ["category"]));
-  }, [isAdmin, predictions]);
-
-  const predictionsByRolling = useMemo(() => {
-    if (!isAdmin) return [];
-    return groupCount(predictions, (p) => getField(p, ["rolling_type", "rollingtype"]));
-  }, [isAdmin, predictions]);
-
-  const predictionsByModel = useMemo(() => {
-    if (!isAdmin) return [];
-    return groupCount(predictions, (p) => {
-      const mid = getField(p, ["ml_model_id", "mlmodelid", "mlmodel_id"]);
-      return modelIdToName.get(String(mid)) || `model#${mid ?? "?"}`;
-    });
-  }, [isAdmin, predictions, modelIdToName]);
-
-  const mostActiveUsers = useMemo(() => {
-    if (!isAdmin) return [];
-    const counts = new Map(); // personId -> count
-
-    for (const p of predictions || []) {
-      const pid = getField(p, ["person_id", "personid"]);
-      const key = String(pid ?? "");
-      if (!key) continue;
-      counts.set(key, (counts.get(key) || 0) + 1);
-    }
+  const adminTotals = isAdmin ? summary?.totals || null : null;
+
+  const usersByRole = useMemo(() => namedCounts(summary?.users_by_role), [summary]);
+  const predictionsByCategory = useMemo(() => namedCounts(summary?.predictions_by_category), [summary]);
+  const predictionsByRolling = useMemo(() => namedCounts(summary?.predictions_by_rolling_type), [summary]);
+  const predictionsByModel = useMemo(() => namedCounts(summary?.predictions_by_model), [summary]);
+  const orgsByPredictions = useMemo(() => namedCounts(summary?.top_organizations), [summary]);
+
+  const mostActiveUsers = useMemo(
+    () =>
+      (summary?.most_active_users || []).map((u) => ({
+        personId: u.person_id,
+        count: u.count,
+        login: u.login || "-",
+        name: `${u.first_name ?? ""} ${u.last_name ?? ""}`.trim() || "-",
+        organization: u.organization || "-",
+        role: u.role || "-",
+      })),
+    [summary]
+  );
 
-    return Array.from(counts.entries())
-      .map(([personId, count]) => {
-        const u = personIdToUser.get(String(personId));
-        const rid = getField(u, ["role_id", "roleid"]);
-        return {
-          personId,
-          count,
-          login: u?.login || "-",
-          name: `${u?.first_name ?? u?.firstname ?? ""} ${u?.last_name ?? u?.lastname ?? ""}`.trim() || "-",
-          organization: u?.organization || "-",
-          role: roleIdToName.get(String(rid)) || (rid ? `role#${rid}` : "-"),
-        };
-      })
-      .sort((a, b) => b.count - a.count || a.login.localeCompare(b.login))
-      .slice(0, 10);
-  }, [isAdmin, predictions, personIdToUser, roleIdToName]);
-
-  const orgsByPredictions = useMemo(() => {
-    if (!isAdmin) return [];
-    return groupCount(predictions, (p) => {
-      const pid = getField(p, ["person_id", "personid"]);
-      const u = personIdToUser.get(String(pid));
-      return u?.organization || "(пусто)";
-    }).slice(0, 10);
-  }, [isAdmin, predictions, personIdToUser]);
-
-  const recentPredictions = useMemo(() => {
-    if (!isAdmin) return [];
-    const arr = [...(predictions || [])];
-    arr.sort((a, b) => (Number(b.id) || 0) - (Number(a.id) || 0));
-    return arr.slice(0, 10);
-  }, [isAdmin, predictions]);
+  const elementRanking = useMemo(
+    () =>
+      (summary?.element_ranking?.elements || []).map((e) => ({
+        elementId: e.element_id,
+        count: e.count,
+        name: e.name || `element#${e.element_id}`,
+        symbol: e.symbol || "",
+      })),
+    [summary]
+  );
+
+  const elementStatsInfo = {
+    usedPredictions: summary?.element_ranking?.predictions_with_composition ?? 0,
+    totalPredictions: summary?.totals?.predictions ?? 0,
+  };
+
+  const recentPredictions = summary?.recent_predictions || [];
 
   // ---- my predictions ----
   const myPredictionsSorted = useMemo(() => {
@@ -393,6 +264,14 @@ export default function ReportsPage() {
                 <p className="stat-number">{adminTotals.models}</p>
               </div>
             </div>
+            <div style={{ display: "flex", gap: 8, marginTop: 12 }}>
+              <a className="btn btn-outline btn-sm" href={predictionService.exportUrl("csv")} download>
+                Выгрузить прогнозы (CSV)
+              </a>
+              <a className="btn btn-outline btn-sm" href={alloyService.exportUrl("csv")} download>
+                Выгрузить сплавы (CSV)
+              </a>
+            </div>
           </div>
 
           {/* ПЕРВЫЙ ГРИД: теперь "Пользователи по ролям" (вместо "Самые активные") */}
@@ -495,7 +374,7 @@ export default function ReportsPage() {
             <div className="data-card">
               <h3>Рейтинг элементов по частоте</h3>
               <div className="text-muted" style={{ marginBottom: 8, fontSize: 12 }}>
-                Посчитано по последним {elementStatsInfo.usedPredictions} прогнозам из {elementStatsInfo.totalPredictions}.
+                Посчитано по {elementStatsInfo.usedPredictions} прогнозам с составом из {elementStatsInfo.totalPredictions}.
               </div>
               <table className="table">
                 <thead>
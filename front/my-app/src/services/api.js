@@ -19,6 +19,28 @@ api.interceptors.request.use(
   (error) => Promise.reject(error)
 );
 
+// Курсорная пагинация списков: страница после cursor (null — первая),
+// курсор следующей — в заголовке X-Next-Cursor (null — страниц больше нет)
+const getPage = (url, cursor, limit) =>
+  api.get(url, { params: cursor ? { cursor, limit } : { limit } }).then((res) => ({
+    items: res.data || [],
+    nextCursor: res.headers["x-next-cursor"] || null,
+  }));
+
+// Составной фильтр списка: { category, rolling_type, prop_min, prop_max, sort, limit, cursor, ...,
+// elements: [{ symbol, min, max }] } -> ?category=...&element=Fe:0.5:2&element=Cr (element повторяется)
+const searchPage = (url, filters = {}) => {
+  const { elements = [], cursor = null, limit = 100, ...rest } = filters;
+  const params = new URLSearchParams();
+  Object.entries(rest).forEach(([key, value]) => {
+    if (value !== null && value !== undefined && value !== "") params.append(key, value);
+  });
+  elements.forEach(({ symbol, min = "", max = "" }) => {
+    params.append("element", min === "" && max === "" ? symbol : `${symbol}:${min ?? ""}:${max ?? ""}`);
+  });
+  return getPage(`${url}?${params.toString()}`, cursor, limit);
+};
+
 // ---------------- Elements ----------------
 export const elementService = {
   getAll: () => api.get("/api/elements/"),
@@ -30,22 +52,42 @@ export const elementService = {
 // ---------------- Patents ----------------
 export const patentService = {
   getAll: (skip = 0, limit = 100) => api.get("/api/patents/", { params: { skip, limit } }),
+  getPage: (cursor = null, limit = 100) => getPage("/api/patents/", cursor, limit),
   getById: (id) => api.get(`/api/patents/${id}`),
   create: (data) => api.post("/api/patents/", data),
   update: (id, data) => api.put(`/api/patents/${id}`, data),
   delete: (id) => api.delete(`/api/patents/${id}`),
   getAlloysByPatent: (patentId) => api.get(`/api/alloys/patent/${patentId}`),
+  // { patent_name, authors_name, match, skip, limit }
+  search: (params) => api.get("/api/patents/search", { params }),
 };
 
+// Состав из формы -> [{ element_id, percentage }] без пустых и нечисловых строк
+const normalizeElements = (elements) =>
+  (elements || [])
+    .filter((el) => el && el.element_id != null)
+    .map((el) => ({
+      element_id: parseInt(el.element_id, 10),
+      percentage: parseFloat(el.percentage),
+    }))
+    .filter((el) => Number.isFinite(el.element_id) && Number.isFinite(el.percentage));
+
 // ---------------- Alloys ----------------
 export const alloyService = {
   getAll: (skip = 0, limit = 100) => api.get("/api/alloys/", { params: { skip, limit } }),
+  getPage: (cursor = null, limit = 100) => getPage("/api/alloys/", cursor, limit),
+  search: (filters) => searchPage("/api/alloys/", filters),
   getById: (id) => api.get(`/api/alloys/${id}`),
   create: (data) => api.post("/api/alloys/", data),
   update: (id, data) => api.put(`/api/alloys/${id}`, data),
   delete: (id) => api.delete(`/api/alloys/${id}`),
 
   getElements: (alloyId) => api.get(`/api/alloys/${alloyId}/elements`),
+  // Составы нескольких сплавов одним запросом: [{ alloy_id, elements: [...] }]
+  getElementsBulk: (alloyIds) => api.get("/api/alloys/elements", { params: { ids: alloyIds.join(",") } }),
+  // Выгрузка всех сплавов с составом (ndjson | csv | arrow | parquet) — ссылка для скачивания браузером,
+  // файл пишется на диск потоком и не собирается в памяти страницы
+  exportUrl: (format = "csv") => `${API_BASE}/api/alloys/export?format=${encodeURIComponent(format)}`,
 
   addElement: (alloyId, elementId, percentage) =>
     api.post(`/api/alloys/${alloyId}/elements/${elementId}`, null, { params: { percentage } }),
@@ -54,34 +96,18 @@ export const alloyService = {
   removeElementFromAlloy: (alloyId, elementId) => api.delete(`/api/alloys/${alloyId}/elements/${elementId}`),
   removeElement: (alloyId, elementId) => api.delete(`/api/alloys/${alloyId}/elements/${elementId}`),
 
-  searchByCategory: (category) => api.get(`/api/alloys/category/${category}`),
+  // match: "exact" | "prefix" | "contains" (без учёта регистра)
+  searchByCategory: (category, match = "contains") =>
+    api.get(`/api/alloys/category/${encodeURIComponent(category)}`, { params: { match } }),
   getByPatent: (patentId) => api.get(`/api/alloys/patent/${patentId}`),
 
+  // Сплав и весь состав одним запросом и одной транзакцией на сервере
   createWithElements: async (alloyData, elements = []) => {
-    const createRes = await api.post("/api/alloys/", alloyData);
-    const created = createRes.data;
-
-    if (!created || created.id == null) {
-      throw new Error("Backend не вернул id созданного сплава");
-    }
-
-    const alloyId = created.id;
-
-    const items = (elements || [])
-      .filter((el) => el && el.element_id != null)
-      .map((el) => ({
-        element_id: parseInt(el.element_id, 10),
-        percentage: parseFloat(el.percentage),
-      }))
-      .filter((el) => Number.isFinite(el.element_id) && Number.isFinite(el.percentage));
-
-    for (const el of items) {
-      await api.post(`/api/alloys/${alloyId}/elements/${el.element_id}`, null, {
-        params: { percentage: el.percentage },
-      });
-    }
-
-    return created;
+    const res = await api.post("/api/alloys/with_elements", {
+      ...alloyData,
+      elements: normalizeElements(elements),
+    });
+    return res.data;
   },
 };
 
@@ -97,12 +123,19 @@ export const modelService = {
 // ---------------- Predictions ----------------
 export const predictionService = {
   getAll: (skip = 0, limit = 100) => api.get("/api/predictions/", { params: { skip, limit } }),
+  getPage: (cursor = null, limit = 100) => getPage("/api/predictions/", cursor, limit),
+  search: (filters) => searchPage("/api/predictions/", filters),
   getById: (id) => api.get(`/api/predictions/${id}`),
   create: (data) => api.post("/api/predictions/", data),
   update: (id, data) => api.put(`/api/predictions/by_id/${id}`, data),
   delete: (id) => api.delete(`/api/predictions/${id}`),
 
   getElements: (predictionId) => api.get(`/api/predictions/${predictionId}/elements`),
+  // Составы нескольких прогнозов одним запросом: [{ prediction_id, elements: [...] }]
+  getElementsBulk: (predictionIds) =>
+    api.get("/api/predictions/elements", { params: { ids: predictionIds.join(",") } }),
+  // Выгрузка всех прогнозов с составом — см. alloyService.exportUrl
+  exportUrl: (format = "csv") => `${API_BASE}/api/predictions/export?format=${encodeURIComponent(format)}`,
 
   addElementToPrediction: (predictionId, elementId, percentage) =>
     api.post(`/api/predictions/${predictionId}/elements/${elementId}/percentage`, null, {
@@ -121,37 +154,13 @@ export const predictionService = {
   removeElement: (predictionId, elementId) =>
     api.delete(`/api/predictions/${predictionId}/elements/${elementId}`),
 
+  // Прогноз и весь состав одним запросом и одной транзакцией на сервере
   createWithElements: async (predictionData, elements = []) => {
-    const createRes = await api.post("/api/predictions/", predictionData);
-    const created = createRes.data;
-
-    let predictionId;
-    if (created && created.id) {
-      predictionId = created.id;
-    } else if (createRes.headers && createRes.headers.location) {
-      const match = createRes.headers.location.match(/\/predictions\/(\d+)/);
-      if (match) predictionId = parseInt(match[1], 10);
-    }
-
-    if (!predictionId) {
-      throw new Error("Не удалось получить ID созданного прогноза");
-    }
-
-    const items = (elements || [])
-      .filter((el) => el && el.element_id != null)
-      .map((el) => ({
-        element_id: parseInt(el.element_id, 10),
-        percentage: parseFloat(el.percentage),
-      }))
-      .filter((el) => Number.isFinite(el.element_id) && Number.isFinite(el.percentage));
-
-    for (const el of items) {
-      await api.post(`/api/predictions/${predictionId}/elements/${el.element_id}/percentage`, null, {
-        params: { percentage: el.percentage },
-      });
-    }
-
-    return { ...created, id: predictionId };
+    const res = await api.post("/api/predictions/with_elements", {
+      ...predictionData,
+      elements: normalizeElements(elements),
+    });
+    return res.data;
   },
 
   getByPerson: (personId) => api.get(`/api/predictions/person/${personId}`),
@@ -167,6 +176,7 @@ export const adminService = {
 // ---------------- Persons / Users ----------------
 export const personService = {
   getAll: (skip = 0, limit = 100) => api.get("/api/persons/", { params: { skip, limit } }),
+  getPage: (cursor = null, limit = 100) => getPage("/api/persons/", cursor, limit),
   getById: (id) => api.get(`/api/persons/id/${id}`),
   getByLogin: (login) => api.get(`/api/persons/login/${encodeURIComponent(login)}`),
   getPasswordByLogin: (login) => api.get(`/api/persons/login_password/${encodeURIComponent(login)}`),
@@ -231,6 +241,14 @@ export const authService = {
 // ---------------- ML ----------------
 export const mlService = {
   predict: (data) => api.post("/api/ml/predict", data),
+  predictBatch: (data) => api.post("/api/ml/predict/batch", data),
+};
+
+// ---------------- Reports ----------------
+// Агрегаты для страницы отчётов считаются в БД (GROUP BY), ответ — несколько КБ
+export const reportService = {
+  getSummary: (top = 10) => api.get("/api/reports/summary", { params: { top } }),
+  getPredictionsBy: (field, limit = 100) => api.get(`/api/reports/predictions/by/${field}`, { params: { limit } }),
 };
 
 // ---------------- Statistics ----------------
@@ -274,5 +292,6 @@ export default {
   roleService,
   authService,
   mlService,
+  reportService,
   statsService,
 };